@@ -0,0 +1,240 @@
+"""
+Two-tier cache backend: a small in-process LRU (L1) in front of a SQLite
+file in WAL mode (L2) that every worker process on the machine shares.
+
+L1 answers repeated reads without leaving the process, but only for
+L1_TIMEOUT seconds, so a value written by another worker is picked up
+shortly after. Keys starting with one of L1_BYPASS_PREFIXES skip L1 and
+always read L2, for values that must be seen by every worker as soon as
+they are written (e.g. the response cache version stamps). L2 needs no
+server and survives restarts. Per-key timeouts apply to both tiers and L2
+is kept under MAX_ENTRIES by culling the entries closest to expiry. add()
+and incr() are atomic across processes.
+
+    CACHES = {'default': {
+        'BACKEND': 'core.cache.TieredCache',
+        'LOCATION': '/var/cache/eventshub/cache.sqlite3',
+        'OPTIONS': {'MAX_ENTRIES': 50000, 'L1_MAX_ENTRIES': 1000, 'L1_TIMEOUT': 5},
+    }}
+"""
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+class TieredCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+    # Counting L2 rows is a table scan, so MAX_ENTRIES is checked every this many sets.
+    cull_interval = 100
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.path = Path(location)
+        self.l1_max_entries = int(options.get('L1_MAX_ENTRIES', 1000))
+        self.l1_timeout = float(options.get('L1_TIMEOUT', 5))
+        self.l1_bypass_prefixes = tuple(options.get('L1_BYPASS_PREFIXES', ()))
+        self._l1 = OrderedDict()  # key -> (pickled value, L1 expiry)
+        self._l1_lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = dict.fromkeys(['l1_hits', 'l2_hits', 'misses', 'sets', 'l1_evictions', 'l2_culled'], 0)
+
+    # --- L2 (SQLite) ---
+
+    @property
+    def _db(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)')
+            self._local.conn = conn
+        return conn
+
+    def _l2_get(self, key, now):
+        row = self._db.execute(
+            'SELECT value, expires FROM cache WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (key, now)).fetchone()
+        return row
+
+    def _l2_set(self, key, value, expires):
+        self._db.execute(
+            'INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires',
+            (key, value, expires))
+        self._stats['sets'] += 1
+        if self._stats['sets'] % self.cull_interval == 0:
+            self._cull()
+
+    def _cull(self):
+        db = self._db
+        db.execute('DELETE FROM cache WHERE expires <= ?', (time.time(),))
+        count = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self._max_entries:
+            # Drop a 1/CULL_FREQUENCY share, soonest-to-expire first (no-expiry entries
+            # last); CULL_FREQUENCY 0 empties the cache, as in Django's own backends.
+            share = self._max_entries // self._cull_frequency if self._cull_frequency else self._max_entries
+            excess = count - self._max_entries + share
+            culled = db.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY expires IS NULL, expires LIMIT ?)', (excess,)).rowcount
+            self._stats['l2_culled'] += culled
+
+    # --- L1 (in-process LRU) ---
+
+    def _l1_enabled(self, raw_key):
+        return self.l1_max_entries > 0 and not (self.l1_bypass_prefixes and str(raw_key).startswith(self.l1_bypass_prefixes))
+
+    def _l1_get(self, key, now):
+        with self._l1_lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= now:
+                del self._l1[key]
+                return None
+            self._l1.move_to_end(key)
+            return entry[0]
+
+    def _l1_set(self, key, value, expires, now):
+        l1_expires = now + self.l1_timeout
+        if expires is not None:
+            l1_expires = min(l1_expires, expires)
+        with self._l1_lock:
+            self._l1[key] = (value, l1_expires)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self.l1_max_entries:
+                self._l1.popitem(last=False)
+                self._stats['l1_evictions'] += 1
+
+    def _l1_delete(self, key):
+        with self._l1_lock:
+            self._l1.pop(key, None)
+
+    # --- Django cache API ---
+
+    def get(self, key, default=None, version=None):
+        raw_key, key = key, self.make_and_validate_key(key, version=version)
+        now = time.time()
+        use_l1 = self._l1_enabled(raw_key)
+        if use_l1:
+            value = self._l1_get(key, now)
+            if value is not None:
+                self._stats['l1_hits'] += 1
+                return pickle.loads(value)
+        row = self._l2_get(key, now)
+        if row is None:
+            self._stats['misses'] += 1
+            return default
+        self._stats['l2_hits'] += 1
+        if use_l1:
+            self._l1_set(key, row[0], row[1], now)
+        return pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        found = {}
+        for key in keys:
+            value = self.get(key, self._missing, version=version)
+            if value is not self._missing:
+                found[key] = value
+        return found
+
+    _missing = object()
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        raw_key, key = key, self.make_and_validate_key(key, version=version)
+        expires = self.get_backend_timeout(timeout)
+        if expires is not None and expires <= time.time():
+            self.delete(raw_key, version=version)
+            return
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        self._l2_set(key, pickled, expires)
+        if self._l1_enabled(raw_key):
+            self._l1_set(key, pickled, expires, time.time())
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        raw_key, key = key, self.make_and_validate_key(key, version=version)
+        expires = self.get_backend_timeout(timeout)
+        now = time.time()
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        # Insert, or take over an expired entry; a live one wins.
+        added = self._db.execute(
+            'INSERT INTO cache (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires = excluded.expires '
+            'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+            (key, pickled, expires, now)).rowcount == 1
+        if added:
+            self._stats['sets'] += 1
+            if self._l1_enabled(raw_key):
+                self._l1_set(key, pickled, expires, now)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._l1_delete(key)
+        return self._db.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time.time())).rowcount == 1
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._l1_delete(key)
+        return self._db.execute('DELETE FROM cache WHERE key = ?', (key,)).rowcount == 1
+
+    def has_key(self, key, version=None):
+        return self.get(key, self._missing, version=version) is not self._missing
+
+    def incr(self, key, delta=1, version=None):
+        raw_key, key = key, self.make_and_validate_key(key, version=version)
+        db = self._db
+        # BEGIN IMMEDIATE takes the write lock up front, so read-modify-write
+        # is atomic across threads and processes.
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = self._l2_get(key, time.time())
+            if row is None:
+                raise ValueError(f"Key '{raw_key}' not found")
+            value = pickle.loads(row[0]) + delta
+            pickled = pickle.dumps(value, self.pickle_protocol)
+            db.execute('UPDATE cache SET value = ? WHERE key = ?', (pickled, key))
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        if self._l1_enabled(raw_key):
+            self._l1_set(key, pickled, row[1], time.time())
+        return value
+
+    def clear(self):
+        with self._l1_lock:
+            self._l1.clear()
+        self._db.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Connections are per thread and reused across requests.
+        pass
+
+    # --- introspection ---
+
+    def stats(self):
+        """Counters for this process, plus the current tier sizes."""
+        with self._l1_lock:
+            l1_entries = len(self._l1)
+        l2_entries = self._db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        lookups = self._stats['l1_hits'] + self._stats['l2_hits'] + self._stats['misses']
+        hits = self._stats['l1_hits'] + self._stats['l2_hits']
+        return {
+            **self._stats,
+            'hit_rate': round(hits / lookups, 4) if lookups else None,
+            'l1_entries': l1_entries,
+            'l2_entries': l2_entries,
+        }
@@ -0,0 +1,32 @@
+"""
+Database router for the read-only SQLite connection.
+
+Reads go to the 'replica' alias (a read-only connection to the same WAL
+database file, or a copy of it) and everything else to 'default'. In WAL
+mode a reader works from the last committed snapshot, so API reads keep
+going while `scrape_movies` holds the write lock.
+
+Reads made inside a transaction on 'default' stay on 'default': they have
+to see that transaction's own uncommitted writes (and the read-only
+connection couldn't take part in it anyway).
+"""
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_DB_ALIAS = 'replica'
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if REPLICA_DB_ALIAS not in connections.settings or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return REPLICA_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases are the same database.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -30,6 +30,27 @@ CLERK_SECRET_KEY = 'sk_test_rYwaWKLhneZjY4XppYaAt1xu164yPB4iwHoAZZdIJ2' # Make s
 # Get this from your Clerk Dashboard -> API Keys -> Advanced
 CLERK_JWKS_URL = 'https://current-thrush-1.clerk.accounts.dev/.well-known/jwks.json'
 
+# JWKS refresh policy (see events/jwks.py): keys are refetched in the background
+# CLERK_JWKS_REFRESH_AHEAD seconds before they are CLERK_JWKS_TTL old, and
+# immediately for an unknown kid at most once per CLERK_JWKS_MIN_REFETCH_INTERVAL.
+CLERK_JWKS_TTL = 60 * 60
+CLERK_JWKS_REFRESH_AHEAD = 5 * 60
+CLERK_JWKS_MIN_REFETCH_INTERVAL = 30
+
+# Number of verified session tokens ClerkAuthentication keeps in memory (per process)
+CLERK_TOKEN_CACHE_SIZE = 1024
+
+# Seconds ClerkAuthentication caches the clerk_user_id -> User lookup
+CLERK_USER_CACHE_TTL = 60
+
+# Signing secret of the Clerk webhook endpoint (/api/webhooks/clerk/)
+# Get this from your Clerk Dashboard -> Webhooks -> Signing Secret
+CLERK_WEBHOOK_SECRET = ''
+
+# Fetch unknown users from the Clerk API during authentication. Users are
+# normally created by the webhook; this only catches requests that beat it.
+CLERK_PROVISION_ON_AUTH = True
+
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
@@ -43,7 +64,10 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
-    ]
+    ],
+    # Keyset pagination: constant cost per page, no OFFSET scans.
+    'DEFAULT_PAGINATION_CLASS': 'events.pagination.CreatedAtCursorPagination',
+    'PAGE_SIZE': 20,
 }
 # Application definition
 
@@ -93,13 +117,50 @@ WSGI_APPLICATION = 'core.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite tuning, applied to every new connection:
+# - WAL: readers work from the last commit instead of waiting for a writer
+#   (e.g. a running scrape_movies sync), and commits don't rewrite the database;
+# - synchronous=NORMAL: with WAL only checkpoints fsync; a power cut can lose
+#   the last commits but never corrupts the file;
+# - mmap_size/cache_size: read pages from memory (256 MB mapped, 64 MB page cache);
+# - busy_timeout: wait up to 20 s for the write lock instead of failing at once.
+# Transactions start as IMMEDIATE so writers queue for the lock up front rather
+# than failing with "database is locked" when a read transaction tries to write.
+SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA cache_size=-65536',
+    'PRAGMA busy_timeout=20000',
+    'PRAGMA temp_store=MEMORY',
+]
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'OPTIONS': {
+            'init_command': ';'.join(SQLITE_PRAGMAS),
+            'transaction_mode': 'IMMEDIATE',
+        },
+        # Tests run on a file rather than SQLite's shared-cache in-memory database, which
+        # fails concurrent writers with "table is locked" instead of letting them wait.
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+    },
+    # Read-only connection to the same file, used for reads outside transactions
+    # (see core/routers.py). Point NAME at a copy of the database to read from a replica.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': (BASE_DIR / 'db.sqlite3').as_uri() + '?mode=ro',
+        'OPTIONS': {
+            'init_command': ';'.join(SQLITE_PRAGMAS[2:] + ['PRAGMA query_only=ON']),
+        },
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+DATABASE_ROUTERS = ['core.routers.ReadReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -137,6 +198,26 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploaded event/speaker images, stored by content hash (see events/blobstore.py)
+BLOB_STORE_ROOT = BASE_DIR / 'media' / 'blobs'
+BLOB_MAX_BYTES = 10 * 1024 * 1024
+
+# On-disk cache of KenyaBuzz responses used by scrape_movies (see events/scraping.py)
+SCRAPE_CACHE_DIR = BASE_DIR / '.scrape_cache'
+
+# /api/movies/ is served from a cached snapshot (see events/movie_snapshot.py):
+# rebuilt in the background once older than MOVIES_SNAPSHOT_TTL seconds, and
+# dropped entirely after MOVIES_SNAPSHOT_MAX_STALE seconds.
+MOVIES_SNAPSHOT_TTL = 5 * 60
+MOVIES_SNAPSHOT_MAX_STALE = 24 * 60 * 60
+
+# Engine behind /api/events/search/ (see events/search.py).
+EVENT_SEARCH_BACKEND = 'events.search.SQLiteFTS5Backend'
+
+# Safety-net lifetime of cached anonymous /api/events/ responses; entries are
+# normally invalidated as soon as the data changes (events/response_cache.py).
+EVENTS_RESPONSE_CACHE_TTL = 10 * 60
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -158,9 +239,25 @@ CORS_ALLOW_CREDENTIALS = True
 AUTH_USER_MODEL = 'events.User'
 
 # --- CACHE SETTINGS ---
-# Used by ClerkAuthentication to cache JWKS
+# Used for the JWKS, the /api/movies/ snapshot and cached /api/events/ responses.
+# Two tiers (see core/cache.py): a short-lived per-process LRU in front of a
+# SQLite file that all workers on the machine share, so an invalidation or a
+# refreshed JWKS in one worker is seen by the others.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.TieredCache',
+        'LOCATION': BASE_DIR / '.cache' / 'default.sqlite3',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+            'L1_MAX_ENTRIES': 2000,
+            'L1_TIMEOUT': 5,
+            # Response cache version stamps must be read fresh by every worker.
+            'L1_BYPASS_PREFIXES': ['events_api:v:'],
+        },
     }
-}
\ No newline at end of file
+}
+
+# `manage.py test` moves the cache to its own file (core/test_runner.py);
+# other runners can use core/test_settings.py for the same effect.
+TEST_RUNNER = 'core.test_runner.TestRunner'
\ No newline at end of file
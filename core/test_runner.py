@@ -0,0 +1,26 @@
+"""
+Test runner (settings.TEST_RUNNER) that gives the suite its own cache file.
+
+Tests call cache.clear() freely; with the shared SQLite cache that would
+wipe the dev server's JWKS, user lookups and response cache versions.
+"""
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+def test_caches():
+    """settings.CACHES with the default cache moved to .cache/test.sqlite3."""
+    return {**settings.CACHES, 'default': {**settings.CACHES['default'],
+                                           'LOCATION': settings.BASE_DIR / '.cache' / 'test.sqlite3'}}
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._test_caches = override_settings(CACHES=test_caches())
+        self._test_caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._test_caches.disable()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,9 @@
+"""
+Settings for running the test suite with runners other than `manage.py test`
+(e.g. DJANGO_SETTINGS_MODULE=core.test_settings for pytest). `manage.py test`
+already gets the same cache isolation from core/test_runner.py.
+"""
+from .settings import *  # noqa: F401,F403
+
+# Tests clear the cache freely, so they get their own file instead of the dev server's.
+CACHES = {'default': {**CACHES['default'], 'LOCATION': BASE_DIR / '.cache' / 'test.sqlite3'}}  # noqa: F405
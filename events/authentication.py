@@ -1,15 +1,87 @@
 """
 Authentication backend for Clerk.com
 """
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
 import jwt
-import requests
-import json
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 from django.conf import settings
 from django.core.cache import cache
+from django.db import IntegrityError
+from .clerk import fetch_clerk_user, primary_email, upsert_users, user_cache_key
+from .jwks import jwks_manager
 from .models import User
-from jwt.algorithms import RSAAlgorithm
+
+
+class TokenCache:
+    """
+    Bounded LRU of verified token -> claims.
+
+    The same session token is sent with every request a page makes, so
+    remembering the claims of tokens we have already verified skips the RS256
+    signature check on all but the first. Entries are keyed by a SHA-256 of
+    the token (the raw token never sits in memory as a key) and are dropped
+    at the token's `exp`.
+    """
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token):
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            claims, expires_at = entry
+            if time.time() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return claims
+
+    def set(self, token, claims):
+        expires_at = claims.get('exp')
+        if not isinstance(expires_at, (int, float)):
+            return  # never cache a token that doesn't expire
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (claims, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_token_cache = TokenCache(getattr(settings, 'CLERK_TOKEN_CACHE_SIZE', 1024))
+
+
+
+class _Provisioning:
+    """One in-progress provisioning of a Clerk ID, shared by every request waiting on it."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.waiters = 0  # requests holding a reference; the entry is dropped at zero
+        self.user = None
+        self.error = None
+
+
+# Per-Clerk-ID provisioning so concurrent first requests provision a user only once.
+_provisioning = {}
+_provisioning_lock = threading.Lock()
+
 
 class ClerkAuthentication(BaseAuthentication):
     """
@@ -24,80 +96,105 @@ class ClerkAuthentication(BaseAuthentication):
 
         token = auth_header.split(' ')[1]
 
+        # Tokens we've already verified skip the JWKS lookup and RS256 check.
+        payload = _token_cache.get(token)
+        if payload is None:
+            payload = self.verify_token(token)
+            _token_cache.set(token, payload)
+        clerk_user_id = payload.get('sub')
+
+        if not clerk_user_id:
+            raise AuthenticationFailed('Clerk user ID not found in token.')
+
+        user = self.get_user(clerk_user_id)
+        if not user.is_active:
+            raise AuthenticationFailed('User inactive or deleted.')
+
+        return (user, None) # Authentication successful
+
+    def verify_token(self, token):
+        """Check the token's signature against Clerk's JWKS and return its claims."""
         try:
-            # 1. Fetch JWKS from Clerk, with caching.
-            jwks = cache.get('clerk_jwks')
-            if not jwks:
-                jwks_url = settings.CLERK_JWKS_URL
-                # The JWKS endpoint is public and does not require authorization.
-                jwks_response = requests.get(jwks_url, timeout=10)
-                jwks_response.raise_for_status()
-                jwks = jwks_response.json()
-                # Cache the keys for 1 hour.
-                cache.set('clerk_jwks', jwks, 60 * 60)
-
-            # 2. Decode the token header to find the Key ID (kid)
+            # 1. Decode the token header to find the Key ID (kid)
             unverified_header = jwt.get_unverified_header(token)
             kid = unverified_header.get('kid')
 
-            # 3. Find the correct public key
-            public_key = None
-            for key in jwks['keys']:
-                if key['kid'] == kid:
-                    public_key = RSAAlgorithm.from_jwk(json.dumps(key))
-                    break
-            
+            # 2. Find the correct public key (JWKS fetched and refreshed by the manager)
+            public_key = jwks_manager.get_key(kid)
             if not public_key:
                 raise AuthenticationFailed('Invalid token: Key ID not found.')
 
-            # 4. Verify the token
-            payload = jwt.decode(token, public_key, algorithms=['RS256'], options={"verify_aud": False}, leeway=5)
-            clerk_user_id = payload.get('sub')
+            # 3. Verify the token
+            return jwt.decode(token, public_key, algorithms=['RS256'], options={"verify_aud": False}, leeway=5)
 
         except Exception as e:
             raise AuthenticationFailed(f'Invalid Clerk token: {str(e)}')
 
-        if not clerk_user_id:
-            raise AuthenticationFailed('Clerk user ID not found in token.')
+    def get_user(self, clerk_user_id):
+        """Get or create the user in the local database, via a short-lived cache."""
+        key = user_cache_key(clerk_user_id)
+        user = cache.get(key)
+        if user is None:
+            # Try to find the user by their Clerk ID first
+            user = User.objects.filter(clerk_user_id=clerk_user_id).first()
+            if user is None:
+                user = self.provision_user(clerk_user_id)
+            # Entries are dropped by the User save/delete signals (events/signals.py)
+            cache.set(key, user, getattr(settings, 'CLERK_USER_CACHE_TTL', 60))
+        return user
 
-        # Get or create the user in the local database
+    def provision_user(self, clerk_user_id):
+        """
+        Create a local user for a Clerk ID we haven't seen before.
+
+        A new user's first page load sends a burst of parallel requests; they
+        queue on a per-ID entry so only the first one calls the Clerk API and
+        the rest share its outcome: the row it created, or its error. The
+        entry lives until the last waiting request is done with it.
+        """
+        with _provisioning_lock:
+            flight = _provisioning.get(clerk_user_id)
+            if flight is None:
+                flight = _provisioning[clerk_user_id] = _Provisioning()
+            flight.waiters += 1
         try:
-            # Try to find the user by their Clerk ID first
+            with flight.lock:
+                if flight.error is not None:
+                    raise flight.error
+                if flight.user is None:
+                    user = User.objects.filter(clerk_user_id=clerk_user_id).first()
+                    if user is None:
+                        try:
+                            user = self.create_user_from_clerk(clerk_user_id)
+                        except AuthenticationFailed as e:
+                            flight.error = e
+                            raise
+                    flight.user = user
+                return flight.user
+        finally:
+            with _provisioning_lock:
+                flight.waiters -= 1
+                if not flight.waiters:
+                    del _provisioning[clerk_user_id]
+
+    def create_user_from_clerk(self, clerk_user_id):
+        # Normally the user.created webhook has already inserted the row; this
+        # covers requests that beat the webhook, and can be switched off.
+        if not getattr(settings, 'CLERK_PROVISION_ON_AUTH', True):
+            raise AuthenticationFailed('User has not been synced from Clerk yet.')
+        try:
+            # Fetch user details from Clerk Backend API
+            clerk_user = fetch_clerk_user(clerk_user_id)
+        except Exception as e:
+            raise AuthenticationFailed(f'Could not fetch user details from Clerk or create user: {e}')
+
+        if not primary_email(clerk_user):
+            raise AuthenticationFailed("User doesn't have a primary email address in Clerk.")
+
+        try:
+            # Links an existing user by email, or creates a new one.
+            [user] = upsert_users([clerk_user])
+        except IntegrityError:
+            # Another worker process created the row between our lookup and insert.
             user = User.objects.get(clerk_user_id=clerk_user_id)
-        except User.DoesNotExist:
-            # If the user doesn't exist, fetch their details from Clerk and create them
-            try:
-                # Fetch user details from Clerk Backend API
-                user_url = f'https://api.clerk.com/v1/users/{clerk_user_id}'
-                headers = {'Authorization': f'Bearer {settings.CLERK_SECRET_KEY}'}
-                user_response = requests.get(user_url, headers=headers, timeout=10)
-                user_response.raise_for_status()
-                clerk_user = user_response.json()
-
-                # Extract email
-                email_addresses = clerk_user.get('email_addresses', [])
-                primary_email_id = clerk_user.get('primary_email_address_id')
-                email_address = next((e['email_address'] for e in email_addresses if e['id'] == primary_email_id), None)
-
-                if not email_address:
-                    raise AuthenticationFailed("User doesn't have a primary email address in Clerk.")
-
-                # Use update_or_create to link an existing user by email, or create a new one.
-                user, created = User.objects.update_or_create(
-                    email=email_address,
-                    defaults={
-                        'clerk_user_id': clerk_user_id,
-                        'username': clerk_user.get('username') or email_address.split('@')[0],
-                        'first_name': clerk_user.get('first_name', ''),
-                        'last_name': clerk_user.get('last_name', ''),
-                        'is_active': True,
-                        'is_email_verified': True, # Assumed verified by Clerk
-                    }
-                )
-                if created:
-                    user.set_unusable_password()
-                    user.save()
-            except Exception as e:
-                raise AuthenticationFailed(f'Could not fetch user details from Clerk or create user: {e}')
-
-        return (user, None) # Authentication successful
\ No newline at end of file
+        return user
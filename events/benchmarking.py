@@ -0,0 +1,121 @@
+"""
+Helpers for the benchmark commands (`bench_api`, `bench_sync_reads`).
+
+- `scratch_database()` runs a benchmark on a throwaway, migrated copy of the
+  schema and a throwaway cache, so the real data is never touched;
+  `scratch_cache()` swaps only the cache;
+- `stubbed_clerk()` makes ClerkAuthentication accept locally minted RS256
+  tokens without contacting Clerk, and puts the real keys back afterwards;
+- `summarize()` turns a list of latencies into percentiles.
+"""
+import json
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.test import override_settings
+from jwt.algorithms import RSAAlgorithm
+
+from . import authentication
+from .jwks import CACHE_KEY as JWKS_CACHE_KEY, jwks_manager
+
+BENCH_KID = 'bench-key'
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def summarize(latencies):
+    """p50/p95/p99/mean/max in milliseconds of a list of latencies in seconds."""
+    values = sorted(latencies)
+    summary = {f'p{round(q * 100)}_ms': round(percentile(values, q) * 1000, 2) for q in (0.50, 0.95, 0.99)}
+    summary['mean_ms'] = round(sum(values) / len(values) * 1000, 2) if values else 0.0
+    summary['max_ms'] = round(values[-1] * 1000, 2) if values else 0.0
+    return summary
+
+
+@contextmanager
+def scratch_cache():
+    """Point the cache at a temporary file for the duration of the block."""
+    with tempfile.TemporaryDirectory() as cache_dir, override_settings(CACHES={
+            'default': {**settings.CACHES['default'], 'LOCATION': Path(cache_dir) / 'bench.sqlite3'}}):
+        yield
+
+
+@contextmanager
+def scratch_database():
+    """
+    Point 'default' (and the read-only 'replica') at a freshly migrated test
+    database and the cache at a temporary file for the duration of the block.
+    Yields the database file name.
+    """
+    default = connections['default']
+    with scratch_cache():
+        old_name = default.settings_dict['NAME']
+        test_name = default.creation.create_test_db(verbosity=0, autoclobber=True)
+        replica = connections['replica'] if 'replica' in connections.settings else None
+        if replica:
+            old_replica_name = replica.settings_dict['NAME']
+            replica.settings_dict['NAME'] = Path(test_name).as_uri() + '?mode=ro'
+            replica.close()
+        try:
+            yield test_name
+        finally:
+            connections.close_all()
+            default.creation.destroy_test_db(old_name, verbosity=0)
+            if replica:
+                replica.settings_dict['NAME'] = old_replica_name
+            for suffix in ('-wal', '-shm'):
+                Path(f'{test_name}{suffix}').unlink(missing_ok=True)
+
+
+class TokenMinter:
+    """An RS256 key pair standing in for Clerk's, and the JWKS that publishes it."""
+    def __init__(self, kid=BENCH_KID):
+        self.kid = kid
+        self.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        jwk = json.loads(RSAAlgorithm.to_jwk(self.private_key.public_key()))
+        jwk.update({'kid': kid, 'use': 'sig', 'alg': 'RS256'})
+        self.jwks = {'keys': [jwk]}
+
+    def mint(self, sub, lifetime=60 * 60):
+        now = int(time.time())
+        claims = {'sub': sub, 'iat': now, 'nbf': now, 'exp': now + lifetime}
+        return jwt.encode(claims, self.private_key, algorithm='RS256', headers={'kid': self.kid})
+
+
+def _reset_clerk_keys():
+    jwks_manager.reset()
+    authentication._token_cache.clear()
+
+
+@contextmanager
+def stubbed_clerk(minter, ttl=60 * 60):
+    """
+    Publish `minter`'s key where ClerkAuthentication looks first, the shared
+    cache, alongside any keys already there, so real tokens keep working.
+    In this process the JWKS manager is reset so it reloads from there; a
+    local server sharing the cache file picks it up the first time it loads
+    keys. The previous entry is put back afterwards.
+    """
+    previous = cache.get(JWKS_CACHE_KEY)
+    keys = [jwk for jwk in (previous or {}).get('keys', []) if jwk.get('kid') != minter.kid]
+    cache.set(JWKS_CACHE_KEY, {'keys': keys + minter.jwks['keys']}, ttl)
+    _reset_clerk_keys()
+    try:
+        yield
+    finally:
+        if previous is None:
+            cache.delete(JWKS_CACHE_KEY)
+        else:
+            cache.set(JWKS_CACHE_KEY, previous, jwks_manager.ttl)
+        _reset_clerk_keys()
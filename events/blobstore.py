@@ -0,0 +1,174 @@
+"""
+Local content-addressed blob store for uploaded images.
+
+Event and speaker images used to be stored as Base64 text directly on the row,
+so every list query, serializer pass and JSON response carried the full
+payload. Uploads are now decoded once and written to disk under the SHA-256 of
+their bytes; the row only keeps the resulting key and the API hands out a URL.
+Identical uploads share one file, and because a key never changes content the
+image endpoint can be cached by clients forever.
+"""
+import base64
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+
+# "<sha256>.<ext>", e.g. "9f86d0...0f00a08.png"
+KEY_RE = re.compile(r'^(?P<digest>[0-9a-f]{64})\.(?P<ext>[a-z0-9]{1,5})$')
+# Bare Base64 as an upload would send it: no spaces, at most wrapped onto lines.
+BASE64_RE = re.compile(r'^[A-Za-z0-9+/\r\n]+={0,2}$')
+# Shorter bare strings are treated as text; even a 1x1 GIF encodes to more.
+MIN_BASE64_LENGTH = 32
+
+CONTENT_TYPES = {
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'gif': 'image/gif',
+    'webp': 'image/webp',
+    'bin': 'application/octet-stream',
+}
+
+DATA_URI_EXTENSIONS = {
+    'image/png': 'png',
+    'image/jpeg': 'jpg',
+    'image/jpg': 'jpg',
+    'image/gif': 'gif',
+    'image/webp': 'webp',
+}
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def is_inline_image(value):
+    """
+    True if `value` is a data URI or bare Base64 rather than a link to an image.
+
+    Bare values only count if they look like an encoded file: long enough,
+    correctly padded and decodable, so short text such as "poster" is kept as-is.
+    """
+    if not value:
+        return False
+    if value.startswith('data:'):
+        return True
+    # JPEG payloads start with "/9j/", so a leading slash alone doesn't mean a path.
+    if value.startswith(('http://', 'https://')) or not BASE64_RE.match(value):
+        return False
+    compact = ''.join(value.split())
+    if len(compact) < MIN_BASE64_LENGTH or len(compact) % 4:
+        return False
+    try:
+        base64.b64decode(compact, validate=True)
+    except (binascii.Error, ValueError):
+        return False
+    return True
+
+
+def decode_image(value):
+    """
+    Decode a data URI ("data:image/png;base64,....") or bare Base64 string.
+
+    Returns `(data, ext)`; the extension is sniffed from the bytes and falls
+    back to the data URI's media type.
+    """
+    media_type = None
+    if value.startswith('data:'):
+        header, _, value = value.partition(',')
+        if ';base64' not in header:
+            raise InvalidImage('Only Base64 data URIs are supported.')
+        media_type = header[5:].split(';', 1)[0].lower()
+    try:
+        data = base64.b64decode(''.join(value.split()), validate=True)
+    except (binascii.Error, ValueError):
+        raise InvalidImage('Image is not valid Base64.')
+    if not data:
+        raise InvalidImage('Image is empty.')
+    return data, sniff_extension(data) or DATA_URI_EXTENSIONS.get(media_type, 'bin')
+
+
+def decode_upload(value):
+    """decode_image() plus the BLOB_MAX_BYTES limit; returns `(data, ext)`."""
+    data, ext = decode_image(value)
+    max_bytes = getattr(settings, 'BLOB_MAX_BYTES', None)
+    if max_bytes and len(data) > max_bytes:
+        raise InvalidImage(f'Image is larger than {max_bytes} bytes.')
+    return data, ext
+
+
+def blob_key(data, ext='bin'):
+    return f'{hashlib.sha256(data).hexdigest()}.{ext}'
+
+
+def sniff_extension(data):
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if data.startswith(b'\xff\xd8\xff'):
+        return 'jpg'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+def content_type_for(key):
+    match = KEY_RE.match(key)
+    return CONTENT_TYPES.get(match.group('ext'), CONTENT_TYPES['bin']) if match else CONTENT_TYPES['bin']
+
+
+class BlobStore:
+    """Files live at <root>/<2 hex>/<2 hex>/<key> to keep directories small."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def path(self, key):
+        match = KEY_RE.match(key)
+        if not match:
+            raise KeyError(key)
+        digest = match.group('digest')
+        return self.root / digest[:2] / digest[2:4] / key
+
+    def exists(self, key):
+        try:
+            return self.path(key).is_file()
+        except KeyError:
+            return False
+
+    def put(self, data, ext='bin'):
+        key = blob_key(data, ext)
+        path = self.path(key)
+        if path.is_file():
+            return key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file and rename so readers never see a partial blob.
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        return key
+
+    def put_encoded(self, value):
+        return self.put(*decode_upload(value))
+
+    def open(self, key):
+        return open(self.path(key), 'rb')
+
+    def read(self, key):
+        with self.open(key) as fh:
+            return fh.read()
+
+
+def get_blob_store():
+    return BlobStore(settings.BLOB_STORE_ROOT)
@@ -0,0 +1,176 @@
+"""
+Clerk user sync.
+
+Local User rows are kept up to date by Clerk's `user.*` webhooks (see
+ClerkWebhookView) and the `sync_clerk_users` backfill command, so
+ClerkAuthentication only has to read the database. Both paths go through
+`upsert_users`, which writes a batch of Clerk users with one bulk insert and
+one bulk update and is safe to replay.
+"""
+import base64
+import hashlib
+import hmac
+import time
+
+import requests
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import User
+
+CLERK_API_URL = 'https://api.clerk.com/v1'
+
+# Fields upsert_users writes on existing rows. is_active is left alone: only
+# user.deleted changes it, so a late or replayed user.updated can't undo a deletion.
+SYNCED_FIELDS = ['clerk_user_id', 'email', 'username', 'first_name', 'last_name', 'is_email_verified']
+
+
+class WebhookVerificationError(Exception):
+    pass
+
+
+def user_cache_key(clerk_user_id):
+    return f'clerk_user:{clerk_user_id}'
+
+
+# --- Clerk Backend API ---
+
+def _api_get(path, params=None):
+    headers = {'Authorization': f'Bearer {settings.CLERK_SECRET_KEY}'}
+    response = requests.get(f'{CLERK_API_URL}{path}', headers=headers, params=params, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+
+def fetch_clerk_user(clerk_user_id):
+    return _api_get(f'/users/{clerk_user_id}')
+
+
+def iter_clerk_user_pages(page_size=100):
+    """Yield lists of Clerk users, `page_size` at a time, until the API runs out."""
+    offset = 0
+    while True:
+        page = _api_get('/users', params={'limit': page_size, 'offset': offset, 'order_by': 'created_at'})
+        if isinstance(page, dict):
+            page = page.get('data', [])
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        offset += len(page)
+
+
+# --- Local upserts ---
+
+def primary_email(clerk_user):
+    email_addresses = clerk_user.get('email_addresses') or []
+    primary_email_id = clerk_user.get('primary_email_address_id')
+    return next((e.get('email_address') for e in email_addresses if e.get('id') == primary_email_id), None)
+
+
+def user_fields(clerk_user):
+    """Map a Clerk user object onto User fields, or None if it has no primary email."""
+    email_address = primary_email(clerk_user)
+    if not email_address:
+        return None
+    return {
+        'clerk_user_id': clerk_user['id'],
+        'email': email_address,
+        'username': clerk_user.get('username') or email_address.split('@')[0],
+        'first_name': clerk_user.get('first_name') or '',
+        'last_name': clerk_user.get('last_name') or '',
+        'is_email_verified': True, # Assumed verified by Clerk
+    }
+
+
+def upsert_users(clerk_users, batch_size=500):
+    """
+    Create or update local users for a batch of Clerk user objects.
+
+    Existing rows are matched by clerk_user_id, then by email (linking
+    accounts that predate Clerk). Users without a primary email are skipped.
+    Returns the users in the order given, with None for skipped entries.
+    """
+    records = [user_fields(clerk_user) for clerk_user in clerk_users]
+    wanted = [r for r in records if r]
+    if not wanted:
+        return [None] * len(records)
+
+    with transaction.atomic():
+        clerk_ids = [r['clerk_user_id'] for r in wanted]
+        emails = [r['email'] for r in wanted]
+        by_clerk_id = {u.clerk_user_id: u for u in User.objects.filter(clerk_user_id__in=clerk_ids)}
+        by_email = {u.email: u for u in User.objects.filter(email__in=emails)}
+        usernames = dict(User.objects.filter(username__in=[r['username'] for r in wanted])
+                         .values_list('username', 'pk'))
+
+        to_create, to_update, result = [], [], {}
+        for record in wanted:
+            user = by_clerk_id.get(record['clerk_user_id']) or by_email.get(record['email'])
+            owner = usernames.get(record['username'])
+            if owner is not None and (user is None or owner != user.pk):
+                # Username belongs to someone else; keep it unique with part of the Clerk ID.
+                record['username'] = f"{record['username']}_{record['clerk_user_id'][-8:]}"
+            if user is None:
+                user = User(password=make_password(None), **record)
+                to_create.append(user)
+            else:
+                for field, value in record.items():
+                    setattr(user, field, value)
+                to_update.append(user)
+            usernames[record['username']] = user.pk
+            result[record['clerk_user_id']] = user
+
+        User.objects.bulk_create(to_create, batch_size=batch_size)
+        User.objects.bulk_update(to_update, SYNCED_FIELDS, batch_size=batch_size)
+
+    # Bulk writes skip the post_save signal, so drop cached lookups here.
+    cache.delete_many([user_cache_key(clerk_id) for clerk_id in result])
+    return [result[r['clerk_user_id']] if r else None for r in records]
+
+
+def deactivate_users(clerk_user_ids):
+    """
+    Handle `user.deleted`: the row is deactivated rather than deleted so the
+    events and attendances it owns survive.
+    """
+    updated = User.objects.filter(clerk_user_id__in=clerk_user_ids).update(is_active=False)
+    cache.delete_many([user_cache_key(clerk_id) for clerk_id in clerk_user_ids])
+    return updated
+
+
+# --- Webhook signatures ---
+
+def verify_webhook(body, headers, secret, tolerance=5 * 60):
+    """
+    Verify a Clerk (Svix) webhook signature.
+
+    The signed content is "<svix-id>.<svix-timestamp>.<body>", HMAC-SHA256'd
+    with the base64 part of the "whsec_..." secret. `svix-signature` holds one
+    or more space separated "v1,<base64 signature>" entries.
+    """
+    if not secret:
+        raise WebhookVerificationError('CLERK_WEBHOOK_SECRET is not configured.')
+    msg_id = headers.get('svix-id')
+    timestamp = headers.get('svix-timestamp')
+    signatures = headers.get('svix-signature')
+    if not (msg_id and timestamp and signatures):
+        raise WebhookVerificationError('Missing Svix headers.')
+    try:
+        sent_at = int(timestamp)
+    except ValueError:
+        raise WebhookVerificationError('Invalid timestamp.')
+    if abs(time.time() - sent_at) > tolerance:
+        raise WebhookVerificationError('Timestamp outside tolerance.')
+
+    key = base64.b64decode(secret.split('_', 1)[1] if secret.startswith('whsec_') else secret)
+    signed = f'{msg_id}.{timestamp}.'.encode() + body
+    expected = base64.b64encode(hmac.new(key, signed, hashlib.sha256).digest()).decode()
+    for entry in signatures.split():
+        version, _, signature = entry.partition(',')
+        if version == 'v1' and hmac.compare_digest(signature, expected):
+            return
+    raise WebhookVerificationError('No matching signature.')
@@ -0,0 +1,73 @@
+"""
+Streaming CSV/NDJSON exports.
+
+Rows are read with `values_list(...).iterator(chunk_size=...)` and encoded
+one at a time into a StreamingHttpResponse, so the first bytes go out as
+soon as the first chunk is read and memory stays flat however many rows
+there are. No model instances or serializers are involved.
+"""
+import csv
+import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+CHUNK_SIZE = 2000
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Export columns per dataset: (header, queryset lookup).
+EVENT_COLUMNS = [
+    ('id', 'id'), ('title', 'title'), ('date', 'date'), ('location', 'location'),
+    ('description', 'description'), ('price', 'price'), ('capacity', 'capacity'),
+    ('seats_taken', 'seats_taken'), ('age_limit', 'age_limit'),
+    ('event_planner_name', 'event_planner_name'), ('event_planner_contact', 'event_planner_contact'),
+    ('user', 'user_id'), ('sponsor', 'sponsor_id'), ('created_at', 'created_at'), ('updated_at', 'updated_at'),
+]
+SHOWTIME_COLUMNS = [
+    ('id', 'id'), ('movie', 'movie_id'), ('movie_title', 'movie__title'),
+    ('cinema', 'cinema_id'), ('cinema_name', 'cinema__name'),
+    ('date', 'date'), ('time', 'time'), ('ticket_link', 'ticket_link'),
+]
+ATTENDEE_COLUMNS = [
+    ('id', 'id'), ('name', 'name'), ('email', 'email'), ('user', 'user_id'),
+    ('event', 'event_id'), ('created_at', 'created_at'),
+]
+
+
+class _Echo:
+    """File-like object whose write() returns the text, for csv.writer."""
+    def write(self, value):
+        return value
+
+
+def _csv_cell(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    return value
+
+
+def iter_export(queryset, columns, fmt, chunk_size=CHUNK_SIZE):
+    """Yield the encoded export of `queryset`, one row (bytes) at a time."""
+    headers = [header for header, _ in columns]
+    rows = queryset.values_list(*[lookup for _, lookup in columns]).iterator(chunk_size=chunk_size)
+    if fmt == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(headers).encode('utf-8')
+        for row in rows:
+            yield writer.writerow([_csv_cell(value) for value in row]).encode('utf-8')
+    else:
+        encoder = DjangoJSONEncoder(ensure_ascii=False)
+        for row in rows:
+            yield (encoder.encode(dict(zip(headers, row))) + '\n').encode('utf-8')
+
+
+def export_response(queryset, columns, fmt, filename):
+    response = StreamingHttpResponse(iter_export(queryset, columns, fmt), content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    # Let proxies pass bytes through as they are produced instead of buffering the whole export.
+    response['X-Accel-Buffering'] = 'no'
+    return response
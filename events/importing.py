@@ -0,0 +1,167 @@
+"""
+Streaming bulk import of attendees from CSV or NDJSON.
+
+Rows are parsed lazily from the file and handled `chunk_size` at a time:
+each chunk is validated, its `user` and `event` ids are resolved with one
+query each, seats are taken from Event.seats_taken (see registration.py) with
+one conditional update per event, and the attendees are written with
+bulk_create, all in one transaction per chunk. Memory use depends on the
+chunk size, not the file size. Bad rows are reported with their row number
+and skipped; they don't abort the import.
+
+Columns: name, email, event (id) and optionally user (id, defaults to the
+importing user).
+"""
+import codecs
+import csv
+import json
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import Attendee, Event, User
+from .response_cache import invalidate_events
+
+FORMATS = ('csv', 'ndjson')
+CHUNK_SIZE = 1000
+# Only this many row errors are kept for the report; the rest are just counted.
+MAX_REPORTED_ERRORS = 1000
+
+
+class AttendeeImportRowSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=255)
+    email = serializers.EmailField()
+    event = serializers.IntegerField(min_value=1)
+    user = serializers.IntegerField(min_value=1, required=False)
+
+
+def detect_format(content_type='', filename=''):
+    """'csv' or 'ndjson' from a Content-Type or file name, None if neither says."""
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type in ('text/csv', 'application/csv'):
+        return 'csv'
+    if content_type in ('application/x-ndjson', 'application/ndjson', 'application/jsonl', 'application/x-jsonlines'):
+        return 'ndjson'
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return None
+
+
+def iter_rows(stream, fmt):
+    """
+    Yield (row number, dict) from a binary stream, reading it incrementally.
+    A line that isn't a JSON object yields (row number, None).
+    """
+    lines = codecs.getreader('utf-8-sig')(stream)
+    if fmt == 'csv':
+        for number, row in enumerate(csv.DictReader(lines), start=2):  # row 1 is the header
+            # Empty cells count as missing, so an optional column can be left blank.
+            yield number, {key.strip(): value.strip() for key, value in row.items() if key and value and value.strip()}
+        return
+
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield number, record if isinstance(record, dict) else None
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, row, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row, 'errors': errors})
+
+    def as_dict(self):
+        return {'created': self.created, 'failed': self.failed, 'errors': self.errors}
+
+
+def import_attendees(rows, default_user_id=None, chunk_size=CHUNK_SIZE, result=None, on_chunk=None):
+    """
+    Import (row number, dict) pairs as from `iter_rows`. Returns an ImportResult.
+    `on_chunk(result)` is called after each chunk is written.
+    """
+    result = result or ImportResult()
+    validator = AttendeeImportRowSerializer()
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return result
+        reported = len(result.errors)
+        _import_chunk(chunk, validator, default_user_id, result)
+        result.errors[reported:] = sorted(result.errors[reported:], key=lambda e: e['row'])
+        if on_chunk:
+            on_chunk(result)
+
+
+def _import_chunk(chunk, validator, default_user_id, result):
+    valid = []
+    for number, record in chunk:
+        if record is None:
+            result.add_error(number, {'non_field_errors': ['Not a JSON object.']})
+            continue
+        try:
+            data = validator.run_validation(record)
+        except serializers.ValidationError as e:
+            result.add_error(number, e.detail)
+            continue
+        data.setdefault('user', default_user_id)
+        if data['user'] is None:
+            result.add_error(number, {'user': ['This field is required.']})
+            continue
+        valid.append((number, data))
+    if not valid:
+        return
+
+    # One lookup per foreign key for the whole chunk.
+    user_ids = set(User.objects.filter(pk__in={d['user'] for _, d in valid}).values_list('pk', flat=True))
+    event_ids = set(Event.objects.filter(pk__in={d['event'] for _, d in valid}).values_list('pk', flat=True))
+    wanted = {}
+    for number, data in valid:
+        if data['user'] not in user_ids:
+            result.add_error(number, {'user': [f"No user with id {data['user']}."]})
+        elif data['event'] not in event_ids:
+            result.add_error(number, {'event': [f"No event with id {data['event']}."]})
+        else:
+            wanted.setdefault(data['event'], []).append((number, data))
+
+    with transaction.atomic():
+        attendees = []
+        for event_id, rows in wanted.items():
+            seats = _take_seats(event_id, len(rows))
+            for number, data in rows[:seats]:
+                attendees.append(Attendee(name=data['name'], email=data['email'],
+                                          user_id=data['user'], event_id=event_id))
+            for number, _ in rows[seats:]:
+                result.add_error(number, {'event': ['This event is sold out.']})
+        Attendee.objects.bulk_create(attendees, batch_size=500)
+        invalidate_events(wanted)  # seats_taken changed
+    result.created += len(attendees)
+
+
+def _take_seats(event_id, wanted):
+    """Take up to `wanted` seats on the event in one conditional update; returns how many were taken."""
+    while True:
+        seats_taken, capacity = Event.objects.filter(pk=event_id).values_list('seats_taken', 'capacity').get()
+        seats = max(0, min(wanted, capacity - seats_taken))
+        if seats == 0:
+            return 0
+        # Only applies if nobody took seats since the read; otherwise read again.
+        if Event.objects.filter(pk=event_id, seats_taken=seats_taken).update(
+                seats_taken=F('seats_taken') + seats, updated_at=timezone.now()):
+            return seats
@@ -0,0 +1,149 @@
+"""
+Clerk JWKS manager.
+
+Replaces the plain "cache.get('clerk_jwks') or requests.get(...)" lookup,
+which made every concurrent request block on the JWKS fetch each time the
+cache entry expired. The manager:
+
+- refreshes in a background thread once the keys are close to expiry;
+- lets a single thread fetch while concurrent callers wait on its result;
+- keeps serving the last keys it fetched if Clerk can't be reached;
+- refetches straight away when a token names a kid it hasn't seen
+  (rate limited, so random kids can't be used to hammer Clerk).
+
+Keys are kept as parsed RSA key objects, so a JWK is only converted once.
+"""
+import json
+import logging
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from jwt.algorithms import RSAAlgorithm
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = 'clerk_jwks'
+
+
+class JWKSUnavailable(Exception):
+    pass
+
+
+class JWKSManager:
+    # Minimum seconds between background retries after a failed refresh.
+    retry_after = 5
+
+    def __init__(self, url=None, ttl=None, refresh_ahead=None, min_refetch_interval=None, timeout=10):
+        self._url = url
+        self._ttl = ttl
+        self._refresh_ahead = refresh_ahead
+        self._min_refetch_interval = min_refetch_interval
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self.reset()
+
+    # Settings are read lazily so tests can override them.
+    @property
+    def url(self):
+        return self._url or settings.CLERK_JWKS_URL
+
+    @property
+    def ttl(self):
+        return self._ttl if self._ttl is not None else getattr(settings, 'CLERK_JWKS_TTL', 60 * 60)
+
+    @property
+    def refresh_ahead(self):
+        if self._refresh_ahead is not None:
+            return self._refresh_ahead
+        return getattr(settings, 'CLERK_JWKS_REFRESH_AHEAD', 5 * 60)
+
+    @property
+    def min_refetch_interval(self):
+        if self._min_refetch_interval is not None:
+            return self._min_refetch_interval
+        return getattr(settings, 'CLERK_JWKS_MIN_REFETCH_INTERVAL', 30)
+
+    def reset(self):
+        """Forget all keys (used by tests)."""
+        with self._lock:
+            self._keys = None  # kid -> key object, None until the first load
+            self._expires_at = 0
+            self._last_fetch = 0
+            self._inflight = None  # threading.Event of the fetch in progress
+
+    def get_key(self, kid):
+        """Return the public key for `kid`, or None if Clerk doesn't publish it."""
+        if self._keys is None:
+            self._refresh(use_shared_cache=True)
+        elif time.time() >= self._expires_at - self.refresh_ahead:
+            self._refresh_in_background()
+
+        keys = self._keys or {}
+        if kid in keys:
+            return keys[kid]
+
+        # Unknown kid: Clerk may have rotated keys since our last fetch.
+        if time.time() - self._last_fetch >= self.min_refetch_interval:
+            self._refresh()
+        return (self._keys or {}).get(kid)
+
+    def _refresh_in_background(self):
+        if self._inflight is None:
+            threading.Thread(target=self._refresh, kwargs={'wait': False}, daemon=True).start()
+
+    def _refresh(self, use_shared_cache=False, wait=True):
+        """Fetch the JWKS once no matter how many threads ask at the same time."""
+        with self._lock:
+            done = self._inflight
+            leader = done is None
+            if leader:
+                done = self._inflight = threading.Event()
+
+        if not leader:
+            if wait:
+                done.wait(self.timeout)
+            return
+
+        try:
+            self._load(use_shared_cache)
+        finally:
+            with self._lock:
+                self._inflight = None
+            done.set()
+
+    def _load(self, use_shared_cache):
+        jwks = cache.get(CACHE_KEY) if use_shared_cache else None
+        if jwks is None:
+            self._last_fetch = time.time()
+            try:
+                # The JWKS endpoint is public and does not require authorization.
+                response = requests.get(self.url, timeout=self.timeout)
+                response.raise_for_status()
+                jwks = response.json()
+            except Exception as e:
+                if self._keys is None:
+                    raise JWKSUnavailable(f'Could not fetch Clerk JWKS: {e}')
+                logger.warning('Clerk JWKS refresh failed, serving last known keys: %s', e)
+                # Back off before the next background attempt.
+                self._expires_at = time.time() + self.refresh_ahead + max(self.min_refetch_interval, self.retry_after)
+                return
+            cache.set(CACHE_KEY, jwks, self.ttl)
+
+        self._keys = self._parse(jwks)
+        self._expires_at = time.time() + self.ttl
+
+    def _parse(self, jwks):
+        previous = self._keys or {}
+        keys = {}
+        for jwk in jwks.get('keys', []):
+            kid = jwk.get('kid')
+            if not kid:
+                continue
+            keys[kid] = previous.get(kid) or RSAAlgorithm.from_jwk(json.dumps(jwk))
+        return keys
+
+
+jwks_manager = JWKSManager()
@@ -0,0 +1,132 @@
+import logging
+import re
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from events.models import Cinema, Event, Showtime, Sponsor, User
+from events.urls import router
+
+# A plan step that reads a whole table: "SCAN events_event", or "SCAN TABLE
+# events_event" before SQLite 3.36 (with an index it would be "SEARCH ..." or
+# "SCAN ... USING [COVERING] INDEX ...").
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+TEMP_SORT = re.compile(r'^USE TEMP B-TREE FOR (ORDER BY|GROUP BY|DISTINCT)')
+
+# Extra API requests besides each viewset's list and detail route.
+EXTRA_PATHS = [
+    '/api/events/?expand=showtimes',
+    '/api/events/?fields=id,title,date',
+    '/api/events/search/?q=film',
+    '/api/showtimes/?date=2026-01-01',
+    '/api/showtimes/?cinema=1&date_from=2026-01-01',
+    '/api/showtimes/?movie=1&time_from=18:00',
+]
+
+
+def scrape_movies_queries():
+    """The lookups scrape_movies and events/sync.py make, as (label, queryset, full read expected)."""
+    titles, names = ['Dune'], ['Century Cinemax']
+    return [
+        # A handful of rows; an index on a boolean wouldn't be used anyway.
+        ('scrape_movies: admin user', User.objects.filter(is_superuser=True).order_by('pk')[:1], True),
+        ('scrape_movies: default sponsor', Sponsor.objects.filter(title='KenyaBuzz'), False),
+        ('scrape_movies: movies with showtimes',
+         Event.objects.filter(title__in=titles, showtimes__isnull=False).values_list('title', flat=True).distinct(),
+         False),
+        ('scrape_movies: cinemas with showtimes',
+         Cinema.objects.filter(name__in=names, showtimes__isnull=False).values_list('name', flat=True).distinct(),
+         False),
+        ('sync: events by title', Event.objects.filter(title__in=titles).order_by('id'), False),
+        ('sync: cinemas by name', Cinema.objects.filter(name__in=names).order_by('id'), False),
+        ('sync: kept cinemas', Cinema.objects.filter(name__in=names).values_list('id', flat=True), False),
+        # Diffing against the whole schedule reads every showtime on purpose.
+        ('sync: existing showtimes', Showtime.objects.values_list('id', 'movie_id', 'cinema_id', 'date', 'time'), True),
+        ('sync: touch changed movies', Event.objects.filter(id__in=[1, 2]), False),
+        ('auth: user by Clerk id', User.objects.filter(clerk_user_id='user_123'), False),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Runs the API viewset and scrape_movies queries under EXPLAIN QUERY PLAN and flags full table scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help='Print the plan of every query, not just flagged ones')
+        parser.add_argument('--fail', action='store_true', help='Exit with an error if any query is flagged (for CI)')
+
+    def handle(self, *args, **options):
+        self.verbose = options['verbose_plans']
+        self.flagged = 0
+        self.checked = 0
+
+        self.stdout.write(self.style.WARNING("Auditing API viewsets..."))
+        for label, sql in self.capture_api_queries():
+            self.audit(label, sql)
+
+        self.stdout.write(self.style.WARNING("Auditing scrape_movies queries..."))
+        for label, queryset, full_read in scrape_movies_queries():
+            sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+            self.audit(label, sql, params, full_read=full_read)
+
+        summary = f"Done: {self.checked} queries checked, {self.flagged} flagged."
+        if self.flagged and options['fail']:
+            raise CommandError(summary)
+        self.stdout.write((self.style.ERROR if self.flagged else self.style.SUCCESS)(summary))
+
+    def capture_api_queries(self):
+        """(path, sql) for every SELECT the API runs to answer a GET on each viewset."""
+        client = APIClient(SERVER_NAME='localhost')
+        # An unsaved staff user: passes every permission check without touching the users table.
+        client.force_authenticate(User(pk=0, username='audit', is_staff=True, is_superuser=True))
+        paths = []
+        for prefix, viewset, basename in router.registry:
+            paths += [f'/api/{prefix}/', f'/api/{prefix}/1/']
+        paths += EXTRA_PATHS
+
+        aliases = list(connections.settings)
+        # Detail routes for pk 1 may 404; that's fine, the lookup still ran.
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            yield from self._capture(client, paths, aliases)
+        finally:
+            request_logger.setLevel(level)
+
+    def _capture(self, client, paths, aliases):
+        for path in paths:
+            with ExitStack() as stack:
+                contexts = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in aliases]
+                client.get(path)
+            for context in contexts:
+                for query in context.captured_queries:
+                    if query['sql'].lstrip().upper().startswith('SELECT'):
+                        yield path, query['sql']
+
+    def audit(self, label, sql, params=(), full_read=False):
+        self.checked += 1
+        with connections['default'].cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = [row[-1] for row in cursor.fetchall()]
+
+        problems = []
+        for step in plan:
+            scan = FULL_SCAN.match(step)
+            if scan and not full_read:
+                problems.append(f"full scan of {scan.group(1)}")
+            sort = TEMP_SORT.match(step)
+            # Ranking full-text matches always sorts them; that's not an index problem.
+            if sort and not any('VIRTUAL TABLE' in s for s in plan):
+                problems.append(f"sort for {sort.group(1)}")
+
+        if problems:
+            self.flagged += 1
+            self.stdout.write(self.style.ERROR(f"  ✗ {label}: {', '.join(problems)}"))
+        elif self.verbose:
+            self.stdout.write(self.style.SUCCESS(f"  ✓ {label}"))
+        if problems or self.verbose:
+            self.stdout.write(f"      {sql[:200]}{'...' if len(sql) > 200 else ''}")
+            for step in plan:
+                self.stdout.write(f"      | {step}")
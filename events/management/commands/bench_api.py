@@ -0,0 +1,270 @@
+import datetime
+import json
+import platform
+import sqlite3
+import subprocess
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+
+import django
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from events import seeding
+from events.benchmarking import TokenMinter, scratch_cache, scratch_database, stubbed_clerk, summarize
+from events.models import Event, User
+
+# A regression bigger than this (in p50 or p95) is highlighted by --compare.
+REGRESSION_THRESHOLD = 0.10
+
+
+class Command(BaseCommand):
+    help = ('Benchmarks the API offline: latency percentiles, requests/sec and queries per request for '
+            '/api/events/, /api/movies/ and the authenticated endpoints, saved as JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default=None,
+                            help='Benchmark a running server (e.g. http://127.0.0.1:8000) instead of calling the '
+                                 'app in-process. Uses the database and cache in settings: the bench key is added '
+                                 'to the cached JWKS and bench users to the database, and both are removed '
+                                 'afterwards. Start the server after this has published its JWKS, or with an '
+                                 'empty cache.')
+        parser.add_argument('--use-existing-db', action='store_true',
+                            help='Run in-process against the configured database (with a scratch cache) instead '
+                                 'of a seeded scratch copy; the bench users it creates are deleted afterwards')
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per endpoint (default: 200)')
+        parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests per endpoint first (default: 10)')
+        parser.add_argument('--concurrency', type=int, default=1, help='Client threads per endpoint (default: 1)')
+        parser.add_argument('--endpoint', action='append', default=None,
+                            help='Only run this endpoint (by name); repeatable')
+        parser.add_argument('--events', type=int, default=500, help='Events seeded into the scratch database (default: 500)')
+        parser.add_argument('--seed', type=int, default=42, help='Seed for the scratch data (default: 42)')
+        parser.add_argument('--output', default=None,
+                            help='Where to save the JSON results (default: bench_results/api-<timestamp>.json)')
+        parser.add_argument('--compare', metavar='JSON', default=None,
+                            help='Earlier results to compare against, e.g. from the previous commit')
+
+    def handle(self, *args, **options):
+        self.options = options
+        baseline = self.load(options['compare']) if options['compare'] else None
+
+        # The in-process client sends Host: testserver.
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']), ExitStack() as stack:
+            if options['url']:
+                pass  # The server reads the real cache and database; both are restored below.
+            elif options['use_existing_db']:
+                stack.enter_context(scratch_cache())
+            else:
+                self.stdout.write("Creating scratch database...")
+                stack.enter_context(scratch_database())
+                self.seed()
+            minter = TokenMinter()
+            stack.enter_context(stubbed_clerk(minter))
+            users = stack.enter_context(self.bench_users())
+            results = self.run([minter.mint(user.clerk_user_id) for user in users])
+
+        path = self.save(results)
+        self.stdout.write(self.style.SUCCESS(f"Results saved to {path}"))
+        if baseline:
+            self.compare(baseline, results)
+
+    # --- setup ---
+
+    def seed(self):
+        self.stdout.write(f"Seeding {self.options['events']} events...")
+        seeding.seed(self.options['events'], attendees_per_event=20, showtimes_per_event=8, speakers_per_event=2,
+                     users=200, seed=self.options['seed'])
+
+    @contextmanager
+    def bench_users(self, count=10):
+        """Users with a Clerk ID to sign tokens for; the ones created here are deleted afterwards."""
+        users, created = [], []
+        for i in range(count):
+            user, new = User.objects.get_or_create(
+                clerk_user_id=f'bench_{i}',
+                defaults={'username': f'bench_{i}', 'email': f'bench_{i}@example.com', 'password': '!'},
+            )
+            users.append(user)
+            if new:
+                created.append(user.pk)
+        try:
+            yield users
+        finally:
+            User.objects.filter(pk__in=created).delete()
+
+    def endpoints(self):
+        """(name, path, authenticated) for everything that gets measured."""
+        event = Event.objects.order_by('date', 'id').first()
+        today = timezone.localdate().isoformat()
+        endpoints = [
+            ('events_list_anonymous', '/api/events/', False),
+            ('events_list', '/api/events/', True),
+            ('events_list_sparse', '/api/events/?fields=id,title,date,location', True),
+            ('movies', '/api/movies/', False),
+            ('showtimes', f'/api/showtimes/?date={today}', False),
+            ('users', '/api/users/', True),
+            ('sponsors', '/api/sponsors/', True),
+            ('attendees', '/api/attendees/', True),
+        ]
+        if event is not None:
+            word = event.title.split()[0]
+            endpoints += [
+                ('event_detail_anonymous', f'/api/events/{event.pk}/', False),
+                ('event_detail', f'/api/events/{event.pk}/?expand=showtimes', True),
+                ('events_search', f'/api/events/search/?q={word}', False),
+            ]
+        if self.options['endpoint']:
+            wanted = set(self.options['endpoint'])
+            unknown = wanted - {name for name, _, _ in endpoints}
+            if unknown:
+                raise CommandError(f"Unknown endpoint(s): {', '.join(sorted(unknown))}")
+            endpoints = [endpoint for endpoint in endpoints if endpoint[0] in wanted]
+        return endpoints
+
+    # --- measuring ---
+
+    def run(self, tokens):
+        target = self.options['url'] or 'in-process'
+        self.stdout.write(self.style.WARNING(
+            f"Benchmarking {target}: {self.options['requests']} requests per endpoint, "
+            f"{self.options['concurrency']} at a time"))
+
+        results = {}
+        for name, path, authenticated in self.endpoints():
+            results[name] = self.measure(path, tokens if authenticated else None)
+            results[name]['path'] = path
+            self.report(name, results[name])
+        return results
+
+    def send(self, session, path, token):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        if self.options['url']:
+            return session.get(self.options['url'].rstrip('/') + path, headers=headers).status_code
+        return session.get(path, headers=headers).status_code
+
+    def session(self):
+        return requests.Session() if self.options['url'] else Client()
+
+    def measure(self, path, tokens):
+        options = self.options
+        session = self.session()
+        for i in range(options['warmup']):
+            self.send(session, path, tokens[i % len(tokens)] if tokens else None)
+
+        # Queries per request, from one extra request (only visible in-process).
+        queries = None
+        if not options['url']:
+            with ExitStack() as stack:
+                contexts = [stack.enter_context(CaptureQueriesContext(connections[alias]))
+                            for alias in connections.settings]
+                self.send(session, path, tokens[0] if tokens else None)
+            queries = sum(len(context.captured_queries) for context in contexts)
+
+        latencies, errors = [], []
+        lock = threading.Lock()
+
+        def worker(index, count, session):
+            mine, failed = [], []
+            try:
+                for i in range(count):
+                    token = tokens[(index + i) % len(tokens)] if tokens else None
+                    started = time.perf_counter()
+                    status = self.send(session, path, token)
+                    mine.append(time.perf_counter() - started)
+                    if status >= 400:
+                        failed.append(status)
+            finally:
+                if threading.current_thread() is not threading.main_thread():
+                    connections.close_all()
+            with lock:
+                latencies.extend(mine)
+                errors.extend(failed)
+
+        concurrency = max(1, options['concurrency'])
+        shares = [options['requests'] // concurrency + (i < options['requests'] % concurrency) for i in range(concurrency)]
+        started = time.perf_counter()
+        if concurrency == 1:
+            worker(0, shares[0], session)  # in this thread, so it sees this thread's transaction (tests)
+        else:
+            threads = [threading.Thread(target=worker, args=(i, share, self.session())) for i, share in enumerate(shares)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        elapsed = time.perf_counter() - started
+
+        return {
+            'requests': len(latencies),
+            'errors': len(errors),
+            'error_statuses': sorted(set(errors)),
+            'requests_per_sec': round(len(latencies) / elapsed, 1) if elapsed else None,
+            'queries_per_request': queries,
+            **summarize(latencies),
+        }
+
+    # --- reporting ---
+
+    def report(self, name, result):
+        queries = '-' if result['queries_per_request'] is None else result['queries_per_request']
+        line = (f"  {name:<24} p50 {result['p50_ms']:7.1f} ms  p95 {result['p95_ms']:7.1f} ms  "
+                f"p99 {result['p99_ms']:7.1f} ms  {result['requests_per_sec']:7.1f} req/s  {queries:>3} queries")
+        if result['errors']:
+            self.stdout.write(self.style.ERROR(f"{line}  {result['errors']} errors {result['error_statuses']}"))
+        else:
+            self.stdout.write(line)
+
+    def save(self, results):
+        path = Path(self.options['output'] or settings.BASE_DIR / 'bench_results' /
+                    f"api-{datetime.datetime.now():%Y%m%d-%H%M%S}.json")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        meta = {
+            'timestamp': timezone.now().isoformat(),
+            'commit': self.git_commit(),
+            'target': self.options['url'] or ('in-process' if self.options['use_existing_db'] else 'in-process, scratch db'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'options': {key: self.options[key] for key in
+                        ('requests', 'warmup', 'concurrency', 'events', 'seed', 'use_existing_db', 'url')},
+        }
+        path.write_text(json.dumps({'meta': meta, 'endpoints': results}, indent=2))
+        return path
+
+    @staticmethod
+    def git_commit():
+        try:
+            return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def load(self, path):
+        try:
+            return json.loads(Path(path).read_text())
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Can't read {path}: {e}")
+
+    def compare(self, baseline, results):
+        self.stdout.write(self.style.WARNING(f"Compared with {baseline['meta'].get('commit') or 'baseline'}:"))
+        for name, result in results.items():
+            before = baseline['endpoints'].get(name)
+            if before is None:
+                continue
+            changes = []
+            regressed = False
+            for key in ('p50_ms', 'p95_ms'):
+                old, new = before[key], result[key]
+                change = (new - old) / old if old else 0.0
+                regressed |= change > REGRESSION_THRESHOLD
+                changes.append(f"{key[:3]} {old:.1f} -> {new:.1f} ms ({change:+.0%})")
+            if before.get('queries_per_request') != result['queries_per_request']:
+                regressed |= (result['queries_per_request'] or 0) > (before.get('queries_per_request') or 0)
+                changes.append(f"queries {before.get('queries_per_request')} -> {result['queries_per_request']}")
+            line = f"  {name:<24} " + '  '.join(changes)
+            self.stdout.write(self.style.ERROR(line) if regressed else line)
@@ -0,0 +1,160 @@
+import datetime
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client, override_settings
+from django.utils import timezone
+from events.benchmarking import percentile, scratch_database
+from events.models import Sponsor, User
+from events.sync import ScheduleSnapshot, apply_snapshot
+
+
+class Command(BaseCommand):
+    help = ('Measures API read latency while a schedule sync is writing, on a scratch copy of the schema '
+            '(your database is not touched)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=40, help='Movies in the synced schedule (default: 40)')
+        parser.add_argument('--cinemas', type=int, default=10, help='Cinemas in the synced schedule (default: 10)')
+        parser.add_argument('--days', type=int, default=7, help='Days of showtimes (default: 7)')
+        parser.add_argument('--readers', type=int, default=4, help='Concurrent API readers (default: 4)')
+        parser.add_argument('--duration', type=float, default=5.0,
+                            help='Seconds to measure, once idle and once during syncs (default: 5)')
+        parser.add_argument('--journal-mode', choices=['wal', 'delete'], default='wal',
+                            help="'delete' runs with SQLite's default rollback journal instead of the WAL "
+                                 "profile from settings, for comparison (default: wal)")
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.stdout.write("Creating scratch database...")
+        # The in-process client sends Host: testserver.
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']), scratch_database():
+            if options['journal_mode'] == 'delete':
+                self.use_rollback_journal()
+            self.run_benchmark()
+
+    def use_rollback_journal(self):
+        default = connections['default']
+        options = default.settings_dict['OPTIONS']
+        options['init_command'] = options['init_command'].replace(
+            'journal_mode=WAL', 'journal_mode=DELETE').replace('synchronous=NORMAL', 'synchronous=FULL')
+        default.close()
+        default.ensure_connection()
+
+    def build_snapshots(self, user, sponsor):
+        """Two schedules that differ in half their showtimes, so every sync rewrites a lot."""
+        today = timezone.localdate()
+        snapshots = []
+        for variant in range(2):
+            snapshot = ScheduleSnapshot()
+            for m in range(self.options['movies']):
+                title = f"Bench Movie {m}"
+                snapshot.add_movie(title, f"bench-movie-{m}", {
+                    'image': '', 'description': f"Catch {title} showing now!", 'location': "Various Cinemas",
+                    'price': 850, 'event_planner_name': 'KenyaBuzz Movies', 'event_planner_contact': '0700000000',
+                    'age_limit': '18+', 'capacity': 100, 'user_id': user.pk, 'sponsor_id': sponsor.pk,
+                })
+                for c in range(self.options['cinemas']):
+                    snapshot.cinemas.setdefault(f"Bench Cinema {c}", 'Nairobi')
+                    for d in range(self.options['days']):
+                        day = today + datetime.timedelta(days=d)
+                        for hour in (12, 15, 18 + variant, 21 + variant):
+                            snapshot.showtimes.add((title, f"Bench Cinema {c}", day, datetime.time(hour, 0)))
+            snapshots.append(snapshot)
+        return snapshots
+
+    def run_benchmark(self):
+        user = User.objects.create_superuser(username='bench', email='bench@example.com', password=None)
+        sponsor = Sponsor.objects.create(title="KenyaBuzz", organisation="KenyaBuzz",
+                                         category="Entertainment", industry="Cinema")
+        snapshots = self.build_snapshots(user, sponsor)
+        apply_snapshot(snapshots[0])
+        self.stdout.write(f"Schedule: {len(snapshots[0].events)} movies, {len(snapshots[0].showtimes)} showtimes")
+
+        mode = self.options['journal_mode'].upper()
+        self.stdout.write(self.style.WARNING(f"Journal mode {mode}, {self.options['readers']} readers"))
+        idle = self.measure_reads()
+        self.report("Idle", idle)
+
+        syncs = []
+        stop = threading.Event()
+
+        def sync_loop():
+            variant = 1
+            try:
+                while not stop.is_set():
+                    started = time.perf_counter()
+                    apply_snapshot(snapshots[variant])
+                    syncs.append(time.perf_counter() - started)
+                    variant = 1 - variant
+            finally:
+                connections.close_all()
+
+        writer = threading.Thread(target=sync_loop)
+        writer.start()
+        try:
+            during_sync = self.measure_reads()
+        finally:
+            stop.set()
+            writer.join()
+        self.report("During sync", during_sync)
+        if syncs:
+            self.stdout.write(f"  {len(syncs)} syncs completed, {sum(syncs) / len(syncs) * 1000:.0f} ms each on average")
+
+    def measure_reads(self):
+        """Latencies (seconds) per endpoint from all readers over --duration seconds, plus errors."""
+        date = timezone.localdate().isoformat()
+        endpoints = {
+            # A unique query string per request so the response cache never answers.
+            'events': lambda n: f'/api/events/?fields=id,title,date,location&bench={n}',
+            'showtimes': lambda n: f'/api/showtimes/?date={date}&bench={n}',
+        }
+        results = {name: [] for name in endpoints}
+        errors = []
+        lock = threading.Lock()
+        deadline = time.monotonic() + self.options['duration']
+
+        def reader(index):
+            client = Client()
+            latencies = {name: [] for name in endpoints}
+            n = 0
+            try:
+                while time.monotonic() < deadline:
+                    for name, path in endpoints.items():
+                        n += 1
+                        started = time.perf_counter()
+                        response = client.get(path(f'{index}-{n}'))
+                        latencies[name].append(time.perf_counter() - started)
+                        if response.status_code != 200:
+                            errors.append(f'{name}: HTTP {response.status_code}')
+            except Exception as e:
+                errors.append(f'{type(e).__name__}: {e}')
+            finally:
+                connections.close_all()
+            with lock:
+                for name, values in latencies.items():
+                    results[name].extend(values)
+
+        threads = [threading.Thread(target=reader, args=(i,)) for i in range(self.options['readers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def report(self, label, measured):
+        results, errors = measured
+        self.stdout.write(self.style.SUCCESS(f"{label}:"))
+        for name, values in results.items():
+            values.sort()
+            self.stdout.write(
+                f"  {name:<10} {len(values):>6} reads  "
+                f"p50 {percentile(values, 0.50) * 1000:7.1f} ms  "
+                f"p95 {percentile(values, 0.95) * 1000:7.1f} ms  "
+                f"p99 {percentile(values, 0.99) * 1000:7.1f} ms  "
+                f"max {(values[-1] if values else 0) * 1000:7.1f} ms")
+        if errors:
+            self.stdout.write(self.style.ERROR(f"  {len(errors)} failed reads, e.g. {errors[0]}"))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from events.importing import CHUNK_SIZE, FORMATS, detect_format, import_attendees, iter_rows
+from events.models import User
+
+
+class Command(BaseCommand):
+    help = 'Bulk imports attendees from a CSV or NDJSON file (columns: name, email, event, user)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import')
+        parser.add_argument('--format', choices=FORMATS, default=None,
+                            help='File format (default: from the file extension)')
+        parser.add_argument('--user', default=None,
+                            help='Username to register rows under when they have no user column')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help=f'Rows validated and written per transaction (default: {CHUNK_SIZE})')
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or detect_format(filename=options['path'])
+        if fmt is None:
+            raise CommandError('Could not tell the format from the file name; pass --format csv or --format ndjson.')
+
+        default_user_id = None
+        if options['user']:
+            try:
+                default_user_id = User.objects.get(username=options['user']).pk
+            except User.DoesNotExist:
+                raise CommandError(f"No user named {options['user']!r}.")
+
+        def progress(result):
+            self.stdout.write(f"Imported {result.created} attendees so far ({result.failed} rows rejected)...")
+
+        with open(options['path'], 'rb') as fh:
+            result = import_attendees(iter_rows(fh, fmt), default_user_id=default_user_id,
+                                      chunk_size=max(1, options['chunk_size']), on_chunk=progress)
+
+        for error in result.errors[:20]:
+            self.stdout.write(self.style.WARNING(f"Row {error['row']}: {error['errors']}"))
+        if result.failed > 20:
+            self.stdout.write(self.style.WARNING(f"...and {result.failed - 20} more rejected rows."))
+        self.stdout.write(self.style.SUCCESS(f"Done: {result.created} attendees imported, {result.failed} rows rejected."))
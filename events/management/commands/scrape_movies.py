@@ -1,30 +1,75 @@
 import cloudscraper # <-- Back to using our Cloudflare bypass tool!
-import time # <-- To add our "politeness" delay
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from django.conf import settings
 from django.core.management.base import BaseCommand
-from events.models import Event, User, Sponsor, Cinema, Showtime 
-from django.utils import timezone
+from events.models import Cinema, Event, User, Sponsor
+from events.movie_snapshot import refresh_movies_snapshot
+from events.scraping import ResponseCache, TokenBucket, fetch_with_retry
+from events.sync import ScheduleSnapshot, apply_snapshot
 
 class Command(BaseCommand):
     help = 'Scrapes movies AND their full schedules stealthily from KenyaBuzz'
 
-    def handle(self, *args, **kwargs):
+    movies_url = "https://api-v3.kenyabuzz.com/movies/now-showing-movies"
+    schedules_url = "https://api-v3.kenyabuzz.com/schedule/cinema/fetch-shows"
+    cinemas_url = "https://api-v3.kenyabuzz.com/schedule/cinema/fetch-cinemas"
+
+    headers = {
+        'sec-ch-ua-platform': '"iOS"',
+        'Referer': 'https://www.kenyabuzz.com/',
+        'User-Agent': 'Mozilla/5.0 (iPhone; CPU iPhone OS 18_5 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/18.5 Mobile/15E148 Safari/604.1',
+        'Accept': 'application/json, text/plain, */*',
+        'sec-ch-ua': '"Chromium";v="146", "Not-A.Brand";v="24", "Google Chrome";v="146"',
+        'sec-ch-ua-mobile': '?1',
+        'Content-Type': 'application/json'
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='Number of schedule requests in flight at once (default: 4)')
+        parser.add_argument('--rate', type=float, default=0.5,
+                            help='Maximum requests per second sent to KenyaBuzz (default: 0.5, one every 2 s)')
+        parser.add_argument('--retries', type=int, default=3,
+                            help='Retries per request on network errors, 429 and 5xx (default: 3)')
+        parser.add_argument('--cache-dir', default=None,
+                            help='Directory for the on-disk response cache (default: settings.SCRAPE_CACHE_DIR)')
+        parser.add_argument('--no-cache', action='store_true',
+                            help='Always download and re-apply everything')
+        parser.add_argument('--replay', metavar='DIR', default=None,
+                            help='Run offline from responses recorded in DIR (a cache dir from an earlier run)')
+        parser.add_argument('--full', action='store_true',
+                            help='Re-apply schedules even if their payload is unchanged since the last sync')
+        parser.add_argument('--strategy', choices=['auto', 'movie', 'cinema'], default='auto',
+                            help='Fetch schedules per movie, per cinema, or whichever needs fewer requests (default: auto)')
+
+    def handle(self, *args, **options):
         self.stdout.write(self.style.WARNING("Starting Stealth Sync (Movies + Schedules)..."))
 
-        movies_url = "https://api-v3.kenyabuzz.com/movies/now-showing-movies"
-        schedules_url = "https://api-v3.kenyabuzz.com/schedule/cinema/fetch-shows"
-        
-        headers = {
-            'sec-ch-ua-platform': '"iOS"',
-            'Referer': 'https://www.kenyabuzz.com/',
-            'User-Agent': 'Mozilla/5.0 (iPhone; CPU iPhone OS 18_5 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/18.5 Mobile/15E148 Safari/604.1',
-            'Accept': 'application/json, text/plain, */*',
-            'sec-ch-ua': '"Chromium";v="146", "Not-A.Brand";v="24", "Google Chrome";v="146"',
-            'sec-ch-ua-mobile': '?1',
-            'Content-Type': 'application/json'
-        }
-
-        # Initialize the stealth scraper
-        scraper = cloudscraper.create_scraper(browser={'browser': 'chrome', 'platform': 'windows', 'desktop': True})
+        # THE STEALTH LIMIT: every request (from any thread) takes a token, so we
+        # never ask KenyaBuzz for more than --rate requests per second.
+        self.bucket = TokenBucket(options['rate'])
+        self.retries = options['retries']
+        # cloudscraper sessions aren't thread-safe, so each worker gets its own.
+        self._local = threading.local()
+
+        # Every response is kept on disk and revalidated with ETag/Last-Modified;
+        # --replay serves a recorded cache directory without touching the network.
+        self.responses = None
+        if options['replay']:
+            self.responses = ResponseCache(options['replay'], offline=True)
+        elif not options['no_cache']:
+            self.responses = ResponseCache(options['cache_dir'] or settings.SCRAPE_CACHE_DIR)
+        # Payload hashes of the schedules applied by the last successful sync.
+        use_state = self.responses is not None and not (options['replay'] or options['full'])
+        self.state_path = Path(self.responses.root) / 'sync_state.json' if use_state else None
+        applied = self.load_state()
+        # Upstream requests actually sent vs. answered from the response cache
+        self.counts = {'sent': 0, 'cached': 0}
+        self._counts_lock = threading.Lock()
 
         try:
             # --- 1. PREP THE DATABASE ---
@@ -32,22 +77,25 @@ class Command(BaseCommand):
             if not admin_user:
                 self.stdout.write(self.style.ERROR("No superuser found! Run python manage.py createsuperuser"))
                 return
-                
+
             default_sponsor, _ = Sponsor.objects.get_or_create(
-                title="KenyaBuzz", 
+                title="KenyaBuzz",
                 defaults={"organisation": "KenyaBuzz", "category": "Entertainment", "industry": "Cinema"}
             )
 
-            self.stdout.write("Clearing old showtimes from database...")
-            Showtime.objects.all().delete()
+            # Nothing is written until the whole schedule is in memory; see events/sync.py.
+            snapshot = ScheduleSnapshot()
+
+            started = time.monotonic()
+            timings = {}
 
             # --- 2. FETCH MOVIES ---
             self.stdout.write("Fetching Movies...")
             # We use scraper.get and increased timeout to 30!
-            response = scraper.get(movies_url, headers=headers, timeout=30)
-            response.raise_for_status() 
+            response = self.request('GET', self.movies_url)
+            response.raise_for_status()
             movies_data = response.json()
-            
+
             if isinstance(movies_data, list):
                 movies_list = movies_data
             elif isinstance(movies_data, dict):
@@ -55,101 +103,205 @@ class Command(BaseCommand):
             else:
                 movies_list = []
 
-            # --- 3. LOOP MOVIES & FETCH SCHEDULES ---
             for movie_data in movies_list:
                 if not isinstance(movie_data, dict):
                     continue
 
                 title = movie_data.get('movie_name', 'Unknown Title')
-                movie_slug = movie_data.get('movie_slug')
-                image_url = movie_data.get('poster', '')
                 rating = movie_data.get('rating', '18+')
+                snapshot.add_movie(title, movie_data.get('movie_slug'), {
+                    'image': movie_data.get('poster', ''),
+                    'description': movie_data.get('synopsis', f"Catch {title} showing now!"),
+                    'location': "Various Cinemas",
+                    'price': 850,
+                    'event_planner_name': 'KenyaBuzz Movies',
+                    'event_planner_contact': '0700000000',
+                    'age_limit': str(rating),
+                    'capacity': 100,
+                    'user_id': admin_user.pk,
+                    'sponsor_id': default_sponsor.pk,
+                })
+
+            timings['movies'] = time.monotonic() - started
 
-                # Save the Event (Movie)
-                event_obj, _ = Event.objects.update_or_create(
-                    title=title, 
-                    defaults={
-                        'image': image_url,
-                        'description': movie_data.get('synopsis', f"Catch {title} showing now!"),
-                        'location': "Various Cinemas", 
-                        'price': 850, 
-                        'event_planner_name': 'KenyaBuzz Movies',
-                        'event_planner_contact': '0700000000',
-                        'age_limit': str(rating),
-                        'capacity': 100,
-                        'date': timezone.now(), 
-                        'user': admin_user,
-                        'sponsor': default_sponsor
-                    }
+            # --- 3. FETCH SCHEDULES CONCURRENTLY ---
+            # Either one request per movie, or one per cinema (each cinema's
+            # schedule lists every movie it shows), whichever is fewer.
+            strategy, jobs = self.plan_jobs(snapshot, options['strategy'])
+            if strategy == 'cinema':
+                scheduled = set(
+                    Cinema.objects.filter(name__in=[label for _, _, label in jobs], showtimes__isnull=False)
+                    .values_list('name', flat=True).distinct()
                 )
+            else:
+                # Movies we have showtimes for; only these can skip an unchanged schedule.
+                scheduled = set(
+                    Event.objects.filter(title__in=list(snapshot.events), showtimes__isnull=False)
+                    .values_list('title', flat=True).distinct()
+                )
+            new_state, unchanged = {}, 0
 
-                if not movie_slug:
-                    continue 
+            with ThreadPoolExecutor(max_workers=max(1, options['concurrency'])) as pool:
+                futures = {
+                    pool.submit(self.fetch_schedule, kind, slug): (kind, slug, label)
+                    for kind, slug, label in jobs
+                }
+                for future in as_completed(futures):
+                    kind, slug, label = futures[future]
+                    # A movie title, or a cinema name in per-cinema mode
+                    keep = snapshot.keep_existing if kind == 'm' else snapshot.keep_existing_cinema
+                    try:
+                        sched_res = future.result()
+                    except Exception as e:
+                        print(f"⚠️ Network error on {label}, keeping its current schedule: {e}")
+                        keep(label)
+                        continue
+                    if sched_res is None:
+                        keep(label)
+                        continue
 
-                # THE STEALTH DELAY: Wait 2 seconds before asking for schedules so we don't look like a bot spamming them
-                time.sleep(2)
+                    state_key = f'{kind}:{slug}'
+                    payload_hash = getattr(sched_res, 'sha256', None)
+                    if payload_hash and applied.get(state_key) == payload_hash and label in scheduled:
+                        # Same payload as last time: nothing to parse or write.
+                        keep(label)
+                        new_state[state_key] = payload_hash
+                        unchanged += 1
+                        continue
 
-                # Fetch the Schedule for this specific movie
-                payload = {"a": "m", "b": movie_slug, "c": False}
-                
-                try:
-                    sched_res = scraper.post(schedules_url, headers=headers, json=payload, timeout=30)
-                    if sched_res.status_code != 200:
+                    schedule_data = sched_res.json()
+                    if not isinstance(schedule_data, dict) or not isinstance(schedule_data.get('data'), list):
+                        print(f"⚠️ Skipped Showtimes for: {label} (No schedules available)")
                         continue
-                except Exception as e:
-                    print(f"⚠️ Network timeout on {title}, skipping schedules and moving to next...")
-                    continue
+                    snapshot.add_schedule(schedule_data, movie_slug=slug if kind == 'm' else None)
+                    if payload_hash:
+                        new_state[state_key] = payload_hash
+            timings['schedules'] = time.monotonic() - started - timings['movies']
 
-                schedule_data = sched_res.json()
-                cinemas_list = schedule_data.get('data', [])
+            for title, count in snapshot.showtime_counts().items():
+                if title not in snapshot.kept:
+                    print(f"✅ Synced: {title} ({count} showtimes found)")
+            if unchanged:
+                self.stdout.write(f"{unchanged} schedules unchanged since the last sync, skipped.")
 
-                if not isinstance(cinemas_list, list):
-                    print(f"⚠️ Skipped Showtimes for: {title} (No schedules available)")
-                    continue
+            # --- 4. APPLY THE DIFF IN ONE TRANSACTION ---
+            apply_started = time.monotonic()
+            stats = apply_snapshot(snapshot)
+            self.save_state(new_state)
+            # Publish the new schedule to /api/movies/ straight away.
+            refresh_movies_snapshot()
+            timings['apply'] = time.monotonic() - apply_started
+            timings['total'] = time.monotonic() - started
+            self.stdout.write(
+                f"Events: {stats['events_created']} created, {stats['events_updated']} updated. "
+                f"Cinemas: {stats['cinemas_created']} created. "
+                f"Showtimes: {stats['showtimes_created']} added, {stats['showtimes_deleted']} removed."
+            )
+            self.stdout.write(
+                f"Strategy: per-{strategy}, {len(jobs)} schedule requests. "
+                f"Requests: {self.counts['sent']} sent upstream, {self.counts['cached']} answered from cache."
+            )
+            self.stdout.write("Timings: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items()))
 
-                showtimes_created = 0
+            self.stdout.write(self.style.SUCCESS("\n🎉 SUCCESS! Your database is now fully synced with real-time cinemas and schedules!"))
 
-                # --- 4. EXTRACT CINEMAS & SHOWTIMES ---
-                for cinema_item in cinemas_list:
-                    if not isinstance(cinema_item, dict):
-                        continue
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"Script failed: {e}"))
 
-                    cin_info = cinema_item.get('cinema', {})
-                    cinema_name = cin_info.get('cinema_name', 'Unknown Cinema').strip()
-                    
-                    cinema_obj, _ = Cinema.objects.get_or_create(
-                        name=cinema_name,
-                        defaults={'location': cin_info.get('cinema_address', 'Nairobi')}
-                    )
-
-                    for date_item in cinema_item.get('dates', []):
-                        if not isinstance(date_item, dict):
-                            continue
-                        
-                        m_date = date_item.get('movie_date')
-                        
-                        for m_data in date_item.get('movies', []):
-                            if not isinstance(m_data, dict):
-                                continue
-                                
-                            for show in m_data.get('shows', []):
-                                if not isinstance(show, dict):
-                                    continue
-                                    
-                                m_time = show.get('movie_time')
-                                
-                                if m_date and m_time:
-                                    Showtime.objects.create(
-                                        movie=event_obj,
-                                        cinema=cinema_obj,
-                                        date=m_date,
-                                        time=m_time
-                                    )
-                                    showtimes_created += 1
-
-                print(f"✅ Synced: {title} ({showtimes_created} showtimes found)")
+    @property
+    def scraper(self):
+        scraper = getattr(self._local, 'scraper', None)
+        if scraper is None:
+            # Initialize the stealth scraper
+            scraper = self._local.scraper = cloudscraper.create_scraper(
+                browser={'browser': 'chrome', 'platform': 'windows', 'desktop': True}
+            )
+        return scraper
 
-            self.stdout.write(self.style.SUCCESS("\n🎉 SUCCESS! Your database is now fully synced with real-time cinemas and schedules!"))
+    def request(self, method, url, payload=None):
+        """Send one request through the response cache, rate limiter and retries."""
+        def send(extra_headers):
+            self.count('sent')
+            headers = {**self.headers, **extra_headers}
+            if method == 'GET':
+                return self.scraper.get(url, headers=headers, timeout=30)
+            return self.scraper.post(url, headers=headers, json=payload, timeout=30)
+
+        if self.responses is None:
+            return fetch_with_retry(lambda: send({}), self.bucket, self.retries)
+        if self.responses.offline:
+            response = self.responses.fetch(send, method, url, payload)
+        else:
+            response = fetch_with_retry(lambda: self.responses.fetch(send, method, url, payload), self.bucket, self.retries)
+        if getattr(response, 'from_cache', False):
+            self.count('cached')
+        return response
+
+    def count(self, name):
+        with self._counts_lock:
+            self.counts[name] += 1
 
+    def plan_jobs(self, snapshot, strategy):
+        """
+        Return (strategy, [(kind, slug, label), ...]) for the schedule fetches.
+
+        Per-movie costs one request per movie; per-cinema costs one request for
+        the cinema list plus one per cinema. `auto` estimates the cinema count
+        from the database before spending a request on the list.
+        """
+        movie_jobs = [('m', slug, title) for slug, title in snapshot.slugs.items()]
+        if strategy == 'movie':
+            return 'movie', movie_jobs
+        if strategy == 'auto' and Cinema.objects.count() + 1 >= len(movie_jobs):
+            return 'movie', movie_jobs
+
+        cinemas = self.fetch_cinemas()
+        if not cinemas:
+            self.stdout.write(self.style.WARNING("Could not list cinemas, fetching schedules per movie instead."))
+            return 'movie', movie_jobs
+        if strategy == 'auto' and len(cinemas) >= len(movie_jobs):
+            return 'movie', movie_jobs
+        for slug, name, address in cinemas:
+            snapshot.cinemas.setdefault(name, address)
+        return 'cinema', [('c', slug, name) for slug, name, _ in cinemas]
+
+    def fetch_cinemas(self):
+        """List (slug, name, address) for every cinema KenyaBuzz has schedules for."""
+        try:
+            response = self.request('GET', self.cinemas_url)
+            response.raise_for_status()
+            data = response.json()
         except Exception as e:
-            self.stdout.write(self.style.ERROR(f"Script failed: {e}"))
\ No newline at end of file
+            print(f"⚠️ Cinema list unavailable: {e}")
+            return []
+        items = data.get('data', []) if isinstance(data, dict) else data
+        cinemas = []
+        for item in items if isinstance(items, list) else []:
+            if not isinstance(item, dict):
+                continue
+            slug = item.get('cinema_slug') or item.get('slug')
+            name = (item.get('cinema_name') or '').strip()
+            if slug and name:
+                cinemas.append((slug, name, item.get('cinema_address', 'Nairobi')))
+        return cinemas
+
+    def fetch_schedule(self, kind, slug):
+        """Fetch the Schedule for one movie ("m") or one cinema ("c") (runs on a worker thread)."""
+        payload = {"a": kind, "b": slug, "c": False}
+        sched_res = self.request('POST', self.schedules_url, payload)
+        if sched_res.status_code != 200:
+            return None
+        return sched_res
+
+    def load_state(self):
+        if self.state_path is None:
+            return {}
+        try:
+            return json.loads(self.state_path.read_text())
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def save_state(self, state):
+        if self.state_path is not None:
+            self.state_path.parent.mkdir(parents=True, exist_ok=True)
+            self.state_path.write_text(json.dumps(state, sort_keys=True))
@@ -1,14 +1,67 @@
 
 
-from django.core.management.base import BaseCommand
+import time
+
+from django.core.management.base import BaseCommand, CommandError
 from datetime import timezone
 from faker import Faker
+from events import registration, seeding
 from events.models import User, Sponsor, Event, Speaker, Attendee
 
 class Command(BaseCommand):
-    help = 'Seeds the database with initial data'
+    help = ('Seeds the database with initial data, or with generated data at any scale when --events is given '
+            '(see events/seeding.py)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--events', type=int, default=None,
+                            help='Generate this many synthetic events instead of the hand-written ones')
+        parser.add_argument('--attendees-per-event', type=int, default=0, help='Attendees per generated event (default: 0)')
+        parser.add_argument('--showtimes', type=int, default=0, help='Showtimes per generated event (default: 0)')
+        parser.add_argument('--speakers-per-event', type=int, default=0, help='Speakers per generated event (default: 0)')
+        parser.add_argument('--users', type=int, default=1000, help='Users to create (default: 1000)')
+        parser.add_argument('--sponsors', type=int, default=50, help='Sponsors to create (default: 50)')
+        parser.add_argument('--cinemas', type=int, default=20, help='Cinemas the showtimes are spread over (default: 20)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed; the same seed gives the same data (default: 42)')
+        parser.add_argument('--batch-size', type=int, default=seeding.BATCH_SIZE,
+                            help=f'Events written per transaction (default: {seeding.BATCH_SIZE})')
+        parser.add_argument('--append', action='store_true', help='Keep existing data instead of deleting it first')
+
+    def handle(self, *args, **options):
+        if options['events'] is None:
+            self.seed_examples()
+        else:
+            self.seed_generated(options)
+
+    def seed_generated(self, options):
+        total = options['events']
+        counts = dict(
+            attendees_per_event=options['attendees_per_event'], showtimes_per_event=options['showtimes'],
+            speakers_per_event=options['speakers_per_event'], users=options['users'], sponsors=options['sponsors'],
+            cinemas=options['cinemas'], batch_size=options['batch_size'],
+        )
+        # Refuse before wiping, so bad options don't leave an empty database behind.
+        try:
+            seeding.check_options(total, **counts)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if not options['append']:
+            self.stdout.write('Deleting existing data...')
+            seeding.wipe()
+
+        self.stdout.write(f'Generating {total} events...')
+        started = time.monotonic()
+
+        def progress(result):
+            elapsed = time.monotonic() - started
+            self.stdout.write(f"  {result.counts['events']}/{total} events, {result.rows} rows "
+                              f"({result.rows / elapsed:,.0f} rows/s)")
+
+        result = seeding.seed(total, seed=options['seed'], on_batch=progress, **counts)
+        summary = ', '.join(f'{count} {name}' for name, count in result.counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.monotonic() - started:.1f}s: {summary}.'))
 
-    def handle(self, *args, **kwargs):
+    def seed_examples(self):
         self.stdout.write('Seeding database with 30 events...')
         
         fake = Faker()
@@ -345,8 +398,9 @@ class Command(BaseCommand):
         user2 = User.objects.create_user(username="david", email="david@mail.com", password="password", age=25, gender="Male")
         user3 = User.objects.create_user(username="jenny", email="jenny@mail.com", password="password", age=22, gender="Female")
 
-        Attendee.objects.create(name="Samantha Lee", email="samanthalee@example.com", user=user, event=created_events[2])
-        Attendee.objects.create(name="David Kim", email="davidkim@example.com", user=user2, event=created_events[0])
-        Attendee.objects.create(name="Jennifer Chen", email="jenniferchen@example.com", user=user3, event=created_events[2])
+        # Through the reservation path, so each attendee takes a seat (Event.seats_taken).
+        registration.register_attendee(created_events[2].pk, name="Samantha Lee", email="samanthalee@example.com", user=user)
+        registration.register_attendee(created_events[0].pk, name="David Kim", email="davidkim@example.com", user=user2)
+        registration.register_attendee(created_events[2].pk, name="Jennifer Chen", email="jenniferchen@example.com", user=user3)
 
         self.stdout.write(self.style.SUCCESS('Successfully seeded the database with 30 events!'))
\ No newline at end of file
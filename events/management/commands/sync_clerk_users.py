@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from events.clerk import iter_clerk_user_pages, upsert_users
+
+
+class Command(BaseCommand):
+    help = 'Backfills local users from the Clerk API, one page at a time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=100, help='Users per Clerk API page (max 500)')
+
+    def handle(self, *args, **options):
+        page_size = max(1, min(options['page_size'], 500))
+        synced = skipped = 0
+
+        for page in iter_clerk_user_pages(page_size):
+            users = upsert_users(page)
+            page_synced = sum(1 for user in users if user is not None)
+            synced += page_synced
+            skipped += len(users) - page_synced
+            self.stdout.write(f"Synced {synced} users so far...")
+
+        self.stdout.write(self.style.SUCCESS(f"Done: {synced} users synced, {skipped} skipped (no primary email)."))
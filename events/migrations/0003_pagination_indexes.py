@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('events', '0002_cinema_showtime'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendee',
+            index=models.Index(fields=['-created_at', '-id'], name='attendee_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['date', 'id'], name='event_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='speaker',
+            index=models.Index(fields=['-created_at', '-id'], name='speaker_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sponsor',
+            index=models.Index(fields=['-created_at', '-id'], name='sponsor_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['-created_at', '-id'], name='user_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0003_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='image_key',
+            field=models.CharField(blank=True, default='', max_length=80),
+        ),
+        migrations.AddField(
+            model_name='speaker',
+            name='image_key',
+            field=models.CharField(blank=True, default='', max_length=80),
+        ),
+        migrations.AlterField(
+            model_name='event',
+            name='image',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AlterField(
+            model_name='speaker',
+            name='image',
+            field=models.TextField(blank=True),
+        ),
+    ]
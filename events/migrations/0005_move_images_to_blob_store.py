@@ -0,0 +1,45 @@
+# Moves Base64 images stored inline on Event/Speaker rows into the blob store.
+
+import base64
+
+from django.db import migrations
+
+from events.blobstore import InvalidImage, content_type_for, get_blob_store, is_inline_image
+
+MODELS = ('Event', 'Speaker')
+
+
+def move_to_blob_store(apps, schema_editor):
+    store = get_blob_store()
+    for model_name in MODELS:
+        Model = apps.get_model('events', model_name)
+        rows = Model.objects.filter(image_key='').exclude(image='').only('id', 'image')
+        for row in rows.iterator(chunk_size=100):
+            if not is_inline_image(row.image):
+                continue
+            try:
+                key = store.put_encoded(row.image)
+            except InvalidImage:
+                continue
+            Model.objects.filter(pk=row.pk).update(image='', image_key=key)
+
+
+def restore_inline(apps, schema_editor):
+    store = get_blob_store()
+    for model_name in MODELS:
+        Model = apps.get_model('events', model_name)
+        for row in Model.objects.exclude(image_key='').only('id', 'image_key').iterator(chunk_size=100):
+            encoded = base64.b64encode(store.read(row.image_key)).decode('ascii')
+            data_uri = f'data:{content_type_for(row.image_key)};base64,{encoded}'
+            Model.objects.filter(pk=row.pk).update(image=data_uri, image_key='')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0004_image_blob_keys'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_to_blob_store, restore_inline),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0005_move_images_to_blob_store'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='showtime',
+            index=models.Index(fields=['date', 'time'], name='showtime_date_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='showtime',
+            index=models.Index(fields=['cinema', 'date', 'time'], name='showtime_cinema_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='showtime',
+            index=models.Index(fields=['movie', 'date', 'time'], name='showtime_movie_date_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Creates the full-text search index for /api/events/search/ (see events/search.py).
+
+from django.db import migrations
+
+from events.search import SQLiteFTS5Backend
+
+
+def install(apps, schema_editor):
+    SQLiteFTS5Backend().install(schema_editor)
+
+
+def uninstall(apps, schema_editor):
+    SQLiteFTS5Backend().uninstall(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0006_showtime_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:52
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_existing_attendees(apps, schema_editor):
+    Event = apps.get_model('events', 'Event')
+    Attendee = apps.get_model('events', 'Attendee')
+    counts = (Attendee.objects.filter(event=OuterRef('pk')).order_by()
+              .values('event').annotate(n=Count('id')).values('n'))
+    Event.objects.update(seats_taken=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0007_event_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='seats_taken',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_existing_attendees, migrations.RunPython.noop),
+    ]
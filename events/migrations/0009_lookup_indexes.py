@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0008_event_seats_taken'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cinema',
+            index=models.Index(fields=['name'], name='cinema_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['title'], name='event_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['updated_at'], name='event_updated_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='speaker',
+            index=models.Index(fields=['updated_at'], name='speaker_updated_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sponsor',
+            index=models.Index(fields=['title'], name='sponsor_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sponsor',
+            index=models.Index(fields=['updated_at'], name='sponsor_updated_at_idx'),
+        ),
+    ]
@@ -13,6 +13,12 @@ class User(AbstractUser):
     is_email_verified = models.BooleanField(default=False)
     clerk_user_id = models.CharField(max_length=255, unique=True, null=True, blank=True)
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Backs the keyset pagination ordering in the users endpoint
+            models.Index(fields=['-created_at', '-id'], name='user_created_id_idx'),
+        ]
+
     def __str__(self):
         return self.username
 
@@ -28,17 +34,27 @@ class Sponsor(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='sponsor_created_id_idx'),
+            models.Index(fields=['title'], name='sponsor_title_idx'), # scrape_movies' default sponsor lookup
+            # Lets the list ETag's MAX(updated_at)/COUNT read a small index instead of every row
+            models.Index(fields=['updated_at'], name='sponsor_updated_at_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
 
 class Event(models.Model):
     title = models.CharField(max_length=255)
-    image = models.TextField() # Used TextField to accommodate long Base64 strings
+    image = models.TextField(blank=True) # External image URL; uploaded images live in the blob store
+    image_key = models.CharField(max_length=80, blank=True, default='') # Blob store key, see events/blobstore.py
     description = models.TextField()
     location = models.CharField(max_length=255)
     age_limit = models.CharField(max_length=50)
     capacity = models.IntegerField()
+    seats_taken = models.PositiveIntegerField(default=0) # Attendee count, maintained by events/registration.py
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='events')
     sponsor = models.ForeignKey(Sponsor, on_delete=models.SET_NULL, null=True, related_name='sponsored_events')
     date = models.DateTimeField()
@@ -48,6 +64,13 @@ class Event(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'id'], name='event_date_id_idx'),
+            models.Index(fields=['title'], name='event_title_idx'), # scrape_movies matches movies by title
+            models.Index(fields=['updated_at'], name='event_updated_at_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -58,10 +81,17 @@ class Speaker(models.Model):
     event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='speakers')
     organisation = models.CharField(max_length=255)
     job_title = models.CharField(max_length=255)
-    image = models.TextField()
+    image = models.TextField(blank=True)
+    image_key = models.CharField(max_length=80, blank=True, default='')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='speaker_created_id_idx'),
+            models.Index(fields=['updated_at'], name='speaker_updated_at_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -74,6 +104,11 @@ class Attendee(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='attendee_created_id_idx'),
+        ]
+
     def __str__(self):
         return self.name
     
@@ -82,6 +117,12 @@ class Cinema(models.Model):
     name = models.CharField(max_length=255) # e.g., "Century Cinemax Sarit Centre"
     location = models.CharField(max_length=255) # e.g., "Westlands, Nairobi"
 
+    class Meta:
+        indexes = [
+            # scrape_movies matches cinemas by name (not unique: upstream has repeated names)
+            models.Index(fields=['name'], name='cinema_name_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -92,5 +133,15 @@ class Showtime(models.Model):
     time = models.TimeField() # e.g., 14:30:00
     ticket_link = models.URLField(max_length=500, blank=True, null=True) # The actual KenyaBuzz checkout link!
 
+    class Meta:
+        # Back /api/showtimes/: the listing walks (date, time), and filtering by
+        # cinema or movie narrows to one range of the matching index that is
+        # already in (date, time) order, so no sort step is needed.
+        indexes = [
+            models.Index(fields=['date', 'time'], name='showtime_date_time_idx'),
+            models.Index(fields=['cinema', 'date', 'time'], name='showtime_cinema_date_idx'),
+            models.Index(fields=['movie', 'date', 'time'], name='showtime_movie_date_idx'),
+        ]
+
     def __str__(self):
         return f"{self.movie.title} at {self.cinema.name} - {self.time}"    
\ No newline at end of file
@@ -0,0 +1,124 @@
+"""
+Precomputed payload for KenyaBuzzMoviesView (/api/movies/).
+
+The endpoint used to scrape kenyabuzz.com on every hit. It now serves a
+snapshot built from the Event/Showtime/Cinema rows that `scrape_movies`
+keeps up to date, stored in the cache. A snapshot older than
+MOVIES_SNAPSHOT_TTL is still served while one background thread rebuilds
+it (stale-while-revalidate), so response time doesn't depend on upstream
+or on the rebuild, and the endpoint keeps working through upstream outages.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Min, Prefetch, Q
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Event, Showtime
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = 'movies_snapshot'
+# Movies listed, soonest showing first (the old live scrape also stopped at 15).
+MOVIES_LIMIT = 15
+REFRESH_LOCK_KEY = 'movies_snapshot:refreshing'
+
+# Shown when nothing has been synced yet, so the React frontend still renders.
+FALLBACK_MOVIES = [
+    {
+        "id": "1", "title": "Dune: Part Two (Fallback Data)",
+        "posterImage": "https://images.unsplash.com/photo-1536440136628-849c177e76a1?w=800&q=80",
+        "cinema": "Century Cinemax - Sarit", "genre": "Sci-Fi", "duration": "2h 46m",
+        "showtimes": ["11:00 AM", "2:30 PM", "6:00 PM"]
+    }
+]
+
+
+def format_time(value):
+    return f"{value.hour % 12 or 12}:{value.minute:02d} {'AM' if value.hour < 12 else 'PM'}"
+
+
+def build_movies_snapshot():
+    """
+    The /api/movies/ payload: the synced movies that are still showing, each
+    with its next day of showtimes. Movies the sync no longer schedules have
+    no upcoming showtimes and drop out.
+    """
+    today = timezone.localdate()
+    upcoming = Showtime.objects.filter(date__gte=today).select_related('cinema').order_by('date', 'time')
+    movies = (
+        Event.objects.filter(event_planner_name='KenyaBuzz Movies')
+        .annotate(next_show=Min('showtimes__date', filter=Q(showtimes__date__gte=today)))
+        .filter(next_show__isnull=False)
+        .only('id', 'title', 'image', 'image_key')
+        .prefetch_related(Prefetch('showtimes', queryset=upcoming, to_attr='upcoming_showtimes'))
+        .order_by('next_show', 'title')[:MOVIES_LIMIT]
+    )
+
+    movies_data = []
+    for movie in sorted(movies, key=lambda movie: movie.title):
+        shows = movie.upcoming_showtimes
+        next_day = [s for s in shows if s.date == shows[0].date]
+        cinemas = {s.cinema.name for s in next_day}
+        poster = movie.image
+        if movie.image_key:
+            # Made absolute per request by absolute_posters(); the snapshot is built without one.
+            poster = reverse('image-blob', args=[movie.image_key])
+        movies_data.append({
+            "id": str(movie.pk),
+            "title": movie.title,
+            "posterImage": poster or "https://via.placeholder.com/400x600?text=No+Poster",
+            "cinema": cinemas.pop() if len(cinemas) == 1 else "Multiple Cinemas",
+            "genre": "Currently Showing", # Not synced from KenyaBuzz, default string
+            "duration": "N/A",
+            "showtimes": list(dict.fromkeys(format_time(s.time) for s in next_day)),
+        })
+    return movies_data or FALLBACK_MOVIES
+
+
+def absolute_posters(movies, request):
+    """Copy of `movies` with blob store poster paths turned into absolute URLs, as the serializers return them."""
+    return [
+        {**movie, "posterImage": request.build_absolute_uri(movie["posterImage"])}
+        if movie["posterImage"].startswith('/') else movie
+        for movie in movies
+    ]
+
+
+def refresh_movies_snapshot():
+    """Rebuild the snapshot now and store it."""
+    entry = {'built_at': time.time(), 'data': build_movies_snapshot()}
+    cache.set(CACHE_KEY, entry, settings.MOVIES_SNAPSHOT_MAX_STALE)
+    return entry
+
+
+def _refresh_in_background():
+    try:
+        refresh_movies_snapshot()
+    except Exception:
+        logger.exception('Refreshing the movies snapshot failed; serving the previous one')
+    finally:
+        cache.delete(REFRESH_LOCK_KEY)
+        # Reads in this thread may have used the replica as well as 'default'.
+        connections.close_all()
+
+
+def get_movies_snapshot():
+    """
+    Return the current snapshot, building it inline only when there is none.
+    A stale one is returned as-is and rebuilt by a single background thread.
+    """
+    entry = cache.get(CACHE_KEY)
+    if entry is None:
+        return refresh_movies_snapshot()['data']
+
+    if time.time() - entry['built_at'] > settings.MOVIES_SNAPSHOT_TTL:
+        # cache.add is atomic, so only one request (per cache) starts a refresh.
+        if cache.add(REFRESH_LOCK_KEY, True, 60):
+            threading.Thread(target=_refresh_in_background, daemon=True).start()
+    return entry['data']
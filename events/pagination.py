@@ -0,0 +1,164 @@
+"""
+Keyset (cursor) pagination for the API.
+
+DRF's built-in CursorPagination only keys on the first ordering field and
+falls back to an OFFSET to break ties, so pages slow down on tables with
+many rows sharing the same timestamp. These classes encode the full
+ordering tuple of the last row in the cursor and turn it into a
+`(a > x) OR (a = x AND b > y)` filter, which the composite indexes on the
+models can answer with a single range scan.
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward and backward keyset pagination over a fixed ordering tuple.
+
+    The last field in `ordering` must be unique (normally 'id') so that every
+    row has a distinct position.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.fields = [queryset.model._meta.get_field(self._name(o)) for o in self.ordering]
+
+        position, reverse = self.decode_cursor(request)
+        ordering = self._reversed(self.ordering) if reverse else list(self.ordering)
+
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._after(ordering, position))
+
+        # Fetch one extra row to find out whether there is another page.
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+
+        if reverse:
+            rows.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        self.page = rows
+        return rows
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                size = int(request.query_params[self.page_size_query_param])
+                if size > 0:
+                    return min(size, self.max_page_size)
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            # Stepped past the end; link back to the first page.
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    # --- cursor encoding ---
+
+    def encode_cursor(self, instance, reverse):
+        payload = {'p': [field.value_to_string(instance) for field in self.fields]}
+        if reverse:
+            payload['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode('ascii'))
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded.decode('ascii'))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            raw = payload['p']
+            if len(raw) != len(self.fields):
+                raise ValueError('cursor does not match ordering')
+            position = [field.to_python(value) for field, value in zip(self.fields, raw)]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+        return position, bool(payload.get('r'))
+
+    # --- ordering helpers ---
+
+    @staticmethod
+    def _name(order):
+        return order.lstrip('-')
+
+    def _reversed(self, ordering):
+        return [self._name(o) if o.startswith('-') else f'-{o}' for o in ordering]
+
+    def _after(self, ordering, position):
+        """Build the row-value comparison `(f1, f2, ...) > (v1, v2, ...)`."""
+        condition = Q()
+        for i, order in enumerate(ordering):
+            lookup = 'lt' if order.startswith('-') else 'gt'
+            term = Q(**{f'{self._name(order)}__{lookup}': position[i]})
+            for prev_order, prev_value in zip(ordering[:i], position[:i]):
+                term &= Q(**{self._name(prev_order): prev_value})
+            condition |= term
+        return condition
+
+
+class EventCursorPagination(KeysetPagination):
+    # Oldest date first (past events included), id breaks ties between events at the same time.
+    ordering = ('date', 'id')
+
+
+class ShowtimeCursorPagination(KeysetPagination):
+    # Chronological, matching the (date, time) showtime indexes.
+    ordering = ('date', 'time', 'id')
+    page_size = 50
+    max_page_size = 200
+
+
+class CreatedAtCursorPagination(KeysetPagination):
+    # Newest rows first for users, sponsors, speakers and attendees.
+    ordering = ('-created_at', '-id')
@@ -0,0 +1,75 @@
+"""
+Seat reservations against Event.capacity.
+
+Event.seats_taken is a denormalized count of an event's attendees. A seat
+is taken with a single conditional
+
+    UPDATE events_event SET seats_taken = seats_taken + 1
+    WHERE id = ? AND seats_taken < capacity
+
+which the database applies atomically, so concurrent signups can never push
+the count past capacity. The attendee row is written in the same
+transaction, so if that insert fails the seat is given back. Once an event
+is full, requests are turned away after one read, without queueing for the
+write lock.
+
+update() doesn't apply auto_now, so these writes set Event.updated_at
+themselves; seats_taken is part of the event's representation and its
+ETag (see ConditionalGetMixin).
+"""
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+
+from .models import Attendee, Event
+from .response_cache import invalidate_events
+
+
+class SoldOut(APIException):
+    status_code = 409
+    default_detail = 'This event is sold out.'
+    default_code = 'sold_out'
+
+
+def check_available(event_id):
+    """
+    Raise SoldOut if the event is full (Event.DoesNotExist if there is no such
+    event). A plain read, so full events never wait for the write lock; call
+    it before opening the transaction.
+    """
+    row = Event.objects.filter(pk=event_id).values_list('seats_taken', 'capacity').first()
+    if row is None:
+        raise Event.DoesNotExist(f'No event with id {event_id}')
+    seats_taken, capacity = row
+    if seats_taken >= capacity:
+        raise SoldOut()
+
+
+def take_seat(event_id):
+    """Atomically take one seat or raise SoldOut. Call inside the transaction that creates the attendee."""
+    taken = (Event.objects.filter(pk=event_id, seats_taken__lt=F('capacity'))
+             .update(seats_taken=F('seats_taken') + 1, updated_at=timezone.now()))
+    if not taken:
+        raise SoldOut()  # the last seats went after check_available
+    invalidate_events([event_id])
+
+
+def release_seat(event_id, count=1):
+    Event.objects.filter(pk=event_id, seats_taken__gte=count).update(
+        seats_taken=F('seats_taken') - count, updated_at=timezone.now())
+    invalidate_events([event_id])
+
+
+def register_attendee(event_id, **fields):
+    """Reserve a seat and create the attendee in one transaction."""
+    check_available(event_id)
+    with transaction.atomic():
+        take_seat(event_id)
+        return Attendee.objects.create(event_id=event_id, **fields)
+
+
+def unregister_attendee(attendee):
+    with transaction.atomic():
+        attendee.delete()
+        release_seat(attendee.event_id)
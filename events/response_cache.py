@@ -0,0 +1,154 @@
+"""
+Shared cache of anonymous /api/events/ responses.
+
+Anonymous reads of the event list and detail are the same for every
+visitor, so the rendered response is stored in the Django cache under the
+request's scheme, host, path and query string (the body holds absolute
+URLs, e.g. pagination links). Entries are never deleted one by one;
+instead every key embeds version numbers that `invalidate_events` bumps:
+
+- a list version, bumped by any event change;
+- a version per event, bumped when that event, its showtimes or its
+  speakers change;
+- an "all events" version, for changes that touch many events at once
+  (a cinema rename, a schedule sync).
+
+Versions are bumped when the write happens and again once it commits. A
+request that read the database before the commit stores its response
+under a version that is already superseded, so a stale page is never
+served after the invalidation point.
+
+Hit/miss counts are kept per process and added to the shared counters in
+batches, so a cache hit doesn't cost a write to the shared cache.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+PREFIX = 'events_api'
+LIST_VERSION = f'{PREFIX}:v:list'
+ALL_VERSION = f'{PREFIX}:v:all'
+HITS = f'{PREFIX}:hits'
+MISSES = f'{PREFIX}:misses'
+
+# The per-process counts are flushed to the shared counters after this many
+# requests, or this many seconds, whichever comes first.
+STATS_FLUSH_EVERY = 100
+STATS_FLUSH_INTERVAL = 10
+
+_counts = {HITS: 0, MISSES: 0}
+_counts_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def _event_version(pk):
+    return f'{PREFIX}:v:event:{pk}'
+
+
+def _versions(keys):
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            # A fresh (or evicted) version starts from the clock, so it can't
+            # repeat a number that older entries were stored under.
+            cache.add(key, time.time_ns(), None)
+            values[key] = cache.get(key)
+    return [values[key] for key in keys]
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def _count(key):
+    with _counts_lock:
+        _counts[key] += 1
+        due = (sum(_counts.values()) >= STATS_FLUSH_EVERY
+               or time.monotonic() - _last_flush >= STATS_FLUSH_INTERVAL)
+    if due:
+        _flush_counts()
+
+
+def _flush_counts():
+    global _last_flush
+    with _counts_lock:
+        pending = {key: n for key, n in _counts.items() if n}
+        _counts.update(dict.fromkeys(_counts, 0))
+        _last_flush = time.monotonic()
+    for key, n in pending.items():
+        try:
+            cache.incr(key, n)
+        except ValueError:
+            cache.add(key, 0, None)
+            cache.incr(key, n)
+
+
+def cache_key(request, pk=None):
+    """Key for this request's response; `pk` for detail requests."""
+    if pk is None:
+        versions = _versions([LIST_VERSION])
+        kind = 'list'
+    else:
+        versions = _versions([ALL_VERSION, _event_version(pk)])
+        kind = f'event:{pk}'
+    url = f'{request.scheme}://{request.get_host()}{request.get_full_path()}'
+    location = hashlib.sha1(url.encode()).hexdigest()
+    version = '.'.join(str(v) for v in versions)
+    return f'{PREFIX}:{kind}:{version}:{request.accepted_renderer.format}:{location}'
+
+
+def get(key):
+    entry = cache.get(key)
+    _count(HITS if entry is not None else MISSES)
+    return entry
+
+
+def store(key, response):
+    cache.set(key, {
+        'content': response.content,
+        'content_type': response['Content-Type'],
+        'headers': {name: response[name] for name in ('ETag', 'Last-Modified') if response.has_header(name)},
+    }, settings.EVENTS_RESPONSE_CACHE_TTL)
+
+
+def invalidate_events(event_ids=None):
+    """
+    Drop cached responses that show these events, or every cached event
+    response if `event_ids` is None. Takes effect when the current
+    transaction commits (immediately outside one).
+    """
+    keys = [LIST_VERSION]
+    if event_ids is None:
+        keys.append(ALL_VERSION)
+    else:
+        keys.extend(_event_version(pk) for pk in set(event_ids))
+
+    def bump():
+        for key in keys:
+            _bump(key)
+    # Now, so reads later in this transaction don't see the old entries, and
+    # again after commit, to discard anything other requests stored meanwhile
+    # from the pre-commit data.
+    bump()
+    transaction.on_commit(bump)
+
+
+def stats():
+    """Counts from all processes; other processes' latest requests may not be flushed yet."""
+    _flush_counts()
+    hits, misses = cache.get(HITS, 0), cache.get(MISSES, 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': round(hits / total, 4) if total else None}
+
+
+def reset_stats():
+    with _counts_lock:
+        _counts.update(dict.fromkeys(_counts, 0))
+    cache.delete_many([HITS, MISSES])
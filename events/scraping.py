@@ -0,0 +1,187 @@
+"""
+Helpers for polite, concurrent scraping of the KenyaBuzz API.
+
+`TokenBucket` caps the request rate across all worker threads (with a small
+burst allowance) and `fetch_with_retry` retries transient failures with
+exponential backoff, so `scrape_movies` can keep several requests in flight
+without exceeding the rate we are willing to send upstream. `ResponseCache`
+keeps the last response to every request on disk, revalidates it with
+conditional requests, and can replay a recorded run without the network.
+"""
+import hashlib
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Responses worth retrying: rate limited or a temporary upstream failure.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Longest Retry-After we honor; a bigger value shouldn't stall a sync indefinitely.
+MAX_RETRY_AFTER = 60
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, holding at most
+    `capacity` tokens. Each request takes one token and waits until one is
+    available.
+    """
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = self._clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self._sleep(wait)
+
+
+class FetchFailed(Exception):
+    pass
+
+
+def fetch_with_retry(send, bucket=None, retries=3, backoff=1.0, sleep=time.sleep, max_retry_after=MAX_RETRY_AFTER):
+    """
+    Call `send()` (which returns a requests-style response) until it gives a
+    non-retryable response, retrying network errors and RETRY_STATUSES with
+    exponential backoff plus jitter. Honors a numeric Retry-After header, up
+    to `max_retry_after` seconds.
+    Every attempt takes a token from `bucket`. Raises FetchFailed once the
+    retries are used up.
+    """
+    last_error = None
+    for attempt in range(retries + 1):
+        if attempt:
+            delay = backoff * (2 ** (attempt - 1))
+            retry_after = getattr(last_error, 'retry_after', None)
+            retry_after = min(max(retry_after or 0, 0), max_retry_after)
+            sleep(max(delay, retry_after) + random.uniform(0, backoff / 2))
+        if bucket is not None:
+            bucket.acquire()
+        try:
+            response = send()
+        except Exception as e:
+            last_error = e
+            continue
+        if response.status_code not in RETRY_STATUSES:
+            return response
+        last_error = FetchFailed(f'HTTP {response.status_code}')
+        try:
+            last_error.retry_after = float(response.headers.get('Retry-After', ''))
+        except ValueError:
+            last_error.retry_after = None
+    raise FetchFailed(f'Giving up after {retries + 1} attempts: {last_error}')
+
+
+class CachedResponse:
+    """Minimal requests-style response built from a cache entry."""
+
+    def __init__(self, status_code, content, headers=None, from_cache=False):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.from_cache = from_cache
+        self.sha256 = hashlib.sha256(content).hexdigest()
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise FetchFailed(f'HTTP {self.status_code}')
+
+
+class ResponseCache:
+    """
+    Persistent HTTP response cache, one JSON file per (method, URL, body).
+
+    Stored responses are revalidated with If-None-Match / If-Modified-Since
+    when upstream sent an ETag or Last-Modified, and a 304 is answered from
+    disk. The same directory doubles as a set of recorded fixtures: with
+    `offline=True` nothing is sent and every request must be answered from
+    the cache (`scrape_movies --replay DIR`).
+    """
+    def __init__(self, root, offline=False):
+        self.root = Path(root)
+        self.offline = offline
+
+    @staticmethod
+    def key(method, url, body=None):
+        canonical = json.dumps(body, sort_keys=True, separators=(',', ':')) if body is not None else ''
+        return hashlib.sha256(f'{method.upper()} {url}\n{canonical}'.encode()).hexdigest()
+
+    def path(self, key):
+        return self.root / f'{key}.json'
+
+    def load(self, key):
+        try:
+            with open(self.path(key), encoding='utf-8') as fh:
+                return json.load(fh)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def store(self, key, entry):
+        self.root.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix='.tmp-')
+        with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+            json.dump(entry, fh)
+        os.replace(tmp, self.path(key))
+
+    def fetch(self, send, method, url, body=None):
+        """
+        Return the response for a request, going through the cache.
+
+        `send(extra_headers)` performs the real request; it is never called
+        in offline mode.
+        """
+        key = self.key(method, url, body)
+        entry = self.load(key)
+        if self.offline:
+            if entry is None:
+                raise FetchFailed(f'No recorded response for {method} {url} {body or ""}')
+            return self._from_entry(entry)
+
+        extra_headers = {}
+        if entry and entry.get('etag'):
+            extra_headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            extra_headers['If-Modified-Since'] = entry['last_modified']
+
+        response = send(extra_headers)
+        if response.status_code == 304 and entry is not None:
+            return self._from_entry(entry)
+        if response.status_code != 200:
+            return response
+
+        entry = {
+            'method': method.upper(),
+            'url': url,
+            'body': body,
+            'status': 200,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'content': response.content.decode('utf-8'),
+        }
+        self.store(key, entry)
+        return CachedResponse(200, response.content, dict(response.headers))
+
+    @staticmethod
+    def _from_entry(entry):
+        return CachedResponse(entry['status'], entry['content'].encode('utf-8'), from_cache=True)
@@ -0,0 +1,136 @@
+"""
+Full-text event search for /api/events/search/?q=.
+
+The engine sits behind `SearchBackend` so it can follow the database: the
+default `SQLiteFTS5Backend` keeps an FTS5 table over each event's title,
+description, location and speaker names, and a Postgres `tsvector` backend
+only has to implement the same methods and be named in
+EVENT_SEARCH_BACKEND.
+
+The index is kept in sync by post_save/post_delete signals on Event and
+Speaker (see events/signals.py). Bulk writes don't send signals, so code
+that bulk-writes events (apply_snapshot) calls `index()` itself. SQLite
+triggers were avoided on purpose: SQLite migrations rebuild a table to add
+or alter a column, and that drops or breaks triggers attached to it.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+# Words in a query; everything else (quotes, operators, punctuation) is dropped.
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class SearchBackend:
+    """Interface for search engines. Subclasses implement every method."""
+
+    def install(self, schema_editor):
+        """Create the index structures (called from a migration)."""
+        raise NotImplementedError
+
+    def uninstall(self, schema_editor):
+        raise NotImplementedError
+
+    def index(self, event_ids):
+        """Add or refresh these events (called after they or their speakers change)."""
+        raise NotImplementedError
+
+    def remove(self, event_ids):
+        raise NotImplementedError
+
+    def rebuild(self, conn=None):
+        """Re-index every event from scratch."""
+        raise NotImplementedError
+
+    def search(self, query, limit=20):
+        """Ids of the events matching `query`, best match first."""
+        raise NotImplementedError
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    table = 'events_event_fts'
+    # bm25 column weights: title, description, location, speakers
+    weights = (10.0, 1.0, 2.0, 5.0)
+
+    _select_sql = '''
+        SELECT e.id, e.title, e.description, e.location,
+               (SELECT group_concat(s.name, ' ') FROM events_speaker s WHERE s.event_id = e.id)
+        FROM events_event e
+    '''
+
+    def install(self, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        schema_editor.execute(f'''
+            CREATE VIRTUAL TABLE {self.table} USING fts5(
+                title, description, location, speakers,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )
+        ''')
+        self.rebuild(schema_editor.connection)
+
+    def uninstall(self, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        schema_editor.execute(f'DROP TABLE IF EXISTS {self.table}')
+
+    def index(self, event_ids):
+        event_ids = list(event_ids)
+        if not event_ids:
+            return
+        with connection.cursor() as cursor:
+            for start in range(0, len(event_ids), 500):
+                chunk = event_ids[start:start + 500]
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})', chunk)
+                cursor.execute(
+                    f'INSERT INTO {self.table} (rowid, title, description, location, speakers) '
+                    f'{self._select_sql} WHERE e.id IN ({placeholders})', chunk)
+
+    def remove(self, event_ids):
+        event_ids = list(event_ids)
+        if not event_ids:
+            return
+        with connection.cursor() as cursor:
+            for start in range(0, len(event_ids), 500):
+                chunk = event_ids[start:start + 500]
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})', chunk)
+
+    def rebuild(self, conn=None):
+        with (conn or connection).cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, title, description, location, speakers) {self._select_sql}')
+
+    @staticmethod
+    def match_expression(query):
+        """
+        Turn free text into an FTS5 query: every word must match, as a prefix
+        ("dun par" finds "Dune: Part Two"). Words are quoted so user input
+        can never be parsed as FTS5 syntax. Returns None if there are no words.
+        """
+        words = WORD_RE.findall(query)
+        if not words:
+            return None
+        return ' '.join(f'"{word}"*' for word in words)
+
+    def search(self, query, limit=20):
+        expression = self.match_expression(query)
+        if expression is None:
+            return []
+        weights = ', '.join(str(w) for w in self.weights)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s '
+                f'ORDER BY bm25({self.table}, {weights}) LIMIT %s',
+                [expression, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+def get_search_backend():
+    return import_string(settings.EVENT_SEARCH_BACKEND)()
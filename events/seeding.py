@@ -0,0 +1,189 @@
+"""
+Synthetic data for load testing (`manage.py seeds --events N ...`).
+
+Everything is derived from one seed: Faker fills fixed-size pools of names,
+titles, descriptions and so on once, and a `random.Random(seed)` picks from
+them, so the same arguments always produce the same rows (dates are relative
+to the day of the run). Rows are written with bulk_create, `batch_size`
+events at a time together with their showtimes, speakers and attendees, one
+transaction per batch. Only the current batch is held in memory, so the
+table sizes are limited by disk, not RAM.
+"""
+import datetime
+import random
+
+from django.contrib.admin.models import LogEntry
+from django.contrib.auth.hashers import make_password
+from django.db import connection, reset_queries, transaction
+from django.utils import timezone
+from faker import Faker
+
+from .models import Attendee, Cinema, Event, Showtime, Speaker, Sponsor, User
+from .response_cache import invalidate_events
+from .search import get_search_backend
+
+BATCH_SIZE = 2000
+# How many distinct values Faker generates per kind; rows pick from these.
+POOL_SIZE = 1000
+
+AGE_LIMITS = ['All ages', '12+', '16+', '18+', '21+']
+SHOW_HOURS = [10, 12, 13, 15, 16, 18, 19, 21, 22]
+
+
+class Pools:
+    def __init__(self, fake):
+        self.names = [fake.name() for _ in range(POOL_SIZE)]
+        self.titles = [fake.catch_phrase() for _ in range(POOL_SIZE)]
+        self.descriptions = [fake.paragraph(nb_sentences=4) for _ in range(POOL_SIZE)]
+        self.locations = [f'{fake.street_name()}, {fake.city()}' for _ in range(POOL_SIZE)]
+        self.companies = [fake.company() for _ in range(POOL_SIZE)]
+        self.jobs = [fake.job()[:255] for _ in range(POOL_SIZE)]
+        self.phones = [fake.numerify('07########') for _ in range(POOL_SIZE)]
+        self.words = [fake.word() for _ in range(POOL_SIZE)]
+
+
+class SeedResult:
+    def __init__(self):
+        self.counts = dict.fromkeys(['users', 'sponsors', 'cinemas', 'events', 'showtimes', 'speakers', 'attendees'], 0)
+
+    @property
+    def rows(self):
+        return sum(self.counts.values())
+
+
+def wipe():
+    """Delete every user and event-related row (as the hand-written seeds did), without loading any of them."""
+    tables = [Attendee, Speaker, Showtime, Cinema, Event, Sponsor, LogEntry, User]
+    with transaction.atomic(), connection.cursor() as cursor:
+        for model in tables:
+            for field in model._meta.many_to_many:
+                cursor.execute(f'DELETE FROM {connection.ops.quote_name(field.remote_field.through._meta.db_table)}')
+            cursor.execute(f'DELETE FROM {connection.ops.quote_name(model._meta.db_table)}')
+        get_search_backend().rebuild()
+    invalidate_events()
+
+
+def check_options(events, attendees_per_event=0, showtimes_per_event=0, speakers_per_event=0,
+                  users=1000, sponsors=50, cinemas=20, batch_size=BATCH_SIZE):
+    """Raise ValueError if seed() can't generate this combination (checked before anything is written)."""
+    counts = {'events': events, 'attendees per event': attendees_per_event, 'showtimes per event': showtimes_per_event,
+              'speakers per event': speakers_per_event, 'users': users, 'sponsors': sponsors, 'cinemas': cinemas}
+    for name, count in counts.items():
+        if count < 0:
+            raise ValueError(f'The number of {name} can\'t be negative.')
+    if batch_size < 1:
+        raise ValueError('The batch size must be at least 1.')
+    if showtimes_per_event and not cinemas:
+        raise ValueError('Showtimes need at least one cinema.')
+    if speakers_per_event > POOL_SIZE:
+        raise ValueError(f'At most {POOL_SIZE} speakers per event (speakers of an event have distinct names).')
+
+
+def seed(events, attendees_per_event=0, showtimes_per_event=0, speakers_per_event=0,
+         users=1000, sponsors=50, cinemas=20, seed=42, batch_size=BATCH_SIZE, on_batch=None):
+    """
+    Generate `events` events and their related rows. Returns a SeedResult;
+    `on_batch(result)` is called after each batch is committed. Raises
+    ValueError for options check_options() rejects.
+    """
+    check_options(events, attendees_per_event, showtimes_per_event, speakers_per_event,
+                  users, sponsors, cinemas, batch_size)
+    fake = Faker()
+    fake.seed_instance(seed)
+    rng = random.Random(seed)
+    pools = Pools(fake)
+    result = SeedResult()
+    now = timezone.now()
+    today = timezone.localdate()
+    # Loading or logging in as these users isn't the point; skip password hashing.
+    password = make_password(None)
+    # Keeps generated usernames/emails unique when seeding more than once (--append).
+    run = f'{seed}x{User.objects.count()}'
+
+    with transaction.atomic():
+        user_ids = _bulk(User, (
+            User(username=f'seed{run}_{i}', email=f'seed{run}_{i}@example.com', password=password,
+                 first_name=pools.names[i % POOL_SIZE].split()[0], age=rng.randint(16, 70),
+                 gender=rng.choice(['Female', 'Male']))
+            for i in range(max(users, 1))
+        ), batch_size, result, 'users')
+        sponsor_ids = _bulk(Sponsor, (
+            Sponsor(title=rng.choice(pools.companies), organisation=rng.choice(pools.companies),
+                    category=rng.choice(pools.words).title(), industry=rng.choice(pools.words).title())
+            for _ in range(sponsors)
+        ), batch_size, result, 'sponsors')
+        cinema_ids = _bulk(Cinema, (
+            Cinema(name=f'{rng.choice(pools.companies)} Cinema', location=rng.choice(pools.locations))
+            for _ in range(cinemas if showtimes_per_event else 0)
+        ), batch_size, result, 'cinemas')
+
+    for start in range(0, events, batch_size):
+        count = min(batch_size, events - start)
+        with transaction.atomic():
+            batch = []
+            for _ in range(count):
+                capacity = max(attendees_per_event, rng.choice([50, 100, 200, 500, 1000, 5000]))
+                batch.append(Event(
+                    title=rng.choice(pools.titles), image='',
+                    description=rng.choice(pools.descriptions), location=rng.choice(pools.locations),
+                    age_limit=rng.choice(AGE_LIMITS), capacity=capacity, seats_taken=attendees_per_event,
+                    user_id=rng.choice(user_ids), sponsor_id=rng.choice(sponsor_ids) if sponsor_ids else None,
+                    date=now + datetime.timedelta(days=rng.randint(-30, 365), minutes=rng.randrange(0, 24 * 60, 15)),
+                    price=rng.randrange(0, 10001, 50), event_planner_name=rng.choice(pools.names),
+                    event_planner_contact=rng.choice(pools.phones),
+                ))
+            Event.objects.bulk_create(batch)
+            event_ids = [event.pk for event in batch]
+            result.counts['events'] += count
+            del batch
+
+            _bulk(Showtime, (
+                Showtime(movie_id=event_id, cinema_id=rng.choice(cinema_ids),
+                         date=today + datetime.timedelta(days=rng.randint(0, 13)),
+                         time=datetime.time(rng.choice(SHOW_HOURS), rng.choice([0, 15, 30, 45])))
+                for event_id in event_ids for _ in range(showtimes_per_event)
+            ), batch_size, result, 'showtimes', return_ids=False)
+            _bulk(Speaker, (
+                Speaker(name=name, email=_email(name, rng), event_id=event_id,
+                        organisation=rng.choice(pools.companies), job_title=rng.choice(pools.jobs))
+                for event_id in event_ids for name in rng.sample(pools.names, speakers_per_event)
+            ), batch_size, result, 'speakers', return_ids=False)
+            _bulk(Attendee, (
+                Attendee(name=name, email=_email(name, rng), user_id=rng.choice(user_ids), event_id=event_id)
+                for event_id in event_ids for name in rng.choices(pools.names, k=attendees_per_event)
+            ), batch_size, result, 'attendees', return_ids=False)
+            get_search_backend().index(event_ids)
+        # With DEBUG on, Django keeps the SQL of recent queries; a batch's inserts are large.
+        reset_queries()
+        if on_batch:
+            on_batch(result)
+
+    invalidate_events()
+    return result
+
+
+def _email(name, rng):
+    local = name.lower().replace(' ', '.').replace("'", '')
+    return f'{local}{rng.randint(1, 999)}@example.com'
+
+
+def _bulk(model, objects, batch_size, result, key, return_ids=True):
+    """bulk_create a generator `batch_size` objects at a time; returns the new pks if `return_ids`."""
+    ids = []
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) == batch_size:
+            _flush(model, batch, ids, return_ids)
+            result.counts[key] += len(batch)
+            batch = []
+    if batch:
+        _flush(model, batch, ids, return_ids)
+        result.counts[key] += len(batch)
+    return ids
+
+
+def _flush(model, batch, ids, return_ids):
+    model.objects.bulk_create(batch)
+    if return_ids:
+        ids.extend(obj.pk for obj in batch)
@@ -1,7 +1,100 @@
+from django.db import transaction
+from django.urls import reverse
 from rest_framework import serializers
+from .blobstore import InvalidImage, blob_key, decode_upload, get_blob_store, is_inline_image
 from .models import User, Sponsor, Event, Speaker, Attendee, Cinema, Showtime
 
 
+def parse_field_list(request, param):
+    """Split a comma separated query parameter into a set of names (None if absent)."""
+    if request is None or param not in request.query_params:
+        return None
+    return {name.strip() for name in request.query_params[param].split(',') if name.strip()}
+
+
+class SparseFieldsetMixin:
+    """
+    Lets read requests choose which fields come back.
+
+    `?fields=id,title,date` keeps only the listed fields; nested relations are
+    then left out unless named in `?fields=` or `?expand=`. Without `?fields=`
+    the serializer returns everything, as before. Only the top-level
+    serializer of a request is trimmed; see SparseFieldsetViewMixin for the
+    matching queryset push-down.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return
+        requested = parse_field_list(request, 'fields')
+        if requested is None:
+            return
+        requested |= parse_field_list(request, 'expand') or set()
+        for name in list(self.fields):
+            if name not in requested:
+                self.fields.pop(name)
+
+
+class BlobImageField(serializers.Field):
+    """
+    Reads and writes the `image`/`image_key` pair on a model.
+
+    Base64 or data URI uploads are decoded once during validation and written
+    to the blob store when the serializer saves (see BlobUploadMixin);
+    responses carry a short URL to the image endpoint instead of the payload.
+    Plain image URLs (e.g. KenyaBuzz posters) are stored and returned as-is.
+    """
+    # Model columns read by this field, for QuerySet.only() push-down.
+    source_columns = ('image', 'image_key')
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+        self.pending = {}  # blob key -> decoded bytes, written by write_pending()
+
+    def to_representation(self, instance):
+        if not instance.image_key:
+            return instance.image
+        url = reverse('image-blob', args=[instance.image_key])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str):
+            raise serializers.ValidationError('Expected an image URL or Base64 string.')
+        if not is_inline_image(data):
+            return {'image': data, 'image_key': ''}
+        try:
+            decoded, ext = decode_upload(data)
+        except InvalidImage as e:
+            raise serializers.ValidationError(str(e))
+        key = blob_key(decoded, ext)
+        self.pending[key] = decoded
+        return {'image': '', 'image_key': key}
+
+    def write_pending(self):
+        store = get_blob_store()
+        for key, data in self.pending.items():
+            store.put(data, key.rsplit('.', 1)[1])
+        self.pending.clear()
+
+
+class BlobUploadMixin:
+    """
+    Writes images uploaded through BlobImageFields to the blob store once the
+    row is saved, in the same transaction, so a request that fails validation
+    or the save leaves no orphaned files behind.
+    """
+    def save(self, **kwargs):
+        with transaction.atomic():
+            instance = super().save(**kwargs)
+            for field in self.fields.values():
+                if isinstance(field, BlobImageField):
+                    field.write_pending()
+        return instance
+
+
 # ===========================
 # MODEL SERIALIZERS
 # ===========================
@@ -9,27 +102,34 @@ from .models import User, Sponsor, Event, Speaker, Attendee, Cinema, Showtime
 # LoginRequestSerializer, etc.) have been removed as Clerk now handles
 # user registration and login on the frontend.
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'age', 'gender', 'created_at']
         # Exclude password_digest from the API response for security
 
-class SponsorSerializer(serializers.ModelSerializer):
+class SponsorSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Sponsor
         fields = '__all__'
 
-class SpeakerSerializer(serializers.ModelSerializer):
+class SpeakerSerializer(BlobUploadMixin, SparseFieldsetMixin, serializers.ModelSerializer):
+    image = BlobImageField()
+
     class Meta:
         model = Speaker
-        fields = '__all__'
+        exclude = ['image_key']
 
-class AttendeeSerializer(serializers.ModelSerializer):
+class AttendeeSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Attendee
         fields = '__all__'
 
+class RegistrationSerializer(serializers.Serializer):
+    """Body of POST /api/events/<id>/register/; both default to the signed-in user's details."""
+    name = serializers.CharField(max_length=255, required=False)
+    email = serializers.EmailField(required=False)
+
 # --- NEW SERIALIZERS FOR SCHEDULES ---
 
 class CinemaSerializer(serializers.ModelSerializer):
@@ -46,16 +146,46 @@ class ShowtimeSerializer(serializers.ModelSerializer):
         model = Showtime
         fields = ['id', 'date', 'time', 'ticket_link', 'cinema']
 
+class ShowtimeListSerializer(SparseFieldsetMixin, ShowtimeSerializer):
+    # Standalone /api/showtimes/ rows also say which movie they are for.
+    # movie_title is annotated onto the queryset (see ShowtimeViewSet).
+    movie_title = serializers.CharField(read_only=True)
+
+    class Meta(ShowtimeSerializer.Meta):
+        fields = ['id', 'movie', 'movie_title', 'date', 'time', 'ticket_link', 'cinema']
+
+class ShowtimeFilterSerializer(serializers.Serializer):
+    """Query parameters accepted by /api/showtimes/."""
+    date = serializers.DateField(required=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    time_from = serializers.TimeField(required=False)
+    time_to = serializers.TimeField(required=False)
+    cinema = serializers.IntegerField(required=False, min_value=1)
+    movie = serializers.IntegerField(required=False, min_value=1)
+
+    def validate(self, attrs):
+        if 'date' in attrs:
+            if 'date_from' in attrs or 'date_to' in attrs:
+                raise serializers.ValidationError('Use either date or date_from/date_to, not both.')
+            attrs['date_from'] = attrs['date_to'] = attrs.pop('date')
+        for start, end in (('date_from', 'date_to'), ('time_from', 'time_to')):
+            if start in attrs and end in attrs and attrs[start] > attrs[end]:
+                raise serializers.ValidationError({end: f'Must not be before {start}.'})
+        return attrs
+
 # -------------------------------------
 
-class EventSerializer(serializers.ModelSerializer):
+class EventSerializer(BlobUploadMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     # This automatically grabs all showtimes linked to this movie 
     # (using the related_name='showtimes' we set in models.py)
     showtimes = ShowtimeSerializer(many=True, read_only=True)
+    image = BlobImageField()
     
     # Optional: If you want to see sponsor details nested, uncomment this:
     # sponsor = SponsorSerializer(read_only=True)
 
     class Meta:
         model = Event
-        fields = '__all__'
\ No newline at end of file
+        exclude = ['image_key']
+        read_only_fields = ['seats_taken']
\ No newline at end of file
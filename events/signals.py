@@ -0,0 +1,69 @@
+"""
+Signal handlers that keep the caches and the search index in sync with the database.
+"""
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .clerk import user_cache_key
+from .response_cache import invalidate_events
+from .models import Cinema, Event, Showtime, Speaker, User
+from .search import get_search_backend
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_clerk_user(sender, instance, **kwargs):
+    # Drop the cached clerk_user_id -> User entry used by ClerkAuthentication.
+    if instance.clerk_user_id:
+        cache.delete(user_cache_key(instance.clerk_user_id))
+
+
+@receiver(post_save, sender=Event)
+def index_event(sender, instance, **kwargs):
+    get_search_backend().index([instance.pk])
+
+
+@receiver(post_delete, sender=Event)
+def unindex_event(sender, instance, **kwargs):
+    get_search_backend().remove([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Speaker)
+def reindex_speaker_event(sender, instance, **kwargs):
+    # Speaker names are indexed as part of their event.
+    get_search_backend().index([instance.event_id])
+
+
+# Showtimes (and their cinema) are nested in an event's representation, so
+# changing them counts as changing the event for ETag/Last-Modified.
+@receiver([post_save, post_delete], sender=Showtime)
+def touch_showtime_event(sender, instance, **kwargs):
+    Event.objects.filter(pk=instance.movie_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Cinema)
+def touch_cinema_events(sender, instance, created, **kwargs):
+    if not created:
+        Event.objects.filter(showtimes__cinema=instance).update(updated_at=timezone.now())
+
+
+# Anonymous /api/events/ responses (events/response_cache.py).
+@receiver([post_save, post_delete], sender=Event)
+def invalidate_event_responses(sender, instance, **kwargs):
+    invalidate_events([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Showtime)
+def invalidate_showtime_responses(sender, instance, **kwargs):
+    invalidate_events([instance.movie_id])
+
+
+@receiver([post_save, post_delete], sender=Speaker)
+def invalidate_speaker_responses(sender, instance, **kwargs):
+    invalidate_events([instance.event_id])
+
+
+@receiver([post_save, post_delete], sender=Cinema)
+def invalidate_cinema_responses(sender, instance, **kwargs):
+    invalidate_events()  # nested in the showtimes of any number of events
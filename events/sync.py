@@ -0,0 +1,219 @@
+"""
+Diff-based schedule sync for `scrape_movies`.
+
+The scraper collects everything upstream currently lists into a
+`ScheduleSnapshot`; `apply_snapshot` then compares it with the database by
+natural key (event title, cinema name, and (movie, cinema, date, time) for
+showtimes) and applies only the differences with bulk inserts, updates and
+deletes inside one transaction. Readers see either the old schedule or the
+new one, never a half-synced table.
+"""
+from django.db import transaction
+from django.db.models import DateField, TimeField
+from django.utils import timezone
+
+from .models import Cinema, Event, Showtime
+from .response_cache import invalidate_events
+from .search import get_search_backend
+
+BATCH_SIZE = 500
+
+# Event fields the scraper owns. `date` is handled separately (see apply_snapshot).
+EVENT_FIELDS = [
+    'image', 'description', 'location', 'price', 'event_planner_name', 'event_planner_contact',
+    'age_limit', 'capacity', 'user_id', 'sponsor_id',
+]
+
+_date_field = DateField()
+_time_field = TimeField()
+
+
+def iter_shows(schedule_data, movie_slug=None):
+    """
+    Flatten a `fetch-shows` payload into
+    (movie_slug, cinema_name, cinema_address, date, time) tuples.
+
+    Per-movie payloads don't always repeat the slug on each entry, so
+    `movie_slug` is used when an entry has none.
+    """
+    cinemas_list = schedule_data.get('data', []) if isinstance(schedule_data, dict) else None
+    if not isinstance(cinemas_list, list):
+        return
+
+    for cinema_item in cinemas_list:
+        if not isinstance(cinema_item, dict):
+            continue
+
+        cin_info = cinema_item.get('cinema') or {}
+        cinema_name = (cin_info.get('cinema_name') or 'Unknown Cinema').strip()
+        cinema_address = cin_info.get('cinema_address', 'Nairobi')
+
+        for date_item in cinema_item.get('dates', []):
+            if not isinstance(date_item, dict):
+                continue
+
+            m_date = _parse(_date_field, date_item.get('movie_date'))
+            if m_date is None:
+                continue
+
+            for m_data in date_item.get('movies', []):
+                if not isinstance(m_data, dict):
+                    continue
+                slug = m_data.get('movie_slug') or movie_slug
+
+                for show in m_data.get('shows', []):
+                    if not isinstance(show, dict):
+                        continue
+                    m_time = _parse(_time_field, show.get('movie_time'))
+                    if slug and m_time is not None:
+                        yield slug, cinema_name, cinema_address, m_date, m_time
+
+
+def _parse(field, value):
+    if not value:
+        return None
+    try:
+        return field.to_python(value)
+    except Exception:
+        return None
+
+
+class ScheduleSnapshot:
+    """The full schedule as upstream lists it, built in memory before any write."""
+
+    def __init__(self):
+        self.events = {}        # title -> EVENT_FIELDS values
+        self.slugs = {}         # movie slug -> title
+        self.cinemas = {}       # name -> location
+        self.showtimes = set()  # (title, cinema name, date, time)
+        self.kept = set()       # titles whose existing showtimes are left as they are
+        self.kept_cinemas = set() # cinema names whose existing showtimes are left as they are
+
+    def add_movie(self, title, slug, fields):
+        self.events[title] = fields
+        if slug:
+            self.slugs[slug] = title
+
+    def add_schedule(self, schedule_data, movie_slug=None):
+        """Add every show in a payload whose movie we know; returns how many were added."""
+        added = 0
+        for slug, cinema_name, cinema_address, m_date, m_time in iter_shows(schedule_data, movie_slug):
+            title = self.slugs.get(slug)
+            if title is None:
+                continue
+            self.cinemas.setdefault(cinema_name, cinema_address)
+            self.showtimes.add((title, cinema_name, m_date, m_time))
+            added += 1
+        return added
+
+    def keep_existing(self, title):
+        """
+        Leave this movie's showtimes as they are: its schedule couldn't be
+        fetched, or upstream returned the same payload that was applied last time.
+        """
+        self.kept.add(title)
+
+    def keep_existing_cinema(self, name):
+        """The per-cinema counterpart of keep_existing."""
+        self.kept_cinemas.add(name)
+
+    def showtime_counts(self):
+        counts = dict.fromkeys(self.events, 0)
+        for title, *_ in self.showtimes:
+            counts[title] += 1
+        return counts
+
+
+def apply_snapshot(snapshot):
+    """Bring the database in line with `snapshot`. Returns counts of what changed."""
+    now = timezone.now()
+    stats = dict.fromkeys(
+        ['events_created', 'events_updated', 'cinemas_created',
+         'showtimes_created', 'showtimes_deleted'], 0)
+
+    with transaction.atomic():
+        # --- Events, by title ---
+        events = {}
+        for event in Event.objects.filter(title__in=list(snapshot.events)).order_by('id'):
+            events.setdefault(event.title, event)
+
+        to_create, to_update = [], []
+        for title, fields in snapshot.events.items():
+            event = events.get(title)
+            if event is None:
+                event = events[title] = Event(title=title, date=now, **fields)
+                to_create.append(event)
+                continue
+            changed = any(getattr(event, name) != value for name, value in fields.items())
+            # Movies are "now showing": move the date forward at most once a day
+            # so an unchanged listing doesn't rewrite every row on every run.
+            stale_date = timezone.localdate(event.date) < timezone.localdate(now)
+            if changed or stale_date:
+                for name, value in fields.items():
+                    setattr(event, name, value)
+                if stale_date:
+                    event.date = now
+                event.updated_at = now  # bulk_update doesn't apply auto_now
+                to_update.append(event)
+
+        Event.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+        Event.objects.bulk_update(to_update, EVENT_FIELDS + ['date', 'updated_at'], batch_size=BATCH_SIZE)
+        # Bulk writes skip post_save, so refresh the search index here.
+        get_search_backend().index(event.pk for event in to_create + to_update)
+        stats['events_created'] = len(to_create)
+        stats['events_updated'] = len(to_update)
+
+        # --- Cinemas, by name ---
+        cinemas = {}
+        for cinema in Cinema.objects.filter(name__in=list(snapshot.cinemas)).order_by('id'):
+            cinemas.setdefault(cinema.name, cinema)
+        new_cinemas = [Cinema(name=name, location=location)
+                       for name, location in snapshot.cinemas.items() if name not in cinemas]
+        Cinema.objects.bulk_create(new_cinemas, batch_size=BATCH_SIZE)
+        cinemas.update((cinema.name, cinema) for cinema in new_cinemas)
+        stats['cinemas_created'] = len(new_cinemas)
+
+        # --- Showtimes, by (movie, cinema, date, time) ---
+        desired = {
+            (events[title].pk, cinemas[cinema_name].pk, m_date, m_time)
+            for title, cinema_name, m_date, m_time in snapshot.showtimes
+        }
+        kept_movies = {events[title].pk for title in snapshot.kept if title in events}
+        kept_cinemas = set(Cinema.objects.filter(name__in=list(snapshot.kept_cinemas)).values_list('id', flat=True))
+
+        existing = set()
+        stale_ids = []
+        changed_movies = set()
+        rows = Showtime.objects.values_list('id', 'movie_id', 'cinema_id', 'date', 'time')
+        for pk, movie_id, cinema_id, m_date, m_time in rows.iterator(chunk_size=2000):
+            key = (movie_id, cinema_id, m_date, m_time)
+            if key in desired and key not in existing:
+                existing.add(key)
+            elif movie_id not in kept_movies and cinema_id not in kept_cinemas:
+                stale_ids.append(pk)  # no longer listed, or a duplicate row
+                changed_movies.add(movie_id)
+
+        Showtime.objects.bulk_create(
+            [Showtime(movie_id=m, cinema_id=c, date=d, time=t) for m, c, d, t in desired - existing],
+            batch_size=BATCH_SIZE,
+        )
+        # A plain DELETE: Showtime's post_delete receivers would load every row and
+        # touch/invalidate its event one at a time, which the code below does once.
+        for start in range(0, len(stale_ids), BATCH_SIZE):
+            stale = Showtime.objects.filter(id__in=stale_ids[start:start + BATCH_SIZE])
+            stale._raw_delete(stale.db)
+
+        # Showtimes are nested in the event's representation, so bump its
+        # updated_at (and with it the API's ETag/Last-Modified) when they change.
+        changed_movies.update(movie_id for movie_id, *_ in desired - existing)
+        changed_movies = sorted(changed_movies - {event.pk for event in to_update})
+        for start in range(0, len(changed_movies), BATCH_SIZE):
+            Event.objects.filter(id__in=changed_movies[start:start + BATCH_SIZE]).update(updated_at=now)
+        stats['showtimes_created'] = len(desired - existing)
+        stats['showtimes_deleted'] = len(stale_ids)
+
+        # Bulk writes send no signals; drop cached event responses on commit.
+        if any(stats.values()):
+            invalidate_events()
+
+    return stats
@@ -1,3 +1,1743 @@
-from django.test import TestCase
+import base64
+import copy
+import csv
+import datetime
+import hashlib
+import hmac
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import jwt
+import requests
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.db import connection, router, transaction
+from django.db.models import Count, F
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+
+from core.cache import TieredCache
+
+from . import authentication, movie_snapshot, response_cache, seeding
+from .benchmarking import BENCH_KID
+from .blobstore import is_inline_image
+from .jwks import CACHE_KEY as JWKS_CACHE_KEY, JWKSManager, jwks_manager
+from .management.commands.audit_indexes import FULL_SCAN
+from .management.commands.bench_api import Command as BenchApiCommand
+from .models import User, Sponsor, Event, Speaker, Attendee, Cinema, Showtime
+from .scraping import FetchFailed, TokenBucket, fetch_with_retry
+from .sync import ScheduleSnapshot, apply_snapshot
+
+
+def make_user(username='organiser', **extra):
+    return User.objects.create_user(username=username, email=f'{username}@mail.com', password='password', **extra)
+
+
+def make_event(user, title='Event', date=None, **extra):
+    fields = {
+        'title': title,
+        'image': '',
+        'description': f'About {title}',
+        'location': 'Nairobi',
+        'age_limit': '18+',
+        'capacity': 100,
+        'user': user,
+        'date': date or timezone.now(),
+        'price': 1000,
+        'event_planner_name': 'Planner',
+        'event_planner_contact': '0700000000',
+    }
+    fields.update(extra)
+    return Event.objects.create(**fields)
+
+
+class EventPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = make_user()
+        start = timezone.now()
+        # Several events share a timestamp so the id tie-breaker is exercised.
+        self.events = [
+            make_event(self.user, title=f'Event {i}', date=start + datetime.timedelta(days=i // 3))
+            for i in range(10)
+        ]
+
+    def collect(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+        return seen
+
+    def test_pages_cover_every_event_in_date_id_order(self):
+        expected = list(Event.objects.order_by('date', 'id').values_list('id', flat=True))
+        self.assertEqual(self.collect('/api/events/?page_size=4'), expected)
+
+    def test_previous_link_returns_the_earlier_page(self):
+        first = self.client.get('/api/events/?page_size=4').data
+        second = self.client.get(first['next']).data
+        self.assertIsNone(first['previous'])
+        back = self.client.get(second['previous']).data
+        self.assertEqual([r['id'] for r in back['results']], [r['id'] for r in first['results']])
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get('/api/events/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+    def test_sponsors_are_paginated_newest_first(self):
+        for i in range(5):
+            Sponsor.objects.create(title=f'S{i}', organisation='Org', category='Cat', industry='Ind')
+        self.client.force_authenticate(self.user)
+        expected = list(Sponsor.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(self.collect('/api/sponsors/?page_size=2'), expected)
+
+
+class EventQueryCountTests(TestCase):
+    """The events read path must cost the same number of queries for 1 row or 50."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = make_user()
+        self.cinemas = [Cinema.objects.create(name=f'Cinema {i}', location='Nairobi') for i in range(3)]
+
+    def add_events(self, count):
+        today = timezone.now().date()
+        for i in range(count):
+            event = make_event(self.user, title=f'Movie {Event.objects.count()}')
+            for cinema in self.cinemas:
+                Showtime.objects.create(movie=event, cinema=cinema, date=today, time=datetime.time(18, i % 60))
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def assertConstantQueries(self, url):
+        self.add_events(1)
+        baseline = self.count_queries(url)
+        self.add_events(15)
+        self.assertEqual(self.count_queries(url), baseline)
+
+    def test_event_list_query_count_does_not_grow_with_rows(self):
+        self.assertConstantQueries('/api/events/?page_size=50')
+
+    def test_event_detail_query_count_does_not_grow_with_showtimes(self):
+        self.add_events(1)
+        event = Event.objects.get()
+        baseline = self.count_queries(f'/api/events/{event.pk}/')
+        for cinema in self.cinemas:
+            for minute in range(10):
+                Showtime.objects.create(movie=event, cinema=cinema, date=timezone.now().date(), time=datetime.time(20, minute))
+        self.assertEqual(self.count_queries(f'/api/events/{event.pk}/'), baseline)
+
+
+PNG_BYTES = b'\x89PNG\r\n\x1a\n' + b'\x00' * 32
+
+
+class ImageBlobTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        override = override_settings(BLOB_STORE_ROOT=self.tmp.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client = APIClient()
+        self.user = make_user()
+        self.client.force_authenticate(self.user)
+
+    def create_event(self, image):
+        payload = {
+            'title': 'Launch', 'image': image, 'description': 'Launch party', 'location': 'Nairobi',
+            'age_limit': '18+', 'capacity': 10, 'user': self.user.pk, 'date': timezone.now().isoformat(),
+            'price': 500, 'event_planner_name': 'Planner', 'event_planner_contact': '0700000000',
+        }
+        return self.client.post('/api/events/', payload, format='json')
+
+    def test_base64_upload_is_stored_once_and_returned_as_url(self):
+        encoded = 'data:image/png;base64,' + base64.b64encode(PNG_BYTES).decode()
+        response = self.create_event(encoded)
+        self.assertEqual(response.status_code, 201, response.data)
+        event = Event.objects.get()
+        self.assertEqual(event.image, '')
+        self.assertTrue(event.image_key.endswith('.png'))
+        self.assertEqual(response.data['image'], f'http://testserver/api/images/{event.image_key}')
+        self.assertNotIn('image_key', response.data)
+
+        self.client.force_authenticate(None)
+        image = self.client.get(response.data['image'])
+        self.assertEqual(image.status_code, 200)
+        self.assertEqual(b''.join(image.streaming_content), PNG_BYTES)
+        self.assertEqual(image['Content-Type'], 'image/png')
+        self.assertIn('immutable', image['Cache-Control'])
+
+        cached = self.client.get(response.data['image'], HTTP_IF_NONE_MATCH=image['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_image_urls_are_passed_through(self):
+        response = self.create_event('https://example.com/poster.jpg')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['image'], 'https://example.com/poster.jpg')
+
+    def test_invalid_base64_is_rejected(self):
+        response = self.create_event('data:image/png;base64,@@not-base64@@')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
+
+    def test_short_text_is_not_taken_for_base64(self):
+        for value in ('poster', 'data', 'Poster coming soon'):
+            self.assertFalse(is_inline_image(value), value)
+        self.assertTrue(is_inline_image(base64.b64encode(PNG_BYTES).decode()))
+        response = self.create_event('poster')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['image'], 'poster')
+
+    def test_nothing_is_written_when_the_save_fails(self):
+        encoded = 'data:image/png;base64,' + base64.b64encode(PNG_BYTES).decode()
+        response = self.client.post('/api/events/', {'title': 'Launch', 'image': encoded}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(Path(self.tmp.name).rglob('*.png')), [])
+
+    def test_unknown_key_is_404(self):
+        self.assertEqual(self.client.get('/api/images/' + '0' * 64 + '.png').status_code, 404)
+
+
+class SparseFieldsetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = make_user()
+        cinema = Cinema.objects.create(name='Sarit', location='Westlands')
+        self.event = make_event(self.user, title='Dune', description='Long synopsis')
+        Showtime.objects.create(movie=self.event, cinema=cinema, date=timezone.now().date(), time=datetime.time(18, 0))
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, [q['sql'] for q in ctx.captured_queries]
+
+    def test_without_fields_everything_is_returned(self):
+        response, _ = self.get('/api/events/')
+        row = response.data['results'][0]
+        self.assertIn('description', row)
+        self.assertEqual(len(row['showtimes']), 1)
+
+    def test_fields_limit_the_response_and_the_columns_read(self):
+        response, queries = self.get('/api/events/?fields=id,title,date')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title', 'date'})
+        self.assertEqual(len(queries), 2)  # ETag aggregate + the page; no showtimes prefetch
+        self.assertNotIn('"description"', queries[1])
+        self.assertNotIn('"image"', queries[1])
+
+    def test_expand_adds_nested_relations(self):
+        response, queries = self.get('/api/events/?fields=id,title&expand=showtimes')
+        row = response.data['results'][0]
+        self.assertEqual(set(row), {'id', 'title', 'showtimes'})
+        self.assertEqual(row['showtimes'][0]['cinema']['name'], 'Sarit')
+        self.assertEqual(len(queries), 3)
+
+    def test_detail_and_other_viewsets_honor_fields(self):
+        self.client.force_authenticate(self.user)
+        response, queries = self.get(f'/api/events/{self.event.pk}/?fields=title,image')
+        self.assertEqual(set(response.data), {'title', 'image'})
+        response, queries = self.get('/api/users/?fields=username')
+        self.assertEqual(response.data['results'], [{'username': 'organiser'}])
+        self.assertNotIn('"email"', queries[-1])
+
+
+def make_signing_key(kid='test-key'):
+    """An RSA key pair plus the JWKS document Clerk would publish for it."""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(RSAAlgorithm.to_jwk(private_key.public_key()))
+    jwk.update({'kid': kid, 'use': 'sig', 'alg': 'RS256'})
+    return private_key, {'keys': [jwk]}
+
+
+def mint_token(private_key, sub, kid='test-key', lifetime=60):
+    now = int(time.time())
+    claims = {'sub': sub, 'iat': now, 'nbf': now, 'exp': now + lifetime}
+    return jwt.encode(claims, private_key, algorithm='RS256', headers={'kid': kid})
+
+
+class ClerkAuthenticationCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        authentication._token_cache.clear()
+        jwks_manager.reset()
+        self.private_key, self.jwks = make_signing_key()
+        cache.set('clerk_jwks', self.jwks, 60 * 60)
+        self.user = make_user(clerk_user_id='user_123')
+        self.client = APIClient()
+
+    def get_users(self, token):
+        return self.client.get('/api/users/', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_repeated_token_is_verified_once(self):
+        token = mint_token(self.private_key, 'user_123')
+        with mock.patch('events.authentication.jwt.decode', wraps=jwt.decode) as decode, \
+                mock.patch('events.jwks.RSAAlgorithm.from_jwk', wraps=RSAAlgorithm.from_jwk) as from_jwk:
+            for _ in range(3):
+                self.assertEqual(self.get_users(token).status_code, 200)
+            # A second token signed with the same kid reuses the parsed key.
+            self.assertEqual(self.get_users(mint_token(self.private_key, 'user_123', lifetime=120)).status_code, 200)
+        self.assertEqual(decode.call_count, 2)
+        self.assertEqual(from_jwk.call_count, 1)
+
+    def test_cached_claims_expire_with_the_token(self):
+        token_cache = authentication.TokenCache(maxsize=2)
+        token_cache.set('a', {'sub': 'x', 'exp': time.time() - 1})
+        self.assertIsNone(token_cache.get('a'))
+        token_cache.set('b', {'sub': 'x'})  # no exp: never cached
+        self.assertIsNone(token_cache.get('b'))
+
+    def test_cache_is_bounded(self):
+        token_cache = authentication.TokenCache(maxsize=2)
+        exp = time.time() + 60
+        for name in 'abc':
+            token_cache.set(name, {'sub': name, 'exp': exp})
+        self.assertIsNone(token_cache.get('a'))
+        self.assertEqual(token_cache.get('c')['sub'], 'c')
+
+    def test_bad_signature_is_rejected(self):
+        other_key, _ = make_signing_key()
+        self.assertEqual(self.get_users(mint_token(other_key, 'user_123')).status_code, 403)
+
+
+class StubJWKSServer:
+    """A local HTTP server publishing a JWKS document, counting fetches."""
+
+    def __init__(self, jwks, delay=0):
+        self.jwks = jwks
+        self.delay = delay
+        self.status = 200
+        self.hits = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.hits += 1
+                time.sleep(stub.delay)
+                body = json.dumps(stub.jwks).encode()
+                self.send_response(stub.status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}/.well-known/jwks.json'
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class JWKSManagerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.private_key, jwks = make_signing_key('key-1')
+        self.server = StubJWKSServer(jwks)
+        self.addCleanup(self.server.close)
+
+    def manager(self, **kwargs):
+        kwargs.setdefault('min_refetch_interval', 0)
+        return JWKSManager(url=self.server.url, **kwargs)
+
+    def test_concurrent_cold_misses_share_one_fetch(self):
+        self.server.delay = 0.2
+        manager = self.manager()
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            keys = list(pool.map(lambda _: manager.get_key('key-1'), range(10)))
+        self.assertTrue(all(key is not None for key in keys))
+        self.assertEqual(self.server.hits, 1)
+
+    def test_refreshes_ahead_of_expiry_in_background(self):
+        manager = self.manager(ttl=60, refresh_ahead=60)
+        self.assertIsNotNone(manager.get_key('key-1'))
+        # Already inside the refresh-ahead window: the caller is served from
+        # memory while a background thread refetches.
+        self.assertIsNotNone(manager.get_key('key-1'))
+        deadline = time.time() + 5
+        while self.server.hits < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.server.hits, 2)
+
+    def test_serves_last_known_keys_when_refresh_fails(self):
+        manager = self.manager(ttl=60, refresh_ahead=0)
+        key = manager.get_key('key-1')
+        self.server.status = 500
+        with self.assertLogs('events.jwks', 'WARNING'):
+            self.assertIsNone(manager.get_key('rotated-kid'))  # forces a refetch, which fails
+        self.assertEqual(self.server.hits, 2)
+        self.assertIs(manager.get_key('key-1'), key)
+
+    def test_failed_refresh_backs_off_before_retrying(self):
+        manager = self.manager(ttl=60, refresh_ahead=0)
+        manager.get_key('key-1')
+        self.server.status = 500
+        with self.assertLogs('events.jwks', 'WARNING'):
+            manager.get_key('rotated-kid')
+        # Even with no refetch interval configured, the keys stay fresh for a while.
+        for _ in range(5):
+            manager.get_key('key-1')
+        time.sleep(0.1)
+        self.assertEqual(self.server.hits, 2)
+
+    def test_unknown_kid_triggers_refetch(self):
+        manager = self.manager()
+        manager.get_key('key-1')
+        _, rotated = make_signing_key('key-2')
+        self.server.jwks = {'keys': self.server.jwks['keys'] + rotated['keys']}
+        self.assertIsNotNone(manager.get_key('key-2'))
+        self.assertEqual(self.server.hits, 2)
+
+    def test_unknown_kid_refetch_is_rate_limited(self):
+        manager = self.manager(min_refetch_interval=60)
+        manager.get_key('key-1')
+        for _ in range(5):
+            self.assertIsNone(manager.get_key('no-such-kid'))
+        self.assertEqual(self.server.hits, 1)
+
+
+class ClerkUserCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.auth = authentication.ClerkAuthentication()
+        self.user = make_user(clerk_user_id='user_123')
+
+    def test_repeat_lookups_hit_the_cache(self):
+        self.assertEqual(self.auth.get_user('user_123'), self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.auth.get_user('user_123'), self.user)
+
+    def test_save_and_delete_invalidate_the_cache(self):
+        self.auth.get_user('user_123')
+        self.user.first_name = 'Wanjiru'
+        self.user.save()
+        self.assertEqual(self.auth.get_user('user_123').first_name, 'Wanjiru')
+        self.user.delete()
+        self.assertIsNone(cache.get(authentication.user_cache_key('user_123')))
+
+
+class ClerkUserProvisioningTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def clerk_response(self, *args, **kwargs):
+        with self.lock:
+            self.calls += 1
+        time.sleep(0.2)
+        response = mock.Mock()
+        response.json.return_value = {
+            'id': 'user_new', 'username': 'newbie', 'first_name': 'New', 'last_name': 'User',
+            'primary_email_address_id': 'e1',
+            'email_addresses': [{'id': 'e1', 'email_address': 'newbie@mail.com'}],
+        }
+        return response
+
+    def test_parallel_first_requests_provision_once(self):
+        cache.clear()
+        self.calls = 0
+        self.lock = threading.Lock()
+
+        def resolve(_):
+            try:
+                return authentication.ClerkAuthentication().get_user('user_new').pk
+            finally:
+                connection.close()
+
+        with mock.patch('events.clerk.requests.get', side_effect=self.clerk_response):
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                pks = set(pool.map(resolve, range(8)))
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(len(pks), 1)
+        self.assertEqual(User.objects.filter(clerk_user_id='user_new').count(), 1)
+        self.assertEqual(authentication._provisioning, {})
+
+    def test_parallel_first_requests_share_a_clerk_failure(self):
+        cache.clear()
+        self.calls = 0
+        self.lock = threading.Lock()
+
+        def failing_clerk_response(*args, **kwargs):
+            self.clerk_response()
+            raise requests.ConnectionError('Clerk is down')
+
+        def resolve(_):
+            try:
+                authentication.ClerkAuthentication().get_user('user_new')
+            except AuthenticationFailed:
+                return 'failed'
+            finally:
+                connection.close()
+
+        with mock.patch('events.clerk.requests.get', side_effect=failing_clerk_response):
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                outcomes = list(pool.map(resolve, range(8)))
+        self.assertEqual(outcomes, ['failed'] * 8)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(authentication._provisioning, {})
+
+
+WEBHOOK_SECRET = 'whsec_' + base64.b64encode(b'test-webhook-secret').decode()
+
+
+def clerk_user_payload(clerk_id, email, username=None, **extra):
+    payload = {
+        'id': clerk_id, 'username': username, 'first_name': 'Amani', 'last_name': 'Otieno',
+        'primary_email_address_id': 'e1', 'email_addresses': [{'id': 'e1', 'email_address': email}],
+    }
+    payload.update(extra)
+    return payload
+
+
+@override_settings(CLERK_WEBHOOK_SECRET=WEBHOOK_SECRET)
+class ClerkWebhookTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def post_event(self, event, secret=WEBHOOK_SECRET, msg_id='msg_1'):
+        body = json.dumps(event).encode()
+        timestamp = str(int(time.time()))
+        key = base64.b64decode(secret[len('whsec_'):])
+        signature = base64.b64encode(hmac.new(key, f'{msg_id}.{timestamp}.'.encode() + body, hashlib.sha256).digest())
+        return self.client.generic(
+            'POST', '/api/webhooks/clerk/', body, content_type='application/json',
+            HTTP_SVIX_ID=msg_id, HTTP_SVIX_TIMESTAMP=timestamp, HTTP_SVIX_SIGNATURE=f'v1,{signature.decode()}',
+        )
+
+    def test_user_created_and_updated_are_upserted_idempotently(self):
+        event = {'type': 'user.created', 'data': clerk_user_payload('user_abc', 'amani@mail.com')}
+        for _ in range(2):  # Svix retries deliver the same event again
+            self.assertEqual(self.post_event(event).status_code, 200)
+        user = User.objects.get(clerk_user_id='user_abc')
+        self.assertEqual((user.username, user.email), ('amani', 'amani@mail.com'))
+        self.assertFalse(user.has_usable_password())
+
+        event = {'type': 'user.updated', 'data': clerk_user_payload('user_abc', 'amani@mail.com', first_name='Ama')}
+        self.post_event(event)
+        self.assertEqual(User.objects.get(clerk_user_id='user_abc').first_name, 'Ama')
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_existing_user_is_linked_by_email(self):
+        existing = make_user('amani')
+        self.post_event({'type': 'user.created', 'data': clerk_user_payload('user_abc', existing.email, 'amani')})
+        existing.refresh_from_db()
+        self.assertEqual(existing.clerk_user_id, 'user_abc')
+
+    def test_username_clash_gets_a_suffix(self):
+        make_user('amani')
+        self.post_event({'type': 'user.created', 'data': clerk_user_payload('user_abc12345', 'amani@other.com')})
+        self.assertEqual(User.objects.get(clerk_user_id='user_abc12345').username, 'amani_abc12345')
+
+    def test_user_deleted_deactivates(self):
+        make_user(clerk_user_id='user_abc')
+        self.post_event({'type': 'user.deleted', 'data': {'id': 'user_abc', 'deleted': True}})
+        self.assertFalse(User.objects.get(clerk_user_id='user_abc').is_active)
+
+    def test_late_update_does_not_reactivate_a_deleted_user(self):
+        self.post_event({'type': 'user.created', 'data': clerk_user_payload('user_abc', 'amani@mail.com')})
+        self.post_event({'type': 'user.deleted', 'data': {'id': 'user_abc', 'deleted': True}})
+        for event_type in ('user.created', 'user.updated'):  # replayed or delivered out of order
+            event = {'type': event_type, 'data': clerk_user_payload('user_abc', 'amani@mail.com', first_name='Ama')}
+            self.assertEqual(self.post_event(event).status_code, 200)
+        user = User.objects.get(clerk_user_id='user_abc')
+        self.assertFalse(user.is_active)
+        self.assertEqual(user.first_name, 'Ama')
+
+    def test_malformed_payload_is_rejected(self):
+        for event in ({'type': 'user.created', 'data': {'username': 'amani'}},
+                      {'type': 'user.updated', 'data': None},
+                      {'type': 'user.deleted', 'data': {'id': 42}},
+                      ['user.created']):
+            self.assertEqual(self.post_event(event).status_code, 400, event)
+        self.assertFalse(User.objects.exists())
+
+    def test_bad_signature_is_rejected(self):
+        other = 'whsec_' + base64.b64encode(b'wrong').decode()
+        response = self.post_event({'type': 'user.created', 'data': clerk_user_payload('user_x', 'x@mail.com')}, secret=other)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(User.objects.exists())
+
+    def test_backfill_command_pages_through_clerk(self):
+        pages = [
+            [clerk_user_payload(f'user_{i}', f'person{i}@mail.com') for i in range(2)],
+            [clerk_user_payload('user_2', 'person2@mail.com'), {'id': 'user_3', 'email_addresses': []}],
+            [],
+        ]
+        with mock.patch('events.clerk._api_get', side_effect=pages) as api_get:
+            call_command('sync_clerk_users', page_size=2, stdout=io.StringIO())
+        self.assertEqual(api_get.call_count, 3)  # third call is past the end
+        self.assertEqual(User.objects.filter(clerk_user_id__startswith='user_').count(), 3)
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200, headers=None):
+        self.payload = payload
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.content = json.dumps(payload).encode()
+
+    def json(self):
+        return self.payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f'HTTP {self.status_code}')
+
+
+class FakeKenyaBuzz:
+    """Stands in for the cloudscraper session used by scrape_movies."""
+
+    def __init__(self, schedules, etags=False, cinema_api=False):
+        # schedules: {movie_slug: {cinema_name: {date: [times]}}}
+        self.schedules = schedules
+        self.etags = etags
+        self.cinema_api = cinema_api
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def movies_payload(self):
+        return {'data': [
+            {'movie_name': slug.replace('-', ' ').title(), 'movie_slug': slug, 'poster': f'https://img/{slug}.jpg',
+             'rating': 'PG', 'synopsis': f'All about {slug}'}
+            for slug in self.schedules
+        ]}
+
+    def schedule_payload(self, slug):
+        return {'data': [
+            {'cinema': {'cinema_name': cinema, 'cinema_address': 'Nairobi'},
+             'dates': [{'movie_date': day, 'movies': [{'movie_slug': slug, 'shows': [{'movie_time': t} for t in times]}]}
+                       for day, times in dates.items()]}
+            for cinema, dates in self.schedules[slug].items()
+        ]}
+
+    def cinema_names(self):
+        return sorted({cinema for by_cinema in self.schedules.values() for cinema in by_cinema})
+
+    def cinema_schedule_payload(self, cinema_slug):
+        cinema = next(name for name in self.cinema_names() if name.lower() == cinema_slug)
+        dates = {}
+        for slug, by_cinema in self.schedules.items():
+            for day, times in by_cinema.get(cinema, {}).items():
+                dates.setdefault(day, []).append({'movie_slug': slug, 'shows': [{'movie_time': t} for t in times]})
+        return {'data': [{'cinema': {'cinema_name': cinema, 'cinema_address': 'Nairobi'},
+                          'dates': [{'movie_date': day, 'movies': movies} for day, movies in dates.items()]}]}
+
+    def get(self, url, **kwargs):
+        with self.lock:
+            self.requests.append(('GET', url, None))
+        if url.endswith('fetch-cinemas'):
+            if not self.cinema_api:
+                return FakeResponse({}, 404)
+            return FakeResponse({'data': [{'cinema_name': name, 'cinema_slug': name.lower(), 'cinema_address': 'Nairobi'}
+                                          for name in self.cinema_names()]})
+        return FakeResponse(self.movies_payload())
+
+    def post(self, url, json=None, headers=None, **kwargs):
+        with self.lock:
+            self.requests.append(('POST', url, json))
+        if json['a'] == 'c':
+            response = FakeResponse(self.cinema_schedule_payload(json['b']))
+        else:
+            response = FakeResponse(self.schedule_payload(json['b']))
+        if self.etags:
+            etag = '"%s"' % hashlib.sha256(response.content).hexdigest()[:16]
+            if (headers or {}).get('If-None-Match') == etag:
+                return FakeResponse(None, 304)
+            response.headers['ETag'] = etag
+        return response
+
+
+SCHEDULES = {
+    'dune-part-two': {'Sarit': {'2026-03-24': ['14:30', '18:00']}, 'Junction': {'2026-03-24': ['20:00']}},
+    'inside-out-2': {'Sarit': {'2026-03-24': ['11:00'], '2026-03-25': ['11:00']}},
+    'no-shows': {},
+}
+
+
+class ScrapeMoviesTests(TestCase):
+    def setUp(self):
+        User.objects.create_superuser(username='admin', email='admin@mail.com', password='password')
+        self.upstream = FakeKenyaBuzz(copy.deepcopy(SCHEDULES))
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache_dir = tmp.name
+        override = override_settings(SCRAPE_CACHE_DIR=self.cache_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def scrape(self, *args):
+        out = io.StringIO()
+        with mock.patch('events.management.commands.scrape_movies.cloudscraper.create_scraper',
+                        return_value=self.upstream), redirect_stdout(io.StringIO()):
+            call_command('scrape_movies', '--rate', '1000', *args, stdout=out)
+        return out.getvalue()
+
+    def showtimes(self):
+        return set(Showtime.objects.values_list('movie__title', 'cinema__name', 'date', 'time'))
+
+    def test_sync_creates_events_cinemas_and_showtimes(self):
+        output = self.scrape('--concurrency', '3')
+        self.assertIn('SUCCESS', output)
+        self.assertEqual(Event.objects.count(), 3)
+        self.assertEqual(set(Cinema.objects.values_list('name', flat=True)), {'Sarit', 'Junction'})
+        self.assertEqual(len(self.showtimes()), 5)
+        self.assertIn(('Dune Part Two', 'Junction', datetime.date(2026, 3, 24), datetime.time(20, 0)), self.showtimes())
+
+
+    def test_resync_applies_only_the_difference(self):
+        self.scrape()
+        kept = Showtime.objects.get(movie__title='Dune Part Two', cinema__name='Junction')
+        dune = Event.objects.get(title='Dune Part Two')
+        updated_at = dune.updated_at
+        untouched = Event.objects.exclude(title__in=['Dune Part Two', 'Inside Out 2']).get()
+
+        schedules = self.upstream.schedules
+        schedules['dune-part-two']['Sarit']['2026-03-24'] = ['14:30', '21:15']  # 18:00 dropped, 21:15 added
+        del schedules['inside-out-2']  # no longer showing
+        output = self.scrape()
+
+        self.assertIn('Showtimes: 1 added, 3 removed.', output)
+        self.assertTrue(Showtime.objects.filter(pk=kept.pk).exists())  # untouched rows keep their ids
+        self.assertEqual(Showtime.objects.filter(movie__title='Inside Out 2').count(), 0)
+        self.assertIn('0 updated', output)  # unchanged event fields aren't rewritten...
+        dune.refresh_from_db()
+        self.assertGreater(dune.updated_at, updated_at)  # ...but its showtimes changed, which its ETag must reflect
+        self.assertEqual(Event.objects.get(pk=untouched.pk).updated_at, untouched.updated_at)
+
+    def test_removed_showtimes_are_deleted_in_bulk(self):
+        user = User.objects.get()
+        sponsor = Sponsor.objects.create(title='KenyaBuzz', organisation='KenyaBuzz', category='C', industry='I')
+        fields = {'image': '', 'description': '', 'location': 'Various Cinemas', 'price': 850,
+                  'event_planner_name': 'KenyaBuzz Movies', 'event_planner_contact': '0700000000',
+                  'age_limit': '18+', 'capacity': 100, 'user_id': user.pk, 'sponsor_id': sponsor.pk}
+
+        def snapshot(days):
+            snap = ScheduleSnapshot()
+            for title in ('Dune', 'Wicked'):
+                snap.add_movie(title, title.lower(), fields)
+                for cinema in ('Sarit', 'Junction'):
+                    snap.cinemas.setdefault(cinema, 'Nairobi')
+                    for day in range(days):
+                        for hour in (12, 15, 18, 21):
+                            snap.showtimes.add((title, cinema, datetime.date(2026, 3, 1 + day), datetime.time(hour)))
+            return snap
+
+        def queries_to_shrink(days):
+            apply_snapshot(snapshot(days))
+            with CaptureQueriesContext(connection) as ctx:
+                stats = apply_snapshot(snapshot(1))
+            self.assertEqual(stats['showtimes_deleted'], 16 * (days - 1))
+            return len(ctx.captured_queries)
+
+        # Removing 16 or 144 showtimes takes the same queries: no per-row signals.
+        self.assertEqual(queries_to_shrink(10), queries_to_shrink(2))
+
+    def test_failed_schedule_fetch_keeps_existing_showtimes(self):
+        self.scrape()
+        post = self.upstream.post
+
+        def flaky_post(url, json=None, **kwargs):
+            if json['b'] == 'inside-out-2':
+                return FakeResponse({}, 404)
+            return post(url, json=json, **kwargs)
+
+        self.upstream.post = flaky_post
+        self.scrape()
+        self.assertEqual(Showtime.objects.filter(movie__title='Inside Out 2').count(), 2)
+
+    def test_schedule_writes_happen_in_one_transaction(self):
+        self.scrape()
+        self.upstream.schedules['dune-part-two']['Sarit']['2026-03-25'] = ['10:00']
+        with CaptureQueriesContext(connection) as ctx:
+            self.scrape()
+        sql = [q['sql'] for q in ctx.captured_queries]
+        # Inside a TestCase, atomic() shows up as a savepoint.
+        begin = next(i for i, q in enumerate(sql) if q.startswith('SAVEPOINT'))
+        end = next(i for i, q in enumerate(sql) if q.startswith('RELEASE SAVEPOINT'))
+        writes = [i for i, q in enumerate(sql)
+                  if q.startswith(('INSERT', 'UPDATE', 'DELETE')) and 'events_showtime' in q]
+        self.assertTrue(writes)
+        self.assertTrue(all(begin < i < end for i in writes))
+
+
+    def test_unchanged_schedules_are_not_reapplied(self):
+        self.scrape()
+        with CaptureQueriesContext(connection) as ctx:
+            output = self.scrape()
+        self.assertIn('2 schedules unchanged since the last sync, skipped.', output)
+        self.assertIn('Showtimes: 0 added, 0 removed.', output)
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith(('INSERT', 'DELETE'))])
+
+        self.upstream.schedules['inside-out-2']['Sarit']['2026-03-26'] = ['11:00']
+        output = self.scrape()
+        self.assertIn('1 schedules unchanged', output)
+        self.assertIn('Showtimes: 1 added, 0 removed.', output)
+
+    def test_full_reapplies_everything(self):
+        self.scrape()
+        Showtime.objects.filter(movie__title='Inside Out 2').delete()
+        self.scrape('--full')
+        self.assertEqual(Showtime.objects.filter(movie__title='Inside Out 2').count(), 2)
+
+    def test_etag_revalidation_serves_304_from_cache(self):
+        self.upstream.etags = True
+        self.scrape()
+        with mock.patch.object(self.upstream, 'post', wraps=self.upstream.post) as post:
+            self.scrape('--full')
+        self.assertTrue(post.call_args_list)
+        self.assertTrue(all('If-None-Match' in call.kwargs['headers'] for call in post.call_args_list))
+        self.assertEqual(len(self.showtimes()), 5)
+
+    def test_replay_runs_offline_from_recorded_responses(self):
+        self.scrape()
+        expected = self.showtimes()
+        Showtime.objects.all().delete()
+        out = io.StringIO()
+        with mock.patch('events.management.commands.scrape_movies.cloudscraper.create_scraper',
+                        side_effect=AssertionError('network used during replay')), redirect_stdout(io.StringIO()):
+            call_command('scrape_movies', '--replay', self.cache_dir, stdout=out)
+        self.assertIn('SUCCESS', out.getvalue())
+        self.assertEqual(self.showtimes(), expected)
+
+
+    def posts(self):
+        return [body for method, _, body in self.upstream.requests if method == 'POST']
+
+    def test_auto_strategy_fetches_per_cinema_when_cheaper(self):
+        reference = FakeKenyaBuzz(copy.deepcopy(SCHEDULES))
+        self.upstream.cinema_api = True
+        output = self.scrape('--no-cache')
+        self.assertIn('Strategy: per-cinema, 2 schedule requests.', output)
+        self.assertEqual(sorted(body['b'] for body in self.posts()), ['junction', 'sarit'])
+        self.assertIn('Requests: 4 sent upstream', output)  # movies + cinema list + 2 cinemas
+        self.assertIn('Timings: movies', output)
+
+        per_cinema = self.showtimes()
+        Showtime.objects.all().delete()
+        self.upstream = reference
+        self.scrape('--no-cache', '--strategy', 'movie')
+        self.assertEqual(self.showtimes(), per_cinema)
+
+    def test_auto_strategy_stays_per_movie_when_cinemas_outnumber_movies(self):
+        self.upstream.cinema_api = True
+        for i in range(5):
+            Cinema.objects.create(name=f'Cinema {i}', location='Nairobi')
+        output = self.scrape()
+        self.assertIn('Strategy: per-movie, 3 schedule requests.', output)
+        self.assertEqual({body['a'] for body in self.posts()}, {'m'})
+
+    def test_falls_back_to_per_movie_without_a_cinema_list(self):
+        output = self.scrape('--strategy', 'cinema')
+        self.assertIn('Could not list cinemas', output)
+        self.assertEqual(len(self.showtimes()), 5)
+
+
+class EventSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = make_user()
+        self.dune = make_event(self.user, title='Dune: Part Two', description='Sci-fi epic on the big screen')
+        self.jazz = make_event(self.user, title='Jazz Night', description='Live music', location='Nairobi Arboretum')
+        self.talk = make_event(self.user, title='Tech Summit', description='Panels about dune ecology')
+        Speaker.objects.create(name='Wanjiru Kamau', email='w@mail.com', event=self.talk,
+                               organisation='Org', job_title='CTO')
+
+    def search(self, q):
+        response = self.client.get('/api/events/search/', {'q': q})
+        self.assertEqual(response.status_code, 200)
+        return [row['title'] for row in response.data['results']]
+
+    def test_ranks_title_matches_first(self):
+        self.assertEqual(self.search('dune'), ['Dune: Part Two', 'Tech Summit'])
+
+    def test_prefix_matching_on_every_word(self):
+        self.assertEqual(self.search('dun par'), ['Dune: Part Two'])
+        self.assertEqual(self.search('arbor'), ['Jazz Night'])
+
+    def test_speaker_names_are_searchable_and_kept_in_sync(self):
+        self.assertEqual(self.search('wanjiru'), ['Tech Summit'])
+        speaker = Speaker.objects.get()
+        speaker.name = 'Achieng Otieno'
+        speaker.save()
+        self.assertEqual(self.search('wanjiru'), [])
+        speaker.delete()
+        self.assertEqual(self.search('achieng'), [])
+
+    def test_index_follows_updates_deletes_and_bulk_sync(self):
+        self.jazz.title = 'Blues Night'
+        self.jazz.save()
+        self.assertEqual(self.search('jazz'), [])
+        self.assertEqual(self.search('blues'), ['Blues Night'])
+        self.dune.delete()
+        self.assertEqual(self.search('dune'), ['Tech Summit'])
+
+        # apply_snapshot writes with bulk_create/bulk_update, which send no signals.
+        snapshot = ScheduleSnapshot()
+        snapshot.add_movie('Bulk Gala', 'bulk-gala', {
+            'image': '', 'description': 'Gala premiere', 'location': 'Nairobi', 'price': 0,
+            'event_planner_name': 'KenyaBuzz Movies', 'event_planner_contact': 'info@kenyabuzz.com',
+            'age_limit': 'PG', 'capacity': 100, 'user_id': self.user.pk, 'sponsor_id': None,
+        })
+        apply_snapshot(snapshot)
+        self.assertEqual(self.search('gala'), ['Bulk Gala'])
+        snapshot.events['Bulk Gala']['description'] = 'Red carpet premiere'
+        apply_snapshot(snapshot)
+        self.assertEqual(self.search('carpet'), ['Bulk Gala'])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.search('"dune" OR NEAR( *'), [])
+        self.assertEqual(self.search('jazz" -'), ['Jazz Night'])
+        self.assertEqual(self.client.get('/api/events/search/', {'q': '  '}).status_code, 400)
+        self.assertEqual(self.search('!!!'), [])
+
+
+class ShowtimeSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        user = make_user()
+        self.dune = make_event(user, title='Dune')
+        self.wicked = make_event(user, title='Wicked')
+        self.sarit = Cinema.objects.create(name='Sarit', location='Westlands')
+        self.junction = Cinema.objects.create(name='Junction', location='Ngong Road')
+        self.today = datetime.date(2026, 3, 24)
+        for day in range(3):
+            for hour in (11, 15, 19, 21):
+                for movie, cinema in ((self.dune, self.sarit), (self.wicked, self.junction)):
+                    Showtime.objects.create(movie=movie, cinema=cinema, time=datetime.time(hour, 0),
+                                            date=self.today + datetime.timedelta(days=day))
+
+    def rows(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_whats_on_at_a_cinema_tonight(self):
+        rows = self.rows(f'/api/showtimes/?cinema={self.sarit.pk}&date=2026-03-24&time_from=18:00')
+        self.assertEqual([(r['movie_title'], r['time']) for r in rows], [('Dune', '19:00:00'), ('Dune', '21:00:00')])
+        self.assertEqual(rows[0]['cinema']['name'], 'Sarit')
+        self.assertEqual(rows[0]['movie'], self.dune.pk)
+
+    def test_date_range_and_movie_filters(self):
+        rows = self.rows(f'/api/showtimes/?movie={self.wicked.pk}&date_from=2026-03-25&date_to=2026-03-26'
+                         '&time_from=11:00&time_to=15:00')
+        self.assertEqual([(r['date'], r['time']) for r in rows], [
+            ('2026-03-25', '11:00:00'), ('2026-03-25', '15:00:00'),
+            ('2026-03-26', '11:00:00'), ('2026-03-26', '15:00:00'),
+        ])
+        self.assertEqual({r['movie_title'] for r in rows}, {'Wicked'})
+
+    def test_fields_with_and_without_the_cinema(self):
+        rows = self.rows(f'/api/showtimes/?cinema={self.sarit.pk}&date=2026-03-24&fields=id,date')
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(set(rows[0]), {'id', 'date'})
+        rows = self.rows(f'/api/showtimes/?cinema={self.sarit.pk}&date=2026-03-24&fields=id,cinema')
+        self.assertEqual(rows[0]['cinema']['name'], 'Sarit')
+
+    def test_pages_follow_date_time_order(self):
+        seen, url = [], '/api/showtimes/?page_size=5'
+        while url:
+            response = self.client.get(url)
+            seen.extend((r['date'], r['time'], r['id']) for r in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(len(seen), 24)
+        self.assertEqual(seen, sorted(seen))
+
+    def test_invalid_filters_are_rejected(self):
+        for query in ('date=tomorrow', 'cinema=abc', 'date_from=2026-03-26&date_to=2026-03-24',
+                      'date=2026-03-24&date_from=2026-03-24'):
+            self.assertEqual(self.client.get(f'/api/showtimes/?{query}').status_code, 400, query)
+
+    def test_cinema_filter_is_an_index_range_scan(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.rows(f'/api/showtimes/?cinema={self.sarit.pk}&date_from=2026-03-24&time_from=18:00')
+        self.assertEqual(len(ctx.captured_queries), 1)
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + ctx.captured_queries[0]['sql'])
+            plan = ' | '.join(row[-1] for row in cursor.fetchall())
+        self.assertIn('showtime_cinema_date_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class RegistrationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = make_user(username='guest', first_name='Grace', last_name='Wambui')
+        self.client.force_authenticate(self.user)
+        self.event = make_event(self.user, capacity=2)
+
+    def register(self, event_id=None, **body):
+        return self.client.post(f'/api/events/{event_id or self.event.pk}/register/', body, format='json')
+
+    def test_registers_until_full_then_sold_out(self):
+        first = self.register()
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual((first.data['name'], first.data['email']), ('Grace Wambui', 'guest@mail.com'))
+        self.assertEqual(self.register(name='Plus One', email='plus@mail.com').status_code, 201)
+
+        with self.assertNumQueries(1):
+            response = self.register()
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['detail'].code, 'sold_out')
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.seats_taken, 2)
+        self.assertEqual(self.event.attendees.count(), 2)
+
+    def test_unknown_event_and_anonymous_requests(self):
+        self.assertEqual(self.register(event_id=999999).status_code, 404)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.register().status_code, 403)
+
+    def test_attendee_endpoints_keep_the_counter_in_step(self):
+        body = {'name': 'A', 'email': 'a@mail.com', 'user': self.user.pk, 'event': self.event.pk}
+        created = [self.client.post('/api/attendees/', body, format='json') for _ in range(3)]
+        self.assertEqual([r.status_code for r in created], [201, 201, 409])
+        self.assertEqual(self.client.delete(f"/api/attendees/{created[0].data['id']}/").status_code, 204)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.seats_taken, 1)
+        self.assertEqual(self.register().status_code, 201)
+
+    def test_seats_taken_is_read_only(self):
+        response = self.client.patch(f'/api/events/{self.event.pk}/', {'seats_taken': 0}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['seats_taken'], 0)
+        self.register()
+        response = self.client.patch(f'/api/events/{self.event.pk}/', {'seats_taken': 0}, format='json')
+        self.assertEqual(response.data['seats_taken'], 1)
+
+
+class RegistrationConcurrencyTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def test_parallel_signups_never_oversell(self):
+        capacity, requests_made = 25, 200
+        users = User.objects.bulk_create(
+            [User(username=f'fan{i}', email=f'fan{i}@mail.com') for i in range(requests_made)])
+        event = make_event(users[0], capacity=capacity)
+        start = threading.Barrier(16)
+
+        def signup(i):
+            client = APIClient()
+            client.force_authenticate(users[i])
+            try:
+                if i < 16:
+                    start.wait()  # line the first wave up so they race for the same seats
+                return client.post(f'/api/events/{event.pk}/register/').status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            statuses = list(pool.map(signup, range(requests_made)))
+
+        self.assertEqual(statuses.count(201), capacity)
+        self.assertEqual(statuses.count(409), requests_made - capacity)
+        event.refresh_from_db()
+        self.assertEqual(event.seats_taken, capacity)
+        self.assertEqual(Attendee.objects.filter(event=event).count(), capacity)
+
+
+class AttendeeImportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = make_user()
+        self.client.force_authenticate(self.user)
+        self.event = make_event(self.user, capacity=100)
+
+    def post(self, body, content_type):
+        return self.client.generic('POST', '/api/attendees/import/', body, content_type=content_type)
+
+    def test_csv_import_reports_bad_rows_and_keeps_the_rest(self):
+        other = make_user(username='other')
+        body = (
+            'name,email,event,user\n'
+            f'Ann,ann@mail.com,{self.event.pk},\n'
+            f'Ben,not-an-email,{self.event.pk},\n'
+            f'Cy,cy@mail.com,999999,\n'
+            f'Di,di@mail.com,{self.event.pk},{other.pk}\n'
+            f',nameless@mail.com,{self.event.pk},\n'
+        )
+        response = self.post(body.encode(), 'text/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 3))
+        self.assertEqual([(e['row'], list(e['errors'])) for e in response.data['errors']],
+                         [(3, ['email']), (4, ['event']), (6, ['name'])])
+        self.assertEqual(set(self.event.attendees.values_list('name', 'user_id')),
+                         {('Ann', self.user.pk), ('Di', other.pk)})
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.seats_taken, 2)
+
+    def test_ndjson_import_uses_one_query_per_lookup_per_chunk(self):
+        lines = [json.dumps({'name': f'Guest {i}', 'email': f'g{i}@mail.com', 'event': self.event.pk})
+                 for i in range(60)]
+        lines.insert(10, '{not json')
+        body = '\n'.join(lines).encode()
+        # user lookup, event lookup, seat read, seat update, insert (+ savepoint bookkeeping)
+        with self.assertNumQueries(7):
+            response = self.post(body, 'application/x-ndjson')
+        self.assertEqual((response.data['created'], response.data['failed']), (60, 1))
+        self.assertEqual(response.data['errors'][0]['row'], 11)
+
+    def test_rows_past_capacity_are_rejected(self):
+        small = make_event(self.user, title='Small', capacity=2)
+        body = '\n'.join(json.dumps({'name': n, 'email': f'{n}@mail.com', 'event': small.pk}) for n in 'abc')
+        response = self.post(body.encode(), 'application/x-ndjson')
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 1))
+        self.assertEqual(str(response.data['errors'][0]['errors']['event'][0]), 'This event is sold out.')
+        small.refresh_from_db()
+        self.assertEqual(small.seats_taken, 2)
+
+    def test_unknown_format_is_rejected(self):
+        self.assertEqual(self.post(b'name,email', 'text/plain').status_code, 400)
+
+    def test_management_command_imports_in_chunks(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as fh:
+            fh.write('name,email,event\n')
+            for i in range(5):
+                fh.write(f'Guest {i},g{i}@mail.com,{self.event.pk}\n')
+        self.addCleanup(os.remove, fh.name)
+        out = io.StringIO()
+        call_command('import_attendees', fh.name, '--user', self.user.username, '--chunk-size', '2', stdout=out)
+        self.assertEqual(out.getvalue().count('so far'), 3)
+        self.assertIn('Done: 5 attendees imported, 0 rows rejected.', out.getvalue())
+        self.assertEqual(self.event.attendees.count(), 5)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = make_user()
+        self.event = make_event(self.user, title='Jazz, Live', date=timezone.make_aware(datetime.datetime(2026, 3, 24, 19, 0)))
+        for i in range(3):
+            Attendee.objects.create(name=f'Guest {i}', email=f'g{i}@mail.com', user=self.user, event=self.event)
+        cinema = Cinema.objects.create(name='Sarit', location='Westlands')
+        Showtime.objects.create(movie=self.event, cinema=cinema, date=datetime.date(2026, 3, 24), time=datetime.time(21, 0))
+
+    def fetch(self, url, **extra):
+        response = self.client.get(url, **extra)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_events_csv(self):
+        response, body = self.fetch('/api/exports/events.csv', HTTP_ACCEPT='text/csv')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('filename="events.csv"', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual((rows[0]['title'], rows[0]['seats_taken']), ('Jazz, Live', '0'))
+        self.assertEqual(datetime.datetime.fromisoformat(rows[0]['date']), self.event.date)
+
+    def test_showtimes_ndjson_accepts_the_showtime_filters(self):
+        _, body = self.fetch('/api/exports/showtimes.ndjson?date=2026-03-24&time_from=20:00')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(rows, [{
+            'id': Showtime.objects.get().pk, 'movie': self.event.pk, 'movie_title': 'Jazz, Live',
+            'cinema': Cinema.objects.get().pk, 'cinema_name': 'Sarit',
+            'date': '2026-03-24', 'time': '21:00:00', 'ticket_link': None,
+        }])
+        _, body = self.fetch('/api/exports/showtimes.ndjson?time_from=22:00')
+        self.assertEqual(body, '')
+
+    def test_attendees_per_event_needs_auth_and_reads_in_one_query(self):
+        url = f'/api/exports/events/{self.event.pk}/attendees.csv'
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/api/exports/events/999999/attendees.csv').status_code, 404)
+        with self.assertNumQueries(2):  # existence check + the streamed SELECT
+            _, body = self.fetch(url)
+        self.assertEqual([row['name'] for row in csv.DictReader(io.StringIO(body))],
+                         ['Guest 0', 'Guest 1', 'Guest 2'])
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = make_user()
+        # Signed-in reads skip the anonymous response cache, so every request reaches the view.
+        self.client.force_authenticate(self.user)
+        self.events = [make_event(self.user, title=f'Event {i}') for i in range(3)]
+
+    def get(self, url, **headers):
+        return self.client.get(url, **{f"HTTP_{k.upper().replace('-', '_')}": v for k, v in headers.items()})
+
+    def test_list_revalidates_with_one_aggregate_query(self):
+        first = self.get('/api/events/')
+        etag = first['ETag']
+        self.assertTrue(etag.startswith('W/"'))
+
+        with self.assertNumQueries(1):
+            response = self.get('/api/events/', if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_list_has_no_last_modified_so_deletes_are_not_missed(self):
+        first = self.get('/api/events/')
+        self.assertNotIn('Last-Modified', first)
+        # The newest row stays, so MAX(updated_at) would not have moved.
+        self.events[0].delete()
+        since = self.get(f'/api/events/{self.events[2].pk}/')['Last-Modified']
+        response = self.get('/api/events/', if_modified_since=since)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_list_etag_changes_on_edit_insert_delete_and_nested_changes(self):
+        etags = [self.get('/api/events/')['ETag']]
+
+        def changed():
+            etag = self.get('/api/events/')['ETag']
+            self.assertNotIn(etag, etags)
+            etags.append(etag)
+
+        self.events[0].title = 'Renamed'
+        self.events[0].save()
+        changed()
+        make_event(self.user, title='New')
+        changed()
+        self.events[1].delete()
+        changed()
+        cinema = Cinema.objects.create(name='Sarit', location='Westlands')
+        Showtime.objects.create(movie=self.events[2], cinema=cinema, date=timezone.now().date(), time=datetime.time(18, 0))
+        changed()
+        cinema.name = 'Sarit Centre'
+        cinema.save()
+        changed()
+        self.client.post(f'/api/events/{self.events[2].pk}/register/')
+        changed()
+
+    def test_detail_uses_the_row(self):
+        url = f'/api/events/{self.events[0].pk}/'
+        etag = self.get(url)['ETag']
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get(url, if_none_match=etag).status_code, 304)
+        self.assertNotEqual(self.get(f'/api/events/{self.events[1].pk}/')['ETag'], etag)
+        self.events[0].save()
+        response = self.get(url, if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.get('/api/events/999999/').status_code, 404)
+        self.assertEqual(self.get('/api/events/abc/').status_code, 404)
+
+    def test_sponsors_and_speakers(self):
+        sponsor = Sponsor.objects.create(title='S', organisation='Org', category='Cat', industry='Ind')
+        Speaker.objects.create(name='Wanjiru', email='w@mail.com', event=self.events[0], organisation='Org', job_title='CTO')
+        for url in ('/api/sponsors/', '/api/speakers/', f'/api/sponsors/{sponsor.pk}/'):
+            etag = self.get(url)['ETag']
+            self.assertEqual(self.get(url, if_none_match=etag).status_code, 304, url)
+
+
+class EventResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        response_cache.reset_stats()
+        self.addCleanup(cache.clear)
+        self.client = APIClient()
+        self.user = make_user()
+        self.event = make_event(self.user, title='Jazz Night')
+        self.cinema = Cinema.objects.create(name='Sarit', location='Westlands')
+
+    def get(self, url, **extra):
+        response = self.client.get(url, **extra)
+        self.assertIn(response.status_code, (200, 304))
+        return response
+
+    def test_second_anonymous_read_is_a_hit_without_queries(self):
+        first = self.get('/api/events/?page_size=5')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.get('/api/events/?page_size=5')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(json.loads(second.content), json.loads(first.content))
+        self.assertEqual(second['ETag'], first['ETag'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get('/api/events/?page_size=5', HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        self.assertEqual(self.get('/api/events/?page_size=4')['X-Cache'], 'MISS')  # query string is part of the key
+
+    @override_settings(ALLOWED_HOSTS=['testserver', 'api.example.com'])
+    def test_scheme_and_host_are_part_of_the_key(self):
+        for i in range(3):
+            make_event(self.user, title=f'Extra {i}')
+        first = self.get('/api/events/?page_size=2')
+        self.assertTrue(first.data['next'].startswith('http://testserver/'))
+        other = self.get('/api/events/?page_size=2', secure=True, HTTP_HOST='api.example.com')
+        self.assertEqual(other['X-Cache'], 'MISS')
+        self.assertTrue(json.loads(other.content)['next'].startswith('https://api.example.com/'))
+
+    def test_hits_and_misses_are_counted_per_process(self):
+        self.get('/api/events/')
+        with mock.patch.object(response_cache.cache, 'incr') as incr:
+            for _ in range(5):
+                self.get('/api/events/')
+        incr.assert_not_called()
+        self.assertEqual(response_cache.stats(), {'hits': 5, 'misses': 1, 'hit_rate': 0.8333})
+
+    def test_signed_in_reads_bypass_the_cache(self):
+        self.client.force_authenticate(self.user)
+        self.get('/api/events/')
+        self.assertNotIn('X-Cache', self.get('/api/events/'))
+
+    def test_writes_invalidate_affected_responses(self):
+        detail = f'/api/events/{self.event.pk}/'
+        other = make_event(self.user, title='Other')
+        other_detail = f'/api/events/{other.pk}/'
+
+        def assert_fresh(*urls):
+            for url in urls:
+                self.assertEqual(self.get(url)['X-Cache'], 'MISS', url)
+                self.assertEqual(self.get(url)['X-Cache'], 'HIT', url)
+
+        assert_fresh(detail, other_detail, '/api/events/')
+        self.event.title = 'Blues Night'
+        self.event.save()
+        assert_fresh(detail, '/api/events/')
+        self.assertEqual(self.get(other_detail)['X-Cache'], 'HIT')  # unrelated event keeps its entry
+        self.assertEqual(json.loads(self.get(detail).content)['title'], 'Blues Night')
+
+        Showtime.objects.create(movie=self.event, cinema=self.cinema, date=timezone.now().date(), time=datetime.time(18, 0))
+        assert_fresh(detail, '/api/events/')
+        Speaker.objects.create(name='W', email='w@mail.com', event=self.event, organisation='O', job_title='J')
+        assert_fresh(detail)
+        self.cinema.name = 'Sarit Centre'
+        self.cinema.save()
+        assert_fresh(detail, other_detail)
+        register_client = APIClient()
+        register_client.force_authenticate(self.user)
+        register_client.post(f'/api/events/{self.event.pk}/register/')
+        self.assertEqual(json.loads(self.get(detail).content)['seats_taken'], 1)
+
+    def test_non_canonical_pks_are_not_cached(self):
+        self.assertEqual(self.get(f'/api/events/{self.event.pk}/')['X-Cache'], 'MISS')
+        for pk in (f'0{self.event.pk}', f'+{self.event.pk}', f'{self.event.pk}.0'):
+            self.assertEqual(self.client.get(f'/api/events/{pk}/').status_code, 404, pk)
+        self.event.title = 'Blues Night'
+        self.event.save()
+        response = self.get(f'/api/events/{self.event.pk}/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(json.loads(response.content)['title'], 'Blues Night')
+
+    def test_responses_rendered_before_commit_are_dropped_at_commit(self):
+        detail = f'/api/events/{self.event.pk}/'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.event.title = 'Renamed'
+            self.event.save()
+            # Another request could render the old row here and store it under
+            # the already-bumped version; the bump at commit discards it.
+            self.get(detail)
+        self.assertEqual(self.get(detail)['X-Cache'], 'MISS')
+
+    def test_stats_are_staff_only(self):
+        self.get('/api/events/')
+        self.get('/api/events/')
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/api/cache/stats/').status_code, 403)
+        self.client.force_authenticate(User.objects.create_superuser('boss', 'boss@mail.com', 'password'))
+        self.assertEqual(self.client.get('/api/cache/stats/').data['events'], {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+
+class DatabaseRoutingTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def test_reads_use_the_replica_outside_transactions(self):
+        self.assertEqual(router.db_for_read(Event), 'replica')
+        self.assertEqual(router.db_for_write(Event), 'default')
+        with transaction.atomic():
+            # Must see this transaction's own writes.
+            self.assertEqual(router.db_for_read(Event), 'default')
+
+    def test_writes_are_visible_to_later_reads(self):
+        event = make_event(make_user())
+        self.assertEqual(Event.objects.get(pk=event.pk).title, event.title)
+        Event.objects.filter(pk=event.pk).update(title='Renamed')
+        self.assertEqual(Event.objects.get(pk=event.pk).title, 'Renamed')
+
+    def test_sqlite_pragmas_are_applied(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 20000)
+
+
+class IndexAuditTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def test_no_query_scans_a_whole_table(self):
+        out = io.StringIO()
+        call_command('audit_indexes', '--fail', stdout=out)
+        self.assertIn('0 flagged', out.getvalue())
+
+    def test_full_scans_are_flagged(self):
+        out = io.StringIO()
+        with mock.patch('events.management.commands.audit_indexes.scrape_movies_queries',
+                        return_value=[('by location', Event.objects.filter(location='Nairobi'), False)]), \
+                mock.patch('events.management.commands.audit_indexes.EXTRA_PATHS', []):
+            with self.assertRaises(CommandError):
+                call_command('audit_indexes', '--fail', stdout=out)
+        self.assertIn('by location: full scan of events_event', out.getvalue())
+
+    def test_plans_from_older_sqlite_are_recognised(self):
+        for step in ('SCAN events_event', 'SCAN TABLE events_event', 'SCAN TABLE events_event AS U0'):
+            self.assertEqual(FULL_SCAN.match(step).group(1), 'events_event', step)
+        for step in ('SCAN TABLE events_event USING INDEX event_date_id_idx',
+                     'SCAN events_event USING COVERING INDEX event_updated_at_idx',
+                     'SEARCH TABLE events_event USING INTEGER PRIMARY KEY (rowid=?)', 'SCAN CONSTANT ROW'):
+            self.assertIsNone(FULL_SCAN.match(step), step)
+
+
+class SeedingTests(TestCase):
+    def seed(self, **options):
+        options = {'attendees_per_event': 4, 'showtimes_per_event': 3, 'speakers_per_event': 2,
+                   'users': 20, 'sponsors': 3, 'cinemas': 4, 'batch_size': 7, **options}
+        return seeding.seed(25, **options)
+
+    def test_generates_the_requested_rows_in_batches(self):
+        batches = []
+        result = self.seed(on_batch=lambda r: batches.append(r.counts['events']))
+        self.assertEqual(batches, [7, 14, 21, 25])
+        self.assertEqual(result.counts, {'users': 20, 'sponsors': 3, 'cinemas': 4, 'events': 25,
+                                         'showtimes': 75, 'speakers': 50, 'attendees': 100})
+        self.assertEqual(Attendee.objects.count(), 100)
+        self.assertEqual(Showtime.objects.count(), 75)
+        # seats_taken matches the attendees, so registration still works on generated events.
+        self.assertFalse(Event.objects.exclude(seats_taken=4).exists())
+        self.assertFalse(Event.objects.filter(capacity__lt=F('seats_taken')).exists())
+        # Generated events are searchable.
+        title = Event.objects.values_list('title', flat=True).first()
+        self.assertTrue(self.client.get('/api/events/search/', {'q': title}).data)
+
+    def test_same_seed_gives_same_data(self):
+        def snapshot():
+            return (list(Event.objects.order_by('id').values_list('title', 'location', 'price', 'capacity')),
+                    list(Attendee.objects.order_by('id').values_list('name', 'email')))
+        self.seed()
+        first = snapshot()
+        seeding.wipe()
+        self.seed()
+        self.assertEqual(snapshot(), first)
+        seeding.wipe()
+        self.seed(seed=7)
+        self.assertNotEqual(snapshot(), first)
+
+    def test_command_wipes_unless_appending(self):
+        make_event(make_user())
+        out = io.StringIO()
+        call_command('seeds', '--events', '5', '--attendees-per-event', '2', '--users', '3', stdout=out)
+        self.assertIn('5 events', out.getvalue())
+        self.assertEqual(Event.objects.count(), 5)
+        call_command('seeds', '--events', '5', '--users', '3', '--append', stdout=io.StringIO())
+        self.assertEqual(Event.objects.count(), 10)
+        self.assertEqual(User.objects.count(), 6)
+
+    def test_example_attendees_take_seats(self):
+        call_command('seeds', stdout=io.StringIO())
+        self.assertFalse(Event.objects.annotate(attendee_count=Count('attendees'))
+                         .exclude(seats_taken=F('attendee_count')).exists())
+        self.assertEqual(sum(Event.objects.values_list('seats_taken', flat=True)), Attendee.objects.count())
+
+    def test_impossible_options_are_rejected_before_wiping(self):
+        make_event(make_user())
+        for args in (['--showtimes', '2', '--cinemas', '0'],
+                     ['--speakers-per-event', str(seeding.POOL_SIZE + 1)],
+                     ['--batch-size', '0']):
+            with self.assertRaises(CommandError, msg=args):
+                call_command('seeds', '--events', '3', *args, stdout=io.StringIO())
+        self.assertEqual(Event.objects.count(), 1)
+        with self.assertRaises(ValueError):
+            seeding.seed(3, showtimes_per_event=1, cinemas=0)
+
+
+class BenchmarkTests(TestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        seeding.seed(5, attendees_per_event=2, showtimes_per_event=2, users=5)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.output = os.path.join(self.tmp.name, 'bench.json')
+
+    def bench(self, *args):
+        out = io.StringIO()
+        call_command('bench_api', '--use-existing-db', '--requests', '3', '--warmup', '1',
+                     '--output', self.output, *args, stdout=out)
+        return out.getvalue()
+
+    def test_results_are_saved_as_json(self):
+        self.bench()
+        with open(self.output) as f:
+            results = json.load(f)
+        endpoints = results['endpoints']
+        self.assertIn('events_list', endpoints)
+        self.assertIn('movies', endpoints)
+        for name, result in endpoints.items():
+            # Authenticated endpoints accept the locally minted tokens.
+            self.assertEqual(result['errors'], 0, name)
+            self.assertEqual(result['requests'], 3)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+            self.assertIsInstance(result['queries_per_request'], int)
+        # Cached anonymous responses never reach the database.
+        self.assertEqual(endpoints['events_list_anonymous']['queries_per_request'], 0)
+        self.assertEqual(results['meta']['options']['requests'], 3)
+
+    def test_leaves_no_users_or_keys_behind(self):
+        real_jwks = {'keys': [{'kid': 'real-key', 'kty': 'RSA'}]}
+        cache.set(JWKS_CACHE_KEY, real_jwks)
+        users = User.objects.count()
+        self.bench('--endpoint', 'users')
+        self.assertEqual(User.objects.count(), users)
+        self.assertEqual(cache.get(JWKS_CACHE_KEY), real_jwks)
+
+        published = []
+        with mock.patch.object(BenchApiCommand, 'run', lambda command, tokens: published.append(cache.get(JWKS_CACHE_KEY)) or {}):
+            call_command('bench_api', '--url', 'http://127.0.0.1:9', '--output', self.output, stdout=io.StringIO())
+        self.assertEqual([jwk['kid'] for jwk in published[0]['keys']], ['real-key', BENCH_KID])
+        self.assertEqual(cache.get(JWKS_CACHE_KEY), real_jwks)
+        self.assertEqual(User.objects.count(), users)
+
+    def test_compare_flags_regressions(self):
+        baseline = os.path.join(self.tmp.name, 'baseline.json')
+        with open(baseline, 'w') as f:
+            json.dump({'meta': {'commit': 'abc123'}, 'endpoints': {
+                'users': {'p50_ms': 0.001, 'p95_ms': 0.001, 'queries_per_request': 0}}}, f)
+        out = self.bench('--endpoint', 'users', '--compare', baseline)
+        self.assertIn('Compared with abc123', out)
+        self.assertIn('queries 0 -> 1', out)
+        with self.assertRaises(CommandError):
+            self.bench('--endpoint', 'nope')
+
+
+class TestCacheIsolationTests(SimpleTestCase):
+    def test_suite_uses_its_own_cache_file(self):
+        # Set by core/test_runner.py (or core/test_settings.py); cache.clear() here must not wipe the dev cache.
+        self.assertEqual(caches['default'].path.name, 'test.sqlite3')
+
+
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.location = os.path.join(self.tmp.name, 'cache.sqlite3')
+
+    def make_cache(self, **options):
+        options = {'L1_MAX_ENTRIES': 10, 'L1_TIMEOUT': 60, 'L1_BYPASS_PREFIXES': ['v:'], **options}
+        return TieredCache(self.location, {'OPTIONS': options})
+
+    def test_values_are_shared_between_processes(self):
+        worker_a, worker_b = self.make_cache(), self.make_cache()
+        worker_a.set('jwks', {'keys': [1, 2]})
+        self.assertEqual(worker_b.get('jwks'), {'keys': [1, 2]})
+        self.assertEqual(worker_b.stats()['l2_hits'], 1)
+        # Served from worker_b's own L1 now.
+        self.assertEqual(worker_b.get('jwks'), {'keys': [1, 2]})
+        self.assertEqual(worker_b.stats()['l1_hits'], 1)
+
+    def test_l1_entries_expire_after_l1_timeout(self):
+        worker_a, worker_b = self.make_cache(L1_TIMEOUT=0.05), self.make_cache(L1_TIMEOUT=0.05)
+        worker_a.set('key', 'old')
+        worker_b.get('key')
+        worker_a.set('key', 'new')
+        self.assertEqual(worker_b.get('key'), 'old')
+        time.sleep(0.1)
+        self.assertEqual(worker_b.get('key'), 'new')
+
+    def test_bypass_prefixes_always_read_the_shared_tier(self):
+        worker_a, worker_b = self.make_cache(), self.make_cache()
+        worker_a.set('v:list', 1, None)
+        self.assertEqual(worker_b.get('v:list'), 1)
+        worker_a.incr('v:list')
+        self.assertEqual(worker_b.get('v:list'), 2)
+        self.assertEqual(worker_b.stats()['l1_entries'], 0)
+
+    def test_per_key_timeout(self):
+        cache_ = self.make_cache()
+        cache_.set('short', 1, 0.05)
+        cache_.set('long', 2, 60)
+        time.sleep(0.1)
+        self.assertIsNone(cache_.get('short'))
+        self.assertEqual(cache_.get('long'), 2)
+        # An expired entry can be add()ed again, a live one can't.
+        self.assertTrue(cache_.add('short', 3))
+        self.assertFalse(cache_.add('long', 3))
+        self.assertEqual(cache_.get_many(['short', 'long', 'missing']), {'short': 3, 'long': 2})
+
+    def test_l1_is_lru_bounded(self):
+        cache_ = self.make_cache(L1_MAX_ENTRIES=2)
+        cache_.set('a', 1)
+        cache_.set('b', 2)
+        cache_.get('a')  # a is now more recent than b
+        cache_.set('c', 3)
+        stats = cache_.stats()
+        self.assertEqual((stats['l1_entries'], stats['l1_evictions']), (2, 1))
+        cache_.get('a')
+        cache_.get('b')
+        self.assertEqual(cache_.stats()['l2_hits'], 1)  # only b had to come from L2
+
+    def test_shared_tier_is_culled_to_max_entries(self):
+        cache_ = self.make_cache(MAX_ENTRIES=50, CULL_FREQUENCY=5)
+        for i in range(TieredCache.cull_interval):
+            cache_.set(f'key{i}', i, 60 + i)
+        stats = cache_.stats()
+        self.assertEqual(stats['l2_entries'], 40)
+        self.assertEqual(stats['l2_culled'], TieredCache.cull_interval - 40)
+        # The entries closest to expiry went first.
+        self.assertIsNone(self.make_cache().get('key0'))
+        self.assertEqual(self.make_cache().get(f'key{TieredCache.cull_interval - 1}'), TieredCache.cull_interval - 1)
+
+    def test_incr_is_atomic_across_threads(self):
+        self.make_cache().set('counter', 0, None)
+
+        def bump(_):
+            cache_ = self.make_cache()
+            for _ in range(25):
+                cache_.incr('counter')
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(bump, range(8)))
+        self.assertEqual(self.make_cache().get('counter'), 200)
+        with self.assertRaises(ValueError):
+            self.make_cache().incr('missing')
+
+    def test_delete_and_clear_reach_both_tiers(self):
+        worker_a, worker_b = self.make_cache(), self.make_cache()
+        worker_a.set_many({'a': 1, 'b': 2})
+        self.assertTrue(worker_a.delete('a'))
+        self.assertIsNone(worker_a.get('a'))
+        worker_a.clear()
+        self.assertIsNone(worker_a.get('b'))
+        self.assertIsNone(worker_b.get('b'))
+        self.assertEqual(worker_a.stats()['misses'], 2)
+
+
+class MovieSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        user = make_user()
+        self.movie = make_event(user, title='Dune', event_planner_name='KenyaBuzz Movies',
+                                image='https://img.example/dune.jpg')
+        cinema = Cinema.objects.create(name='Sarit', location='Westlands')
+        today = timezone.localdate()
+        for day, t in [(0, datetime.time(14, 30)), (0, datetime.time(9, 0)), (1, datetime.time(20, 0))]:
+            Showtime.objects.create(movie=self.movie, cinema=cinema,
+                                    date=today + datetime.timedelta(days=day), time=t)
+
+    def test_builds_from_the_database_and_then_serves_from_cache(self):
+        client = APIClient()
+        with self.assertNumQueries(2):
+            first = client.get('/api/movies/').json()
+        self.assertEqual(first, [{
+            'id': str(self.movie.pk), 'title': 'Dune', 'posterImage': 'https://img.example/dune.jpg',
+            'cinema': 'Sarit', 'genre': 'Currently Showing', 'duration': 'N/A',
+            'showtimes': ['9:00 AM', '2:30 PM'],
+        }])
+        with self.assertNumQueries(0):
+            self.assertEqual(client.get('/api/movies/').json(), first)
+
+    def test_stale_snapshot_is_served_while_one_refresh_runs(self):
+        movie_snapshot.refresh_movies_snapshot()
+        Event.objects.filter(pk=self.movie.pk).update(title='Dune: Part Two')
+        with mock.patch('events.movie_snapshot.time.time', return_value=time.time() + 3600), \
+                mock.patch('events.movie_snapshot.threading.Thread') as thread:
+            for _ in range(3):
+                data = movie_snapshot.get_movies_snapshot()
+                self.assertEqual(data[0]['title'], 'Dune')
+        thread.assert_called_once()
+        # Run the refresh here, without closing the test's connections as the thread would.
+        with mock.patch('events.movie_snapshot.connections') as connections:
+            thread.call_args.kwargs['target']()
+        connections.close_all.assert_called_once()
+        self.assertEqual(movie_snapshot.get_movies_snapshot()[0]['title'], 'Dune: Part Two')
+        self.assertTrue(cache.add(movie_snapshot.REFRESH_LOCK_KEY, True))
+
+    def test_only_movies_still_showing_are_listed(self):
+        user = self.movie.user
+        cinema = Cinema.objects.get()
+        today = timezone.localdate()
+        old = make_event(user, title='Old Movie', event_planner_name='KenyaBuzz Movies')
+        Showtime.objects.create(movie=old, cinema=cinema, date=today - datetime.timedelta(days=3),
+                                time=datetime.time(18, 0))
+        make_event(user, title='Never Scheduled', event_planner_name='KenyaBuzz Movies')
+        for i in range(movie_snapshot.MOVIES_LIMIT + 5):
+            movie = make_event(user, title=f'Later {i:02d}', event_planner_name='KenyaBuzz Movies')
+            Showtime.objects.create(movie=movie, cinema=cinema, date=today + datetime.timedelta(days=2 + i),
+                                    time=datetime.time(18, 0))
+        titles = [movie['title'] for movie in movie_snapshot.build_movies_snapshot()]
+        self.assertEqual(len(titles), movie_snapshot.MOVIES_LIMIT)
+        self.assertIn('Dune', titles)  # showing soonest
+        self.assertNotIn('Old Movie', titles)
+        self.assertNotIn('Never Scheduled', titles)
+        self.assertNotIn(f'Later {movie_snapshot.MOVIES_LIMIT + 4:02d}', titles)
+        self.assertEqual(titles, sorted(titles))
+
+    def test_uploaded_posters_are_absolute_urls(self):
+        Event.objects.filter(pk=self.movie.pk).update(image='', image_key='a' * 64 + '.png')
+        poster = APIClient().get('/api/movies/').json()[0]['posterImage']
+        self.assertEqual(poster, f"http://testserver/api/images/{'a' * 64}.png")
+
+    def test_falls_back_when_nothing_is_synced(self):
+        Event.objects.all().delete()
+        self.assertEqual(movie_snapshot.get_movies_snapshot(), movie_snapshot.FALLBACK_MOVIES)
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_bucket_limits_rate_after_burst(self):
+        clock = [0.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            clock[0] += seconds
+
+        bucket = TokenBucket(rate=2, capacity=2, clock=lambda: clock[0], sleep=sleep)
+        for _ in range(6):
+            bucket.acquire()
+        # Two tokens of burst, then one every half second.
+        self.assertAlmostEqual(clock[0], 2.0)
+
+    def test_retries_transient_failures_with_backoff(self):
+        responses = [FakeResponse({}, 503), requests.ConnectionError('reset'), FakeResponse({'ok': True})]
+        sleeps = []
+
+        def send():
+            result = responses.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        response = fetch_with_retry(send, retries=3, backoff=1.0, sleep=sleeps.append)
+        self.assertEqual(response.json(), {'ok': True})
+        self.assertEqual(len(sleeps), 2)
+        self.assertGreaterEqual(sleeps[1], 2.0)
+
+    def test_retry_after_is_capped(self):
+        responses = [FakeResponse({}, 429, {'Retry-After': '86400'}), FakeResponse({'ok': True})]
+        sleeps = []
+        fetch_with_retry(lambda: responses.pop(0), retries=1, backoff=1.0, sleep=sleeps.append, max_retry_after=30)
+        self.assertGreaterEqual(sleeps[0], 30)
+        self.assertLess(sleeps[0], 31)
+
+    def test_gives_up_after_retries(self):
+        with self.assertRaises(FetchFailed):
+            fetch_with_retry(lambda: FakeResponse({}, 429, {'Retry-After': '3'}), retries=2, sleep=lambda s: None)
@@ -1,7 +1,8 @@
-from django.urls import path, include
+from django.urls import path, re_path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
-    KenyaBuzzMoviesView, UserViewSet, SponsorViewSet, EventViewSet, SpeakerViewSet, AttendeeViewSet
+    KenyaBuzzMoviesView, UserViewSet, SponsorViewSet, EventViewSet, SpeakerViewSet, AttendeeViewSet, ShowtimeViewSet,
+    ClerkWebhookView, CacheStatsView, image_blob, EventExportView, ShowtimeExportView, AttendeeExportView,
 )
 
 # Create a router and register our viewsets with it.
@@ -11,6 +12,7 @@ router.register(r'sponsors', SponsorViewSet)
 router.register(r'events', EventViewSet)
 router.register(r'speakers', SpeakerViewSet)
 router.register(r'attendees', AttendeeViewSet)
+router.register(r'showtimes', ShowtimeViewSet)
 
 # The API URLs for the viewsets are now determined automatically by the router.
 # The old authentication endpoints have been removed as Clerk now handles authentication.
@@ -19,4 +21,11 @@ urlpatterns = [
     # e.g., /api/users/, /api/events/, etc.
     path('', include(router.urls)),
     path('movies/', KenyaBuzzMoviesView.as_view(), name='movie-showtimes'),
+    path('cache/stats/', CacheStatsView.as_view(), name='cache-stats'),
+    path('webhooks/clerk/', ClerkWebhookView.as_view(), name='clerk-webhook'),
+    re_path(r'^exports/events\.(?P<fmt>csv|ndjson)$', EventExportView.as_view(), name='export-events'),
+    re_path(r'^exports/showtimes\.(?P<fmt>csv|ndjson)$', ShowtimeExportView.as_view(), name='export-showtimes'),
+    re_path(r'^exports/events/(?P<event_id>\d+)/attendees\.(?P<fmt>csv|ndjson)$', AttendeeExportView.as_view(),
+            name='export-attendees'),
+    re_path(r'^images/(?P<key>[0-9a-f]{64}\.[a-z0-9]{1,5})$', image_blob, name='image-blob'),
 ] 